@@ -0,0 +1,159 @@
+"""
+求解 CPU 准入控制模块
+所有求解 (同步接口、后台任务、后台继续优化) 在开始前向全局调度器申请 CPU 核数:
+空闲核数足够时按需分配；不够时先分给排在最前面的请求较少的核数；一个核都没有时排队等待。
+排队按用户公平: 正在运行的求解越少的用户越先获得分配，同一用户内部按到达顺序。
+"""
+import collections
+import itertools
+import logging
+import threading
+import time
+import contextlib
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionTimeout(Exception):
+    """排队超过等待上限仍未获得 CPU"""
+
+
+class AdmissionCancelled(Exception):
+    """排队期间请求被取消"""
+
+
+class CpuGrant:
+    """一次准入分配: 获得的核数与排队耗时"""
+    def __init__(self, ticket, user, requested, workers, wait_seconds):
+        self.ticket = ticket
+        self.user = user
+        self.requested = requested
+        self.workers = workers
+        self.wait_seconds = wait_seconds
+
+    def to_dict(self):
+        return {
+            "requested": self.requested,
+            "workers": self.workers,
+            "wait_seconds": round(self.wait_seconds, 2)
+        }
+
+
+class CpuAdmission:
+    """
+    全局求解调度器
+    total_cores: 可分配给求解的总核数
+    min_workers: 一次求解至少分配的核数，空闲核数少于该值时排队
+    """
+    def __init__(self, total_cores, min_workers=1, history_size=100):
+        self.total_cores = max(1, int(total_cores))
+        self.min_workers = max(1, min(int(min_workers), self.total_cores))
+        self._cond = threading.Condition()
+        self._tickets = itertools.count(1)
+        self._running = collections.OrderedDict()  # ticket -> {user, requested, workers, started_at}
+        self._waiting = []                           # 按到达顺序: {ticket, user, requested, enqueued_at}
+        self._recent_waits = collections.deque(maxlen=history_size)
+        self._admitted = 0
+
+    def _cores_in_use(self):
+        return sum(r['workers'] for r in self._running.values())
+
+    def _next_waiter(self):
+        """下一个获得分配的请求: 运行中求解最少的用户优先，其次按到达顺序"""
+        running_per_user = collections.Counter(r['user'] for r in self._running.values())
+        return min(self._waiting, key=lambda w: (running_per_user[w['user']], w['ticket']))
+
+    def _fair_share(self):
+        """当前活跃用户 (运行中或排队中) 平分总核数后每人的份额"""
+        users = {r['user'] for r in self._running.values()} | {w['user'] for w in self._waiting}
+        return max(self.min_workers, self.total_cores // max(1, len(users)))
+
+    def acquire(self, user, requested, timeout=None, on_wait=None, cancel=None):
+        """
+        申请 requested 个核，返回 CpuGrant (实际核数可能少于申请数)
+        timeout: 最长排队秒数，超时抛出 AdmissionTimeout；on_wait(position) 在开始排队时调用一次
+        cancel: 可选的取消事件，排队期间被置位时抛出 AdmissionCancelled
+        """
+        requested = max(1, int(requested))
+        enqueued_at = time.time()
+        with self._cond:
+            entry = {"ticket": next(self._tickets), "user": user, "requested": requested, "enqueued_at": enqueued_at}
+            self._waiting.append(entry)
+            notified = False
+            while True:
+                free = self.total_cores - self._cores_in_use()
+                if free >= self.min_workers and self._next_waiter() is entry:
+                    workers = min(requested, free, self._fair_share())
+                    self._waiting.remove(entry)
+                    wait_seconds = time.time() - enqueued_at
+                    self._running[entry['ticket']] = {
+                        "user": user, "requested": requested, "workers": workers, "started_at": time.time()
+                    }
+                    self._recent_waits.append(wait_seconds)
+                    self._admitted += 1
+                    self._cond.notify_all()  # 剩余核数可能还够下一个请求
+                    break
+                remaining = None if timeout is None else enqueued_at + timeout - time.time()
+                if remaining is not None and remaining <= 0:
+                    self._waiting.remove(entry)
+                    self._cond.notify_all()
+                    raise AdmissionTimeout(f"排队 {timeout:.0f} 秒仍未获得 CPU")
+                if cancel is not None and cancel.is_set():
+                    self._waiting.remove(entry)
+                    self._cond.notify_all()
+                    raise AdmissionCancelled("排队期间已取消")
+                if not notified and on_wait:
+                    notified = True
+                    on_wait(self._waiting.index(entry) + 1)
+                self._cond.wait(min(remaining, 0.5) if remaining is not None else 0.5)
+
+        if workers < requested or wait_seconds > 0.5:
+            logger.info(f"求解准入 [{user}]: 申请 {requested} 核，分配 {workers} 核，排队 {wait_seconds:.1f}s")
+        return CpuGrant(entry['ticket'], user, requested, workers, wait_seconds)
+
+    def release(self, grant):
+        with self._cond:
+            self._running.pop(grant.ticket, None)
+            self._cond.notify_all()
+
+    @contextlib.contextmanager
+    def admit(self, user, requested, timeout=None, on_wait=None, cancel=None):
+        """with admission.admit(user, n) as grant: ... 求解结束后自动归还核数"""
+        grant = self.acquire(user, requested, timeout, on_wait, cancel)
+        try:
+            yield grant
+        finally:
+            self.release(grant)
+
+    def stats(self):
+        """调度器状态: 核数占用、排队长度与等待时间、各用户的分配情况"""
+        now = time.time()
+        with self._cond:
+            running = [
+                {"user": r['user'], "requested": r['requested'], "workers": r['workers'],
+                 "running_seconds": round(now - r['started_at'], 2)}
+                for r in self._running.values()
+            ]
+            waiting = [
+                {"user": w['user'], "requested": w['requested'], "waiting_seconds": round(now - w['enqueued_at'], 2)}
+                for w in self._waiting
+            ]
+            waits = list(self._recent_waits)
+            admitted = self._admitted
+        per_user = collections.defaultdict(lambda: {"running": 0, "workers": 0, "waiting": 0})
+        for r in running:
+            per_user[r['user']]["running"] += 1
+            per_user[r['user']]["workers"] += r['workers']
+        for w in waiting:
+            per_user[w['user']]["waiting"] += 1
+        return {
+            "total_cores": self.total_cores,
+            "cores_in_use": sum(r['workers'] for r in running),
+            "queue_length": len(waiting),
+            "running": running,
+            "waiting": waiting,
+            "per_user": dict(per_user),
+            "admitted": admitted,
+            "avg_wait_seconds": round(sum(waits) / len(waits), 2) if waits else 0.0,
+            "max_wait_seconds": round(max(waits), 2) if waits else 0.0
+        }
@@ -1,13 +1,20 @@
-from flask import Flask, jsonify, request, render_template, send_file, session, redirect, url_for
+from flask import Flask, jsonify, request, render_template, send_file, session, redirect, url_for, Response, stream_with_context
 from flask_cors import CORS
 import logging
 import json
 import os
+import copy
 import normal
 import substitution
+import decomposition
+import portfolio
+import greedy
 from database import ScheduleDatabase
 from export_excel import ExcelExporter
 from error_handler import analyze_failure
+from job_queue import SolveJobManager, InflightSolves, FINISHED_STATES
+from solver_pool import create_solver_pool
+from admission import CpuAdmission, AdmissionTimeout, AdmissionCancelled
 from openai import OpenAI
 
 # 从环境变量获取 API Key (安全性优化)
@@ -33,20 +40,37 @@ app.secret_key = 'delushan_schedule_system_secret_key' # 生产环境请修改
 CORS(app)
 
 # 初始化存储模块 (SQLite)
-storage = ScheduleDatabase()
+# [修改] 求解缓存/后台任务表在服务启动时 (init_solver_storage) 创建，导入模块不写数据库
+storage = ScheduleDatabase(solver_tables=False)
 # 初始化Excel导出模块
 exporter = ExcelExporter()
 
 import uuid
 
 # 初始化存储模块 (SQLite)
-storage = ScheduleDatabase()
+# [修改] 求解缓存/后台任务表在服务启动时 (init_solver_storage) 创建，导入模块不写数据库
+storage = ScheduleDatabase(solver_tables=False)
 # 初始化Excel导出模块
 exporter = ExcelExporter()
 
 # 会话存储: { schedule_id: { 'system': ..., 'result': ... } }
+# result 为纯数据 (不含 solver/vars 对象)，避免会话长期持有求解器内存
 SCHEDULE_SESSIONS = {}
 
+# 求解进程池: CP-SAT 在独立进程中建模求解，崩溃不影响 Web 服务
+SOLVER_POOL = create_solver_pool()
+
+# [新增] 求解准入控制: 所有求解共享的 CPU 核数 (SCHEDULE_SOLVER_CORES 未设置时取本机/容器实际可用核数)
+SOLVER_ADMISSION = CpuAdmission(int(os.getenv("SCHEDULE_SOLVER_CORES", "0")) or normal.available_cpus())
+# 排队等待 CPU 的最长时间 (秒)，超时返回 solver_busy
+ADMISSION_TIMEOUT = float(os.getenv("SCHEDULE_ADMISSION_TIMEOUT", "600"))
+
+# [新增] 进行中的求解 (按配置哈希)，重复提交的相同配置直接等待已有求解的结果
+INFLIGHT_SOLVES = InflightSolves()
+
+# 求解结果缓存的最大条目数 (保存在 SQLite 中，重启后仍然有效)
+RESULT_CACHE_SIZE = int(os.getenv("SCHEDULE_RESULT_CACHE_SIZE", "50"))
+
 def serialize_schedule(system):
     formatted_data = {}
     for c_id in system.classes:
@@ -145,21 +169,214 @@ def index():
         return redirect('/login')
     return render_template('index.html')
 
-@app.route('/api/init', methods=['POST'])
-def init_schedule():
-    global global_result, global_system
-    
-    # 接收完整配置
-    # 格式: { "num_classes": 10, "courses": {...}, "teacher_names": {"语文": ["张三"], ...} }
-    config = request.json if request.json else {}
-    
+def session_cells(system):
+    """会话课表转换为提示格子 [[c, d, p, 科目, 老师名], ...]"""
+    return [
+        [c, d, p, info['subject'].replace('_AUTO_SUB', ''), info.get('teacher_name', '')]
+        for (c, d, p), info in system.final_schedule.items() if info
+    ]
+
+def is_deadline_limited(config, result):
+    """[新增] 结果是否因 deadline_ms 截止而提前返回 (有解但未证明最优，且不是停止规则主动结束的)"""
+    solve_info = result.get('solve_info') or {}
+    return bool(config.get('deadline_ms')) and solve_info.get('solver_status') == 'FEASIBLE' \
+        and solve_info.get('stop_reason') == 'deadline'
+
+def replace_with_refined(schedule_id, served_cells, result):
+    """
+    [新增] 后台继续优化完成: 目标值更优且会话课表未被手动调整过时，替换会话中的课表
+    返回后台任务的结果摘要 (schedule_id 不变，前端按需重新拉取)
+    """
+    session_data = SCHEDULE_SESSIONS.get(schedule_id)
+    before = ((session_data or {}).get('result') or {}).get('solve_info') or {}
+    after = result.get('solve_info') or {}
+    summary = {
+        "status": "success",
+        "schedule_id": schedule_id,
+        "refined": False,
+        "objective_before": before.get('objective'),
+        "objective_after": after.get('objective'),
+        "solve_info": after
+    }
+    if session_data is None:
+        summary["reason"] = "session_expired"
+    elif result['status'] == 'partial':
+        summary["reason"] = "not_feasible"  # 局部搜索仍有硬约束违反
+    elif sorted(map(str, session_cells(session_data['system']))) != sorted(map(str, served_cells)):
+        summary["reason"] = "session_edited"  # 用户已手动调课，不覆盖
+    elif before.get('objective') is not None and after.get('objective', before['objective']) >= before['objective']:
+        summary["reason"] = "no_improvement"
+    else:
+        result.setdefault('rule_report', [])
+        session_data['result'] = result
+        session_data['system'] = substitution.SubstitutionSystem(result)
+        summary["refined"] = True
+    logger.info(f"后台优化结束 [{schedule_id}] - 替换: {summary['refined']} {summary.get('reason', '')}")
+    return summary
+
+def resolve_base_schedule(ref):
+    """
+    [新增] 热启动基准课表: ref 可以是当前会话的 schedule_id，也可以是已保存方案的名称
+    返回 {"cells": 提示格子 [[c, d, p, 科目, 老师名], ...], "config": 生成该课表时的配置 (可能为 None)}
+    找不到时返回 None
+    """
+    session_data = SCHEDULE_SESSIONS.get(ref)
+    if session_data:
+        return {"cells": session_cells(session_data['system']), "config": session_data.get('config')}
+
+    loaded = storage.load_schedule(ref)
+    if loaded['status'] != 'success':
+        return None
+    hint_cells = []
+    # 已保存方案的格式: {班级: {节次: {星期: 格子}}}，JSON 键均为字符串
+    for c_raw, periods in loaded['data'].get('schedule', {}).items():
+        try:
+            c = int(c_raw)
+        except (ValueError, TypeError):
+            c = c_raw
+        for p_str, days in periods.items():
+            for d_str, info in days.items():
+                if info:
+                    hint_cells.append([c, int(d_str), int(p_str), info['subject'], info.get('teacher_name', '')])
+    return {"cells": hint_cells, "config": loaded['data'].get('config') or None}
+
+def solve_with_admission(config, owner, progress=None, cancel=None):
+    """
+    [新增] 申请 CPU 后求解 (核数不足时排队或少分)，返回 (纯数据结果, 准入分配信息)
+    排队超时抛出 AdmissionTimeout，排队期间取消抛出 AdmissionCancelled
+    """
+    if config.get('engine') == 'local_search':
+        requested = 1
+    elif config.get('portfolio') or decomposition.should_decompose(config):
+        # 组合求解/分解求解同时运行多个求解进程，按可用核数申请
+        requested = int(config.get('num_search_workers') or min(SOLVER_ADMISSION.total_cores, normal.BUDGET_MAX_WORKERS))
+    else:
+        # 带 assumptions 的模型只用 1 个线程，不为它占住其余核
+        requested = normal.expected_search_workers(config, SOLVER_ADMISSION.total_cores)
+    on_wait = (lambda position: progress({"type": "queued", "position": position})) if progress else None
+    with SOLVER_ADMISSION.admit(owner, requested, ADMISSION_TIMEOUT, on_wait, cancel) as grant:
+        solve_config = dict(config, cpu_grant=grant.workers)
+        if config.get('engine') == 'local_search':
+            # [新增] 局部搜索是单线程的，不拆分年级也不开组合求解
+            result = SOLVER_POOL.solve(solve_config, progress=progress, cancel=cancel)
+        elif decomposition.should_decompose(config):
+            # [新增] 大规模多年级: 按年级拆分并行求解，再合并修复
+            result = decomposition.solve_decomposed(solve_config, SOLVER_POOL.solve, progress=progress, cancel=cancel)
+        elif config.get('portfolio'):
+            # [新增] 组合求解: 多个种子/搜索参数的求解进程同时运行，取最优
+            result = portfolio.solve_portfolio(solve_config, progress=progress, cpu_budget=grant.workers, cancel=cancel)
+        else:
+            result = SOLVER_POOL.solve(solve_config, progress=progress, cancel=cancel)
+    return result, grant.to_dict()
+
+def solve_and_build_response(config, progress=None, cancel=None):
+    """
+    执行排课并构造 /api/init 的返回数据
+    progress: 可选的求解进度回调 (后台任务使用)
+    cancel: 可选的取消事件 (后台任务使用)，置位后返回 status="cancelled" 与取消前的最优课表
+    返回: (response_dict, http_status)，既用于同步接口，也用于后台任务
+    """
     logger.info(f"接收到排课请求 - 班级数: {config.get('num_classes')}, 科目数: {len(config.get('courses', {}))}")
     logger.info(f"自定义老师科目: {list(config.get('teacher_names', {}).keys())}")
 
     try:
-        result = normal.run_scheduler(config)
+        # [新增] 后台继续优化的任务: 求解完成后替换原会话的课表，而不是新建会话
+        refine_of = config.pop('refine_schedule_id', None)
+        owner = config.pop('solve_owner', None) or 'anonymous'
+        if config.get('mode') and config['mode'] not in normal.SOLVE_MODES:
+            return {
+                "status": "error",
+                "error_type": "invalid_mode",
+                "message": f"未知的求解模式 '{config['mode']}'",
+                "suggestions": [f"可选模式: {', '.join(normal.SOLVE_MODES)}"]
+            }, 400
+        if config.get('engine') and config['engine'] not in normal.SOLVER_ENGINES:
+            return {
+                "status": "error",
+                "error_type": "invalid_engine",
+                "message": f"未知的求解引擎 '{config['engine']}'",
+                "suggestions": [f"可选引擎: {', '.join(normal.SOLVER_ENGINES)}"]
+            }, 400
+
+        # [新增] 热启动: base_schedule 指定基准课表 (会话 schedule_id 或已保存方案名)
+        # incremental: true 时只重排受改动影响的班级，其余班级保持基准课表不变
+        base_schedule = config.pop('base_schedule', None)
+        session_config = {k: v for k, v in config.items() if k not in ('incremental', 'use_cache')}
+        if base_schedule:
+            base = resolve_base_schedule(base_schedule)
+            if base is None:
+                return {
+                    "status": "error",
+                    "error_type": "base_schedule_not_found",
+                    "message": f"基准课表 '{base_schedule}' 不存在或会话已过期",
+                    "suggestions": ["重新选择已保存的方案", "不指定基准课表直接生成"]
+                }, 400
+            config['hint_cells'] = base['cells']
+            config['base_config'] = base['config']
+        else:
+            config.pop('incremental', None)
+
+        # [新增] 结果缓存: 配置 (含求解参数) 未变化时直接复用上次的结果，跳过数分钟的求解
+        # 增量重排要求尽量贴近基准课表，不读取缓存
+        use_cache = config.pop('use_cache', True) and not config.get('incremental') and not refine_of
+        cache_key = normal.canonical_config_hash(config)
+        cached = storage.get_cached_result(cache_key) if use_cache else None
+        admission_info = None
+        coalesced = False
+        if cached:
+            logger.info(f"命中结果缓存 [{cache_key[:12]}]，跳过求解")
+            result = normal.unpack_result(cached)
+        else:
+            # [新增] 请求合并: 相同配置的求解正在进行时 (重复点击、多个标签页)，等待它的结果而不是重新建模
+            # 缓存键已包含求解方式 (引擎、分层优化、组合/分解求解等)，不同方式的请求不会合并
+            flight, is_leader = INFLIGHT_SOLVES.join(cache_key, progress) if use_cache else (None, True)
+            result = None
+            try:
+                if not is_leader:
+                    logger.info(f"相同配置的求解正在进行 [{cache_key[:12]}]，等待其结果")
+                    if progress:
+                        progress({"type": "coalesced"})
+                    while not flight.done_event.wait(0.5):
+                        if cancel is not None and cancel.is_set():
+                            raise AdmissionCancelled("等待相同配置的求解期间已取消")
+                    shared = flight.result
+                    # 领头请求被其发起者取消时，等待者自行求解
+                    if shared is not None and shared['status'] != 'cancelled':
+                        result = copy.deepcopy(shared)  # 各会话独立修改课表
+                        coalesced = True
+                if result is None:
+                    # 领头者的进度同时转发给后来合并进来的请求
+                    solve_progress = flight.publish if is_leader and flight is not None else progress
+                    result, admission_info = solve_with_admission(config, owner, solve_progress, cancel)
+            except AdmissionTimeout as e:
+                logger.warning(f"求解准入超时 [{owner}]: {e}")
+                return {
+                    "status": "error",
+                    "error_type": "solver_busy",
+                    "message": f"当前排课任务较多，{e}",
+                    "suggestions": ["稍后重试", "使用 async 提交后台任务"],
+                    "admission": SOLVER_ADMISSION.stats()
+                }, 503
+            except AdmissionCancelled as e:
+                logger.info(f"求解已取消 [{owner}]: {e}")
+                return {"status": "cancelled", "message": f"求解已取消 ({e})"}, 200
+            finally:
+                if is_leader and flight is not None:
+                    INFLIGHT_SOLVES.finish(flight, result)
+            # 截止时间内未证明最优的结果不缓存，避免以后同样的请求拿到未优化完的课表
+            if not coalesced and result['status'] == 'success' and not is_deadline_limited(config, result):
+                storage.put_cached_result(cache_key, normal.pack_result(result), max_entries=RESULT_CACHE_SIZE)
         
-        if result['status'] != 'success':
+        if result['status'] == 'cancelled' and not result.get('schedule'):
+            # [新增] 取消时还没有可行课表
+            return {
+                "status": "cancelled",
+                "message": result.get('message', '求解已取消'),
+                "solve_info": result.get('solve_info'),
+                "admission": admission_info
+            }, 200
+
+        if result['status'] not in ('success', 'partial', 'cancelled'):
             # 1. 定义变量存储即将生成的报告
             failure_report = []
 
@@ -181,13 +398,13 @@ def init_schedule():
                     "violation_count": 1
                 })
                 
-                return jsonify({
+                return {
                     "status": "error",
                     "error_type": result['error_type'],
                     "message": result['message'],
                     "suggestions": result.get('suggestions', []),
                     "rule_report": failure_report  # <--- [关键] 将报告传回前端
-                }), 400
+                }, 400
                 
             # 情况B: 求解器运算后失败 (Infeasible)，进行故障分析
             error_analysis = analyze_failure(config)
@@ -207,14 +424,17 @@ def init_schedule():
                 "violation_count": 1
             })
 
-            return jsonify({
+            return {
                 "status": "error",
                 "error_type": error_analysis['error_type'],
                 "message": error_analysis['message'],
                 "suggestions": error_analysis['suggestions'],
                 "rule_report": failure_report # <--- [关键] 将报告传回前端
-            }), 400
+            }, 400
             
+        if refine_of:
+            return replace_with_refined(refine_of, config.get('hint_cells') or [], result), 200
+
         schedule_id = str(uuid.uuid4())
         
         # 创建系统实例
@@ -226,7 +446,8 @@ def init_schedule():
              
         SCHEDULE_SESSIONS[schedule_id] = {
             'result': result,
-            'system': system_instance
+            'system': system_instance,
+            'config': session_config  # [新增] 供增量重排对比配置改动
         }
         
         teacher_list = sorted([{
@@ -237,9 +458,23 @@ def init_schedule():
         } for t in result['teachers_db']], key=lambda x: x['name'])
         
         logger.info(f"排课成功 [{schedule_id}] - 生成 {len(system_instance.classes)} 个班级的课表")
+
+        # [新增] optimal 模式在截止时间内只拿到可行解: 先返回当前最优解，后台不限时继续优化
+        refine_job_id = None
+        # 合并到他人求解的请求不再提交后台优化，避免为同一配置重复建模
+        if not coalesced and is_deadline_limited(config, result) and result['solve_info']['mode'] == 'optimal':
+            refine_config = {k: v for k, v in session_config.items() if k != 'deadline_ms'}
+            refine_config.update(
+                hint_cells=session_cells(system_instance),
+                refine_schedule_id=schedule_id,
+                solve_owner=owner,
+                use_cache=False
+            )
+            refine_job_id = SOLVE_JOBS.submit(refine_config)
+            logger.info(f"课表 [{schedule_id}] 未达最优 (间隙 {result['solve_info'].get('gap')})，后台继续优化 [{refine_job_id}]")
         
-        return jsonify({
-            "status": "success", 
+        response = {
+            "status": result['status'],  # [新增] 取消时为 cancelled，课表为取消前的最优解；局部搜索仍有硬约束违反时为 partial
             "schedule_id": schedule_id,
             "teachers": teacher_list,
             "schedule": serialize_schedule(system_instance),
@@ -247,20 +482,193 @@ def init_schedule():
             "rule_report": result.get('rule_report', []), # [新增]
             "class_names": result.get('class_names', {}), # [新增]
             "sharding_info": result.get('sharding_info', []), # [新增]
-            "evaluation": result.get('evaluation', {'score': 100, 'details': []})
-        })
+            "evaluation": result.get('evaluation', {'score': 100, 'details': []}),
+            "cache_hit": bool(cached),
+            "coalesced": coalesced,
+            "warm_start": result.get('warm_start'),
+            "incremental": result.get('incremental'),
+            "decomposition": result.get('decomposition'),
+            "portfolio": result.get('portfolio'),
+            "solve_info": result.get('solve_info'),
+            "admission": admission_info,
+            "refine_job_id": refine_job_id
+        }
+        if result['status'] == 'cancelled':
+            response["message"] = "求解已取消，返回取消前找到的最优课表"
+        elif result['status'] == 'partial':
+            response["message"] = f"局部搜索未能满足全部硬约束 (违反 {result['solve_info'].get('hard_violations')} 处)，见规则报告"
+        return response, 200
     except Exception as e:
         logger.error(f"排课异常: {str(e)}", exc_info=True)
         
         # 尝试分析错误
         error_analysis = analyze_failure(config)
         
-        return jsonify({
+        return {
             "status": "error",
             "error_type": "system_error",
             "message": f"系统错误: {str(e)}",
             "suggestions": error_analysis['suggestions']
-        }), 500
+        }, 500
+
+
+# 后台排课任务管理器: 求解在工作线程中进行，请求线程只负责提交/查询
+# [新增] 任务元数据与当前最优解检查点写入 SQLite，进程重启后可查看并继续求解
+SOLVE_JOBS = SolveJobManager(solve_and_build_response, max_workers=int(os.getenv("SCHEDULE_SOLVE_WORKERS", "2")),
+                             cancellable=True, store=storage,
+                             checkpoint_interval=float(os.getenv("SCHEDULE_CHECKPOINT_SECONDS", "30")))
+
+def init_solver_storage():
+    """
+    服务启动时调用: 创建求解缓存/后台任务表，并把上次进程退出时仍在排队/求解的任务标记为中断 (单进程部署)
+    返回中断的任务数
+    """
+    storage.init_solver_tables()
+    interrupted = storage.mark_interrupted_jobs()
+    if interrupted:
+        logger.info(f"发现 {interrupted} 个因服务重启而中断的排课任务，可通过 /api/jobs/<job_id>/resume 继续")
+    return interrupted
+
+
+@app.route('/api/init', methods=['POST'])
+def init_schedule():
+    # 接收完整配置
+    # 格式: { "num_classes": 10, "courses": {...}, "teacher_names": {"语文": ["张三"], ...} }
+    # [新增] 携带 "async": true 时立即返回 job_id，前端通过 /api/jobs/<job_id> 轮询结果
+    config = request.json if request.json else {}
+    config['solve_owner'] = current_solve_owner()
+
+    if config.pop('async', False):
+        job_id = SOLVE_JOBS.submit(config)
+        return jsonify({
+            "status": "queued",
+            "job_id": job_id,
+            "status_url": url_for('get_job_status', job_id=job_id)
+        }), 202
+
+    response, http_status = solve_and_build_response(config)
+    return jsonify(response), http_status
+
+
+@app.route('/api/preview', methods=['POST'])
+def preview_schedule():
+    """
+    [新增] 即时预览: 用贪心构造 (greedy) 在一秒内生成一份接近可行的课表，不经过求解器，也不存入会话
+    返回的 hint_cells 可以作为 /api/init 的基准课表 (热启动)
+    """
+    config = request.json if request.json else {}
+    try:
+        result = greedy.build_greedy_schedule(config)
+    except Exception as e:
+        logger.exception("预览课表生成失败")
+        return jsonify({"status": "error", "message": f"预览生成失败: {e}"}), 500
+
+    if result.get('status') not in ('success', 'partial'):
+        return jsonify(result), 400
+
+    return jsonify({
+        "status": result['status'],  # partial: 有课放不下，见 unplaced
+        "schedule": serialize_schedule(substitution.SubstitutionSystem(result)),
+        "unplaced": result['unplaced'],
+        "rule_report": result['rule_report'],
+        "class_names": result['class_names'],
+        "greedy": result['greedy'],
+        "hint_cells": greedy.hint_cells(result['schedule'])
+    }), 200
+
+
+def current_solve_owner():
+    """准入控制的公平单位: 登录用户 ID，未登录时使用客户端地址"""
+    user = session.get('user') or {}
+    return f"user:{user['id']}" if user.get('id') is not None else f"ip:{request.remote_addr}"
+
+
+@app.route('/api/solver/status', methods=['GET'])
+def solver_status():
+    """[新增] 求解调度器状态: 排队长度、等待时间、各求解/各用户的核数分配"""
+    return jsonify({"status": "success", "admission": SOLVER_ADMISSION.stats(), "inflight": INFLIGHT_SOLVES.stats()})
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job_status(job_id):
+    """
+    查询后台排课任务的状态，任务结束后附带与 /api/init 相同结构的结果
+    支持长轮询: ?since=<上次收到的进度序号>&wait=<最长等待秒数>
+    """
+    since = request.args.get('since', 0, type=int)
+    wait = min(request.args.get('wait', 0, type=float), 30.0)
+    job_status = SOLVE_JOBS.status(job_id, since=since, wait=wait)
+    if not job_status:
+        return jsonify({"status": "error", "message": "任务不存在或已过期"}), 404
+    return jsonify({"status": "success", "job": job_status})
+
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """
+    [新增] 取消后台排课任务: 求解器停止搜索并归还 CPU，
+    任务以 cancelled 状态结束，结果中附带取消前找到的最优课表 (如果有)
+    [修改] 不等待求解器退出: 运行中的任务立即返回 cancelling，最终状态通过 /api/jobs/<job_id> 查询
+    """
+    job_status = SOLVE_JOBS.cancel(job_id)
+    if not job_status:
+        return jsonify({"status": "error", "message": "任务不存在或已过期"}), 404
+    if job_status["state"] not in FINISHED_STATES:
+        return jsonify({"status": "cancelling", "job": job_status}), 202
+    return jsonify({"status": "success", "job": job_status})
+
+
+@app.route('/api/jobs/<job_id>/resume', methods=['POST'])
+def resume_job(job_id):
+    """
+    [新增] 继续中断 (服务重启)、取消或失败的后台任务: 以保存的配置重新提交，
+    最后一次检查点的课表作为提示 (hint_cells)，求解器从该解附近开始搜索
+    """
+    owner = current_solve_owner()
+
+    def build_config(saved):
+        config = dict(saved['config'], solve_owner=owner)
+        checkpoint = saved.get('checkpoint')
+        if checkpoint:
+            config['hint_cells'] = normal.snapshot_hint_cells(checkpoint['snapshot'])
+        return config
+
+    new_job_id = SOLVE_JOBS.resume(job_id, build_config)
+    if not new_job_id:
+        return jsonify({"status": "error", "message": "任务不存在或当前状态不可继续"}), 404
+    return jsonify({
+        "status": "queued",
+        "job_id": new_job_id,
+        "resumed_from": job_id,
+        "status_url": url_for('get_job_status', job_id=new_job_id)
+    }), 202
+
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def stream_job_events(job_id):
+    """以 Server-Sent Events 推送求解进度 (每个更优解一条)，任务结束时推送 done 事件"""
+    job = SOLVE_JOBS.get(job_id)
+    if not job:
+        return jsonify({"status": "error", "message": "任务不存在或已过期"}), 404
+
+    def generate():
+        since = request.args.get('since', 0, type=int)
+        while True:
+            job.wait_for_progress(since, 15.0)
+            if job.progress_seq > since:
+                progress = job.progress_dict(since)
+                since = progress['seq']
+                yield f"id: {since}\nevent: progress\ndata: {json.dumps(progress, ensure_ascii=False)}\n\n"
+            elif job.done_event.is_set():
+                yield f"event: done\ndata: {json.dumps(job.to_dict(), ensure_ascii=False)}\n\n"
+                return
+            else:
+                yield ": keep-alive\n\n"
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # 关闭 nginx 缓冲，保证事件实时到达
+    })
 
 
 @app.route('/api/schedule/move', methods=['POST'])
@@ -470,7 +878,8 @@ def load_schedule(name):
                 'rule_report': data.get('rule_report', []),
                 'stats': {}
             },
-            'system': system_instance
+            'system': system_instance,
+            'config': config
         }
         
         logger.info(f"方案 '{name}' 加载成功，已重建会话 [{schedule_id}]")
@@ -989,5 +1398,6 @@ def ai_analyze_conflict():
 
 
 if __name__ == '__main__':
+    init_solver_storage()
     app.run(host='0.0.0.0', debug=True, port=8015)
     
\ No newline at end of file
@@ -0,0 +1,313 @@
+"""
+排课求解基准测试
+用法:
+    python benchmark.py symmetry [--sizes 6,8,10] [--time-limit 120]
+    python benchmark.py encoding [--sizes 10,20,40] [--time-limit 120]
+    python benchmark.py localsearch [--sizes 60,120,200] [--time-limit 120]
+    python benchmark.py lazy [--sizes 20,60,120] [--time-limit 120]
+    python benchmark.py assumptions [--sizes 20,60,120] [--time-limit 120]
+
+symmetry: 对比开启/关闭对称破缺时，可互换班级的 INFEASIBLE 配置的证明耗时
+encoding: 对比 boolean / compact 两种建模方式的模型规模、建模与求解耗时
+localsearch: 对比 CP-SAT 与局部搜索引擎在大规模学校上的硬约束违反、软罚分与耗时
+lazy: 对比规则全部建模 / 规则懒加载在规则繁多的配置上的模型规模、建模与求解耗时
+assumptions: 大量老师禁排与固定课程时的假设文字数、求解耗时，以及加入一处矛盾后的冲突诊断耗时与结论
+"""
+import argparse
+import copy
+import contextlib
+import logging
+import os
+import sys
+import math
+import time
+
+import normal
+
+
+@contextlib.contextmanager
+def suppress_solver_log():
+    """CP-SAT 的搜索日志直接写到 C 层 stdout，基准测试期间临时重定向到空设备"""
+    sys.stdout.flush()
+    saved = os.dup(1)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    try:
+        os.dup2(devnull, 1)
+        yield
+    finally:
+        sys.stdout.flush()
+        os.dup2(saved, 1)
+        os.close(devnull)
+        os.close(saved)
+
+
+def timed_solve(config):
+    """运行一次完整排课 (含无解时的冲突诊断)，返回 (结果, 耗时秒)"""
+    start = time.time()
+    with suppress_solver_log():
+        result = normal.run_scheduler(config)
+    return result, time.time() - start
+
+
+def print_table(headers, rows):
+    widths = [max(len(str(h)), *(len(str(r[i])) for r in rows)) for i, h in enumerate(headers)]
+    print("  ".join(str(h).ljust(w) for h, w in zip(headers, widths)))
+    for row in rows:
+        print("  ".join(str(v).ljust(w) for v, w in zip(row, widths)))
+
+
+# ============ symmetry: 对称破缺 ============
+
+def latin_config(n):
+    """
+    n 个完全相同的班级，n+1 门课各由一位全校共享的老师任教，每门课每天恰好 1 节。
+    每个时段只有一位老师空闲，而老师四五节不连堂要求每位老师每天都在第4或第5节空闲 -> 无解
+    """
+    subjects = [f"科目{i + 1}" for i in range(n + 1)]
+    return {
+        "num_classes": n,
+        "courses": {s: {"count": 5, "type": "main"} for s in subjects},
+        "teacher_names": {s: [f"老师{i + 1}"] for i, s in enumerate(subjects)},
+        "rules": [{"name": "每科每天一节", "type": "DAILY_LIMIT", "targets": {"subjects": subjects},
+                   "params": {"slots_per_day": list(range(8)), "limit": 1}, "weight": 100}],
+        "use_legacy_rules": False
+    }
+
+
+def capacity_config(n):
+    """
+    n 个完全相同的班级 (各科老师都只教本班)，体育只能排在下午，
+    体育场容量不足以容纳全部体育课 (n >= 7 时无解，属于鸽巢问题)
+    """
+    capacity = -(-3 * n // 20) - 1
+    return {
+        "num_classes": n,
+        "courses": {
+            "语文": {"count": 7, "type": "main"},
+            "数学": {"count": 7, "type": "main"},
+            "英语": {"count": 6, "type": "main"},
+            "体育": {"count": 3, "type": "minor"}
+        },
+        "teacher_names": {
+            "语文": [f"语文{i + 1}" for i in range(n)],
+            "数学": [f"数学{i + 1}" for i in range(n)],
+            "英语": [f"英语{i + 1}" for i in range(n)],
+            "体育": [f"体育{i + 1}" for i in range(n)]
+        },
+        "rules": [
+            {"name": "体育只排下午", "type": "FORBIDDEN_SLOTS", "targets": {"subjects": ["体育"]},
+             "params": {"slots": [[d, p] for d in range(5) for p in range(4)]}, "weight": 100},
+            {"name": "体育场容量", "type": "GLOBAL_CAPACITY", "targets": {"subjects": ["体育"]},
+             "params": {"capacity": max(capacity, 1)}, "weight": 100}
+        ],
+        "use_legacy_rules": False
+    }
+
+
+def bench_symmetry(args):
+    rows = []
+    for family, build in (("latin", latin_config), ("capacity", capacity_config)):
+        for n in args.sizes:
+            config = dict(build(n), max_time_in_seconds=args.time_limit)
+            row = [family, n]
+            for enabled in (False, True):
+                result, elapsed = timed_solve(dict(config, symmetry_breaking=enabled))
+                status = 'FEASIBLE' if result['status'] == 'success' else result.get('solver_status', result.get('error_type'))
+                row += [status, f"{elapsed:.1f}s"]
+            rows.append(row)
+            print(f"  {family} n={n}: 关闭 {row[3]} / 开启 {row[5]}", file=sys.stderr)
+    print_table(["配置", "班级数", "关闭-结果", "关闭-耗时", "开启-结果", "开启-耗时"], rows)
+
+
+# ============ encoding: 建模方式 ============
+
+def school_config(n):
+    """默认课程设置 (含绍兴一中预设规则) 的 n 个班级，老师由系统自动分配"""
+    return dict(normal.DEFAULT_CONFIG, num_classes=n)
+
+
+def bench_encoding(args):
+    cases = [("school", n, school_config(n)) for n in args.sizes]
+    cases.append(("latin", 8, latin_config(8)))  # 无解配置，对比证明耗时
+    rows = []
+    for family, n, config in cases:
+        for encoding in ("boolean", "compact"):
+            config = dict(config, model_encoding=encoding, max_time_in_seconds=args.time_limit)
+            result, elapsed = timed_solve(config)
+            stats = result.get('model_stats') or {}
+            status = 'FEASIBLE' if result['status'] == 'success' else result.get('solver_status', result.get('error_type'))
+            rows.append([family, n, encoding, stats.get('variables', '-'), stats.get('constraints', '-'),
+                         f"{stats.get('build_seconds', 0):.2f}s", f"{stats.get('solve_seconds', 0):.1f}s",
+                         status, f"{elapsed:.1f}s"])
+            print(f"  {family} n={n} {encoding}: {status} {elapsed:.1f}s", file=sys.stderr)
+    print_table(["配置", "班级数", "编码", "变量数", "约束数", "建模", "求解", "结果", "总耗时"], rows)
+
+
+# ============ localsearch: 求解引擎 ============
+
+def large_school_config(n):
+    """
+    默认课程设置的 n 个班级；体育老师只有周五可排 (SPECIAL_DAYS)，
+    场地容量按班级数放大到 ceil(3n/7)，否则 40 个班以上预设本身无解
+    """
+    rules = copy.deepcopy(normal.SHAOXING_PRESET_RULES)
+    for rule in rules:
+        if rule['type'] == 'GLOBAL_CAPACITY':
+            rule['params']['capacity'] = max(rule['params']['capacity'], math.ceil(3 * n / 7))
+    return dict(normal.DEFAULT_CONFIG, num_classes=n, rules=rules)
+
+
+def bench_localsearch(args):
+    rows = []
+    for n in args.sizes:
+        for engine in ("cpsat", "local_search"):
+            config = dict(large_school_config(n), engine=engine, max_time_in_seconds=args.time_limit)
+            result, elapsed = timed_solve(config)
+            info = result.get('solve_info') or {}
+            if result['status'] == 'success':
+                status = info.get('solver_status', 'FEASIBLE')
+                hard = info.get('hard_violations', 0)
+                objective = info.get('objective', '-')
+            else:
+                status = result.get('solver_status', result.get('error_type'))
+                hard, objective = '-', '-'
+            rows.append([n, engine, status, hard, objective, f"{elapsed:.1f}s"])
+            print(f"  n={n} {engine}: {status} hard={hard} objective={objective} {elapsed:.1f}s", file=sys.stderr)
+    print_table(["班级数", "引擎", "结果", "硬约束违反", "软罚分", "总耗时"], rows)
+
+
+# ============ lazy: 规则懒加载 ============
+
+def rule_heavy_config(n):
+    """
+    大规模学校预设 (见 large_school_config) 之外，每位任课老师再加 3 条个人规则:
+    每天最多 5 节、上午最多 3 节、不连上 4 节。规则数以百计，但大部分在只满足核心约束的课表中就已满足
+    """
+    config = large_school_config(n)
+    prepared = normal.run_scheduler(config, prepare_only=True)
+    teaching = set(prepared['class_teacher_map'].values())
+    names = sorted({t['name'] for t in prepared['teachers_db'] if t['id'] in teaching})
+    rules = list(config['rules'])
+    for name in names:
+        target = {"names": [name]}
+        rules.append({"name": f"{name}每天最多5节", "type": "DAILY_LIMIT", "targets": target,
+                      "params": {"slots_per_day": list(range(8)), "limit": 5}, "weight": 100})
+        rules.append({"name": f"{name}上午最多3节", "type": "DAILY_LIMIT", "targets": target,
+                      "params": {"slots_per_day": [0, 1, 2, 3], "limit": 3}, "weight": 100})
+        rules.append({"name": f"{name}不连上4节", "type": "CONSECUTIVE", "targets": target,
+                      "params": {"mode": "avoid", "max": 3}, "weight": 100})
+    return dict(config, rules=rules)
+
+
+def bench_lazy(args):
+    rows = []
+    for n in args.sizes:
+        base = rule_heavy_config(n)
+        for mode in ("feasible_first", "optimal"):
+            for lazy in (False, True):
+                config = dict(base, lazy_rules=lazy, mode=mode, max_time_in_seconds=args.time_limit)
+                result, elapsed = timed_solve(config)
+                stats = result.get('model_stats') or {}
+                info = result.get('solve_info') or {}
+                rounds = len((result.get('lazy_rules') or {}).get('rounds', [])) or '-'
+                status = info.get('solver_status', result.get('error_type'))
+                rows.append([n, len(config['rules']), mode, "懒加载" if lazy else "全部", stats.get('variables', '-'),
+                             stats.get('constraints', '-'), f"{stats.get('build_seconds', 0):.2f}s",
+                             f"{stats.get('solve_seconds', 0):.1f}s", rounds, status,
+                             info.get('objective', '-'), f"{elapsed:.1f}s"])
+                print(f"  n={n} {mode} lazy={lazy}: {status} {elapsed:.1f}s", file=sys.stderr)
+    print_table(["班级数", "规则数", "模式", "规则加载", "变量数", "约束数", "建模", "求解", "轮数", "结果", "目标值", "总耗时"], rows)
+
+
+# ============ assumptions: 老师禁排 / 固定课程的假设文字 ============
+
+def constrained_config(n):
+    """
+    大规模学校预设 (见 large_school_config)，取一份可行课表:
+    每位任课老师在课表里空闲的前 6 个时段设为禁排，每个班级固定 4 节课，保证配置仍然有解
+    (固定课程会计入分片的并发需求，同一时段同一科目只固定一个班级，避免老师分配随之改变)
+    返回 (有解配置, 矛盾配置)；矛盾配置把 1 班第一节固定课程挪到任课老师的一个禁排时段
+    """
+    config = large_school_config(n)
+    with suppress_solver_log():
+        result = normal.run_scheduler(dict(config, mode="feasible_first", max_time_in_seconds=120))
+    busy = {}
+    fixed = {}
+    taken = set()
+    for (c, d, p), cell in sorted(result['schedule'].items()):
+        busy.setdefault(cell['teacher_name'], set()).add((d, p))
+        if len(fixed.setdefault(str(c), {})) < 4 and (d, p, cell['subject']) not in taken:
+            taken.add((d, p, cell['subject']))
+            fixed[str(c)][f"{d}_{p}"] = cell['subject']
+    unavailable = {}
+    for name, slots in busy.items():
+        free = [[d, p] for d in range(5) for p in range(8) if (d, p) not in slots]
+        unavailable[name] = free[:6]
+    # 挪到的时段没有其他班级固定同一科目、不与 1 班其他固定课程重叠，也避开四五节 (不连堂规则)，只留下这一处矛盾
+    (c, d, p), cell = next(item for item in sorted(result['schedule'].items()) if item[0][0] == 1)
+    d0, p0 = next(s for s in unavailable[cell['teacher_name']]
+                  if (s[0], s[1], cell['subject']) not in taken and f"{s[0]}_{s[1]}" not in fixed["1"] and s[1] not in (3, 4))
+    broken_fixed = copy.deepcopy(fixed)
+    del broken_fixed["1"][f"{d}_{p}"]
+    broken_fixed["1"][f"{d0}_{p0}"] = cell['subject']
+    constraints = {"teacher_unavailable": unavailable, "fixed_courses": fixed}
+    return (dict(config, constraints=constraints),
+            dict(config, constraints=dict(constraints, fixed_courses=broken_fixed)))
+
+
+def bench_assumptions(args):
+    rows = []
+    for n in args.sizes:
+        config, broken = constrained_config(n)
+        for label, case in (("有解", config), ("矛盾", broken)):
+            result, elapsed = timed_solve(dict(case, max_time_in_seconds=args.time_limit))
+            stats = result.get('model_stats') or {}
+            info = result.get('solve_info') or {}
+            status = info.get('solver_status', result.get('solver_status', result.get('error_type')))
+            core = next((s for s in result.get('suggestions', []) if s.startswith('🎯')), '-')
+            rows.append([n, label, stats.get('assumptions', '-'), f"{stats.get('solve_seconds', 0):.1f}s",
+                         status, f"{elapsed:.1f}s", core])
+            print(f"  n={n} {label}: {status} {elapsed:.1f}s", file=sys.stderr)
+    print_table(["班级数", "配置", "假设文字", "求解", "结果", "总耗时", "冲突核心"], rows)
+
+
+def parse_sizes(value):
+    return [int(v) for v in value.split(',') if v.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="排课求解基准测试")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    symmetry = subparsers.add_parser("symmetry", help="对称破缺: INFEASIBLE 配置的证明耗时")
+    symmetry.add_argument("--sizes", type=parse_sizes, default=[6, 8, 10])
+    symmetry.add_argument("--time-limit", type=float, default=120.0)
+    symmetry.set_defaults(func=bench_symmetry)
+
+    encoding = subparsers.add_parser("encoding", help="建模方式: boolean / compact 的模型规模与耗时")
+    encoding.add_argument("--sizes", type=parse_sizes, default=[10, 20, 40])
+    encoding.add_argument("--time-limit", type=float, default=120.0)
+    encoding.set_defaults(func=bench_encoding)
+
+    localsearch = subparsers.add_parser("localsearch", help="求解引擎: CP-SAT / 局部搜索的解质量与耗时")
+    localsearch.add_argument("--sizes", type=parse_sizes, default=[60, 120, 200])
+    localsearch.add_argument("--time-limit", type=float, default=120.0)
+    localsearch.set_defaults(func=bench_localsearch)
+
+    lazy = subparsers.add_parser("lazy", help="规则懒加载: 规则繁多时的模型规模与耗时")
+    lazy.add_argument("--sizes", type=parse_sizes, default=[20, 60, 120])
+    lazy.add_argument("--time-limit", type=float, default=120.0)
+    lazy.set_defaults(func=bench_lazy)
+
+    assumptions = subparsers.add_parser("assumptions", help="假设文字: 大量老师禁排/固定课程时的求解与冲突诊断耗时")
+    assumptions.add_argument("--sizes", type=parse_sizes, default=[20, 60, 120])
+    assumptions.add_argument("--time-limit", type=float, default=120.0)
+    assumptions.set_defaults(func=bench_assumptions)
+
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,16 +8,19 @@ from datetime import datetime
 logger = logging.getLogger(__name__)
 
 class ScheduleDatabase:
-    def __init__(self, db_path="schedule.db", json_dir="saved_schedules"):
+    def __init__(self, db_path="schedule.db", json_dir="saved_schedules", solver_tables=True):
         """初始化数据库连接和迁移
-        
+
         Args:
             db_path: SQLite数据库路径
             json_dir: 旧版JSON文件存储目录(用于迁移)
+            solver_tables: 是否立即创建求解缓存/后台任务表；为 False 时由调用方在服务启动时调用 init_solver_tables
         """
         self.db_path = db_path
         self.json_dir = Path(json_dir)
         self.init_db()
+        if solver_tables:
+            self.init_solver_tables()
         self.migrate_from_json()
 
     def get_connection(self):
@@ -43,6 +46,36 @@ class ScheduleDatabase:
         except Exception as e:
             logger.error(f"Failed to init database: {e}")
 
+    def init_solver_tables(self):
+        """初始化求解结果缓存与后台排课任务表"""
+        try:
+            with self.get_connection() as conn:
+                # 求解结果缓存: 以规范化配置哈希为键，相同配置直接复用上次的排课结果
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS result_cache (
+                        cache_key TEXT PRIMARY KEY,
+                        created_at TEXT,
+                        last_used_at TEXT,
+                        hit_count INTEGER DEFAULT 0,
+                        result_data TEXT
+                    )
+                ''')
+                # 后台排课任务: 任务元数据与当前最优解检查点，Web 进程重启后可查看并继续求解
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS solve_jobs (
+                        job_id TEXT PRIMARY KEY,
+                        state TEXT,
+                        created_at REAL,
+                        updated_at REAL,
+                        finished_at REAL,
+                        config_data TEXT,
+                        checkpoint_data TEXT,
+                        summary_data TEXT
+                    )
+                ''')
+        except Exception as e:
+            logger.error(f"Failed to init solver tables: {e}")
+
     def migrate_from_json(self):
         """从旧版JSON文件迁移数据"""
         if not self.json_dir.exists():
@@ -205,3 +238,135 @@ class ScheduleDatabase:
                 "status": "error",
                 "message": f"删除失败: {str(e)}"
             }
+
+    # ============ 求解结果缓存 ============
+
+    def get_cached_result(self, cache_key):
+        """按配置哈希读取缓存的求解结果，命中时刷新最近使用时间；未命中返回 None"""
+        try:
+            with self.get_connection() as conn:
+                row = conn.execute('SELECT result_data FROM result_cache WHERE cache_key = ?', (cache_key,)).fetchone()
+                if not row:
+                    return None
+                conn.execute(
+                    'UPDATE result_cache SET last_used_at = ?, hit_count = hit_count + 1 WHERE cache_key = ?',
+                    (datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f"), cache_key)
+                )
+            return json.loads(row['result_data'])
+        except Exception as e:
+            logger.error(f"Read result cache error: {e}")
+            return None
+
+    def put_cached_result(self, cache_key, result_data, max_entries=50):
+        """写入求解结果缓存，超过 max_entries 时淘汰最久未使用的条目"""
+        try:
+            now = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
+            with self.get_connection() as conn:
+                conn.execute('''
+                    INSERT OR REPLACE INTO result_cache
+                    (cache_key, created_at, last_used_at, hit_count, result_data)
+                    VALUES (?, ?, ?, 0, ?)
+                ''', (cache_key, now, now, json.dumps(result_data, ensure_ascii=False)))
+                conn.execute('''
+                    DELETE FROM result_cache WHERE cache_key NOT IN (
+                        SELECT cache_key FROM result_cache ORDER BY last_used_at DESC LIMIT ?
+                    )
+                ''', (max_entries,))
+            return True
+        except Exception as e:
+            logger.error(f"Write result cache error: {e}")
+            return False
+
+    def clear_result_cache(self):
+        """清空求解结果缓存，返回删除的条目数"""
+        try:
+            with self.get_connection() as conn:
+                return conn.execute('DELETE FROM result_cache').rowcount
+        except Exception as e:
+            logger.error(f"Clear result cache error: {e}")
+            return 0
+
+    # ============ 后台排课任务 ============
+
+    def save_job(self, job_id, config, state, created_at, max_jobs=200):
+        """登记新提交的排课任务，超过 max_jobs 时删除最早的已结束任务"""
+        try:
+            with self.get_connection() as conn:
+                conn.execute('''
+                    INSERT OR REPLACE INTO solve_jobs (job_id, state, created_at, updated_at, config_data)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (job_id, state, created_at, created_at, json.dumps(config, ensure_ascii=False)))
+                conn.execute('''
+                    DELETE FROM solve_jobs WHERE finished_at IS NOT NULL AND job_id NOT IN (
+                        SELECT job_id FROM solve_jobs ORDER BY created_at DESC LIMIT ?
+                    )
+                ''', (max_jobs,))
+            return True
+        except Exception as e:
+            logger.error(f"Save job error: {e}")
+            return False
+
+    def update_job(self, job_id, state, finished=False, summary=None):
+        """更新任务状态；finished 时记录结束时间，summary 为结果摘要 (schedule_id、状态、提示信息等)"""
+        try:
+            now = datetime.now().timestamp()
+            with self.get_connection() as conn:
+                conn.execute('''
+                    UPDATE solve_jobs SET state = ?, updated_at = ?,
+                        finished_at = CASE WHEN ? THEN ? ELSE finished_at END,
+                        summary_data = COALESCE(?, summary_data)
+                    WHERE job_id = ?
+                ''', (state, now, finished, now,
+                      json.dumps(summary, ensure_ascii=False) if summary is not None else None, job_id))
+            return True
+        except Exception as e:
+            logger.error(f"Update job error: {e}")
+            return False
+
+    def checkpoint_job(self, job_id, checkpoint):
+        """保存任务的当前最优解检查点 (目标值 + 紧凑课表快照)"""
+        try:
+            with self.get_connection() as conn:
+                conn.execute(
+                    'UPDATE solve_jobs SET checkpoint_data = ?, updated_at = ? WHERE job_id = ?',
+                    (json.dumps(checkpoint, ensure_ascii=False), datetime.now().timestamp(), job_id)
+                )
+            return True
+        except Exception as e:
+            logger.error(f"Checkpoint job error: {e}")
+            return False
+
+    def load_job(self, job_id):
+        """读取任务记录 (含配置、检查点与结果摘要)，不存在返回 None"""
+        try:
+            with self.get_connection() as conn:
+                row = conn.execute('SELECT * FROM solve_jobs WHERE job_id = ?', (job_id,)).fetchone()
+            if not row:
+                return None
+            return {
+                "job_id": row['job_id'],
+                "state": row['state'],
+                "created_at": row['created_at'],
+                "updated_at": row['updated_at'],
+                "finished_at": row['finished_at'],
+                "config": json.loads(row['config_data']) if row['config_data'] else {},
+                "checkpoint": json.loads(row['checkpoint_data']) if row['checkpoint_data'] else None,
+                "summary": json.loads(row['summary_data']) if row['summary_data'] else None
+            }
+        except Exception as e:
+            logger.error(f"Load job error: {e}")
+            return None
+
+    def mark_interrupted_jobs(self, states=("queued", "running")):
+        """服务启动时调用: 上次进程退出时仍在排队/求解的任务标记为 interrupted，返回标记的数量"""
+        try:
+            now = datetime.now().timestamp()
+            placeholders = ",".join("?" * len(states))
+            with self.get_connection() as conn:
+                return conn.execute(
+                    f'UPDATE solve_jobs SET state = ?, updated_at = ?, finished_at = ? WHERE state IN ({placeholders})',
+                    ("interrupted", now, now, *states)
+                ).rowcount
+        except Exception as e:
+            logger.error(f"Mark interrupted jobs error: {e}")
+            return 0
@@ -0,0 +1,273 @@
+"""
+年级分解求解模块
+主课老师 ID 按年级划分 (t_{name}_{grade})，年级之间只通过跨年级任课的老师 (主要是副科老师)
+和全校容量规则 (GLOBAL_CAPACITY) 相互影响。分解求解分三步:
+1. 预留: 把每位跨年级老师的可用时段分给各年级，把全校容量按需求拆给各年级
+2. 并行: 预留之后各年级子问题互不相关，交给求解进程池并行求解
+3. 修复: 合并各年级结果，在全量模型上做增量重排 (冻结 + 逐级放宽) 修复残余的跨年级冲突
+"""
+import collections
+import copy
+import logging
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import normal
+
+logger = logging.getLogger(__name__)
+
+# decompose="auto" (默认) 时，多年级且班级总数达到该规模才启用分解求解
+AUTO_DECOMPOSE_MIN_CLASSES = 100
+
+
+def should_decompose(config):
+    """根据配置判断是否走分解求解 (decompose: true / false / "auto")"""
+    mode = config.get('decompose', 'auto')
+    grades = config.get('grades') or {}
+    if not mode or len(grades) < 2 or config.get('incremental'):
+        return False
+    if mode == 'auto':
+        return sum(int(info.get('count', 0)) for info in grades.values()) >= AUTO_DECOMPOSE_MIN_CLASSES
+    return True
+
+
+def _slot_units(days, periods):
+    """
+    时段分配单元，按 节次 -> 星期 的顺序排列，使每个年级分到的时段分散在一周各天
+    上午最后一节与下午第一节 (第4、5节) 绑定为一个单元，避免老师在两个年级之间连堂
+    """
+    units = []
+    for p in range(periods):
+        for d in range(days):
+            if periods > 4 and p == 3:
+                units.append([(d, 3), (d, 4)])
+            elif periods > 4 and p == 4:
+                continue
+            else:
+                units.append([(d, p)])
+    return units
+
+
+def reserve_teacher_slots(loads, blocked, days, periods, pressure=None):
+    """
+    把一位跨年级老师的可用时段按各年级周课时成比例地分给各年级
+    loads: {年级: 周课时}，blocked: 该老师本来就禁排的时段
+    pressure: {年级: Counter(时段)}，记录已为该年级其他老师预留过的时段；
+              优先挑该年级预留较少的时段，避免同一班级的几位老师被预留到同一批时段
+    返回 {年级: set((d, p))}；可用时段不够任一年级的课时时返回 None
+    """
+    units = []
+    for unit in _slot_units(days, periods):
+        unit = [slot for slot in unit if slot not in blocked]
+        if unit:
+            units.append(unit)
+    available = sum(len(unit) for unit in units)
+    total = sum(loads.values())
+    if total == 0 or total > available:
+        return None
+    if pressure is None:
+        pressure = collections.defaultdict(collections.Counter)
+
+    assigned = {g: set() for g in loads}
+    remaining = list(units)
+    # 课时多的年级先挑，每个年级先拿到按比例的份额
+    for grade in sorted(loads, key=loads.get, reverse=True):
+        quota = loads[grade] * available // total
+        while len(assigned[grade]) < quota and remaining:
+            unit = min(remaining, key=lambda u: sum(pressure[grade][slot] for slot in u) / len(u))
+            remaining.remove(unit)
+            assigned[grade].update(unit)
+    # 取整后剩下的零头分给离份额最远的年级
+    for unit in remaining:
+        grade = max(loads, key=lambda g: loads[g] * available / total - len(assigned[g]))
+        assigned[grade].update(unit)
+
+    if any(len(assigned[g]) < loads[g] for g in loads):
+        return None
+    for grade, slots in assigned.items():
+        pressure[grade].update(slots)
+    return assigned
+
+
+def split_capacity(capacity, demands, num_slots):
+    """
+    把全校每时段容量拆给各年级: 先满足每个年级的最低需要 (周需求 / 时段数 向上取整)，
+    剩余容量按需求比例分配。最低需要之和超过容量时返回 None
+    """
+    total = sum(demands.values())
+    shares = {g: math.ceil(d / num_slots) for g, d in demands.items()}
+    if sum(shares.values()) > capacity:
+        return None
+    for _ in range(capacity - sum(shares.values())):
+        grade = max(demands, key=lambda g: demands[g] / total * capacity - shares[g])
+        shares[grade] += 1
+    return shares
+
+
+def plan_decomposition(config, prepared):
+    """
+    根据全量配置和 run_scheduler(prepare_only=True) 的分配结果生成各年级子问题
+    返回 {"grades", "subconfigs", "coupled_teachers", "coupled_classes", "capacity_shares"}；
+    无法拆分 (单一年级、跨年级老师时段不足、容量不够拆) 时返回 None
+    """
+    class_metadata = prepared['class_metadata']
+    class_teacher_map = prepared['class_teacher_map']
+    days, periods = prepared['days'], prepared['periods']
+    t_id_to_name = {t['id']: t['name'] for t in prepared['teachers_db']}
+
+    grade_classes = collections.defaultdict(list)
+    for c in prepared['classes']:
+        grade_classes[class_metadata[c]['grade']].append(c)
+    if len(grade_classes) < 2:
+        return None
+
+    # 1. 找出跨年级任课的老师 (按自然人姓名) 及其在各年级的周课时
+    loads = collections.defaultdict(lambda: collections.defaultdict(int))
+    for (c, s), tid in class_teacher_map.items():
+        base_subj = s.replace('_AUTO_SUB', '')
+        if base_subj in normal.ACTIVITY_SUBJECTS:
+            continue
+        course = class_metadata[c]['requirements'].get(s) or class_metadata[c]['requirements'].get(base_subj, {})
+        loads[t_id_to_name.get(tid, tid)][class_metadata[c]['grade']] += int(course.get('count', 0))
+    coupled = {name: dict(g_loads) for name, g_loads in loads.items() if len(g_loads) > 1}
+
+    constraints = config.get('constraints') or {}
+    unavailable = constraints.get('teacher_unavailable') or {}
+    all_slots = [(d, p) for d in range(days) for p in range(periods)]
+    reservations = {}
+    pressure = collections.defaultdict(collections.Counter)
+    # 课时多的老师先预留，可选余地小的先挑
+    for name, g_loads in sorted(coupled.items(), key=lambda item: -sum(item[1].values())):
+        blocked = {tuple(slot) for slot in unavailable.get(name, [])}
+        reserved = reserve_teacher_slots(g_loads, blocked, days, periods, pressure)
+        if reserved is None:
+            logger.info(f"分解求解: 老师 {name} 的可用时段不足以按年级预留，回退整体求解")
+            return None
+        reservations[name] = reserved
+
+    # 2. 全校容量规则按年级拆分
+    rules = prepared['rules']
+    grade_rules = {g: copy.deepcopy(rules) for g in grade_classes}
+    capacity_shares = {}
+    for idx, rule in enumerate(rules):
+        if rule.get('type') != 'GLOBAL_CAPACITY':
+            continue
+        subjects = set(rule.get('targets', {}).get('subjects', []))
+        demands = {}
+        for g, classes in grade_classes.items():
+            demand = sum(int(cfg.get('count', 0)) for c in classes
+                         for s, cfg in class_metadata[c]['requirements'].items() if s in subjects)
+            if demand:
+                demands[g] = demand
+        if not demands:
+            continue
+        shares = split_capacity(int(rule.get('params', {}).get('capacity', 1)), demands, len(all_slots))
+        if shares is None:
+            logger.info(f"分解求解: 容量规则 {rule.get('name')} 无法按年级拆分，回退整体求解")
+            return None
+        capacity_shares[rule.get('name', f'Rule_{idx}')] = shares
+        for g in grade_classes:
+            grade_rules[g][idx]['params'] = dict(rule.get('params', {}), capacity=shares.get(g, 0))
+
+    # 3. 生成子问题配置: 预留之外的时段作为该老师在本年级的禁排时段
+    subconfigs = {}
+    for g, classes in grade_classes.items():
+        grade_unavailable = dict(unavailable)
+        for name, reserved in reservations.items():
+            if g in reserved:
+                extra = [[d, p] for d, p in all_slots if (d, p) not in reserved[g]]
+                grade_unavailable[name] = list(unavailable.get(name, [])) + extra
+        subconfigs[g] = dict(
+            config,
+            decompose_grade=g,
+            num_classes=len(classes),
+            rules=grade_rules[g],
+            constraints=dict(constraints, teacher_unavailable=grade_unavailable)
+        )
+
+    coupled_classes = {c for (c, s), tid in class_teacher_map.items() if t_id_to_name.get(tid, tid) in coupled}
+    return {
+        "grades": {g: classes for g, classes in grade_classes.items()},
+        "subconfigs": subconfigs,
+        "coupled_teachers": sorted(coupled),
+        "coupled_classes": coupled_classes,
+        "capacity_shares": capacity_shares
+    }
+
+
+def solve_decomposed(config, solve_func, progress=None, max_parallel=None, cancel=None):
+    """
+    分解求解入口，返回与 run_scheduler 相同结构的纯数据结果 (附加 decomposition 报告)
+    solve_func(config, progress=None, cancel=None) -> 纯数据结果，例如 SolverProcessPool.solve
+    cancel: 可选的取消事件，传给各年级子问题与修复阶段的求解
+    """
+    prepared = normal.run_scheduler(config, prepare_only=True)
+    if prepared['status'] != 'success':
+        return prepared  # 预检失败 (老师姓名错误、课时超限等)，与整体求解的提示一致
+
+    plan = plan_decomposition(config, prepared)
+    if plan is None:
+        return solve_func(config, progress=progress, cancel=cancel)
+
+    grades = list(plan['grades'])
+    logger.info(f"分解求解: {len(grades)} 个年级并行，跨年级老师 {len(plan['coupled_teachers'])} 位")
+    if progress:
+        progress({
+            "type": "decomposition",
+            "grades": {g: len(classes) for g, classes in plan['grades'].items()},
+            "coupled_teachers": len(plan['coupled_teachers'])
+        })
+
+    if config.get('cpu_grant'):
+        # 准入控制分给本次求解的核数由并行的各年级平分
+        share = max(1, int(config['cpu_grant']) // min(len(grades), max_parallel or len(grades)))
+        for grade in grades:
+            plan['subconfigs'][grade]['cpu_grant'] = share
+
+    def solve_grade(grade):
+        grade_progress = (lambda event: progress(dict(event, grade=grade))) if progress else None
+        start = time.time()
+        result = solve_func(plan['subconfigs'][grade], progress=grade_progress, cancel=cancel)
+        return grade, result, time.time() - start
+
+    with ThreadPoolExecutor(max_workers=max_parallel or len(grades), thread_name_prefix="grade-solve") as executor:
+        outcomes = list(executor.map(solve_grade, grades))
+
+    hint_cells = []
+    grade_reports = []
+    for grade, result, elapsed in outcomes:
+        grade_reports.append({
+            "grade": grade,
+            "classes": len(plan['grades'][grade]),
+            "status": result['status'],
+            "elapsed": round(elapsed, 2)
+        })
+        if result['status'] == 'success':
+            hint_cells.extend(
+                [c, d, p, info['subject'].replace('_AUTO_SUB', ''), info.get('teacher_name', '')]
+                for (c, d, p), info in result['schedule'].items()
+            )
+        else:
+            # 该年级的班级不在合并结果中，修复阶段会作为受影响班级重新求解
+            logger.warning(f"分解求解: 年级 {grade} 子问题失败 ({result.get('message')})，交由修复阶段处理")
+
+    # 修复: 全量模型上冻结合并结果，先验证，再逐级放开跨年级老师涉及的班级
+    start = time.time()
+    repair_config = dict(
+        config,
+        hint_cells=hint_cells,
+        base_config=config,
+        incremental=True,
+        incremental_release=sorted(plan['coupled_classes'])
+    )
+    if cancel is not None and cancel.is_set():
+        return normal.cancelled_result()
+    result = solve_func(repair_config, progress=progress, cancel=cancel)
+    result['decomposition'] = {
+        "grades": grade_reports,
+        "coupled_teachers": plan['coupled_teachers'],
+        "capacity_shares": plan['capacity_shares'],
+        "repair_elapsed": round(time.time() - start, 2)
+    }
+    return result
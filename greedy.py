@@ -0,0 +1,468 @@
+"""
+[新增] 贪心构造排课: 不经过 CP-SAT，在一秒内为全校生成一份接近可行的课表
+- 用途一: 前端配置时的即时预览 (POST /api/preview)
+- 用途二: 作为 CP-SAT 的解提示 (配置 "greedy_hints": true)，让求解器从一份大体合理的课表出发
+遵守的约束: 每格一节、各科周课时、老师 (自然人) 同时段只上一节、老师四五节不连堂、
+固定课程、禁排时段/特殊日/老师禁排，以及硬规则中的 ZONE_COUNT / DAILY_LIMIT / GLOBAL_CAPACITY / CONSECUTIVE(avoid)；
+软禁排规则只作为选时段的偏好，其余规则 (固定时段等) 不保证，由 verify_rules 报告
+"""
+import collections
+import logging
+import random
+import time
+
+import numpy as np
+
+import normal
+
+logger = logging.getLogger(__name__)
+
+# 选择时段的打分 (越小越好): 同科同天已有课时 > 软禁排规则权重 > 班级当天课时数
+SAME_DAY_PENALTY = 100
+DAY_LOAD_PENALTY = 1
+
+
+class _Bundle:
+    """一个 (班级, 科目) 的全部课时: 任课老师、可排时段、已排时段与相关规则"""
+    __slots__ = ("key", "ci", "tid", "person", "lessons", "allowed", "slots",
+                 "zones", "daily_limits", "consecutive", "capacities", "preference")
+
+    def __init__(self, key, ci, tid, person, lessons, allowed):
+        self.key = key
+        self.ci = ci
+        self.tid = tid
+        self.person = person  # 参与冲突检查的自然人序号，活动课虚拟老师为 None
+        self.lessons = lessons
+        self.allowed = allowed
+        self.slots = []
+        self.zones = []  # [(时段掩码, 最少, 最多)]
+        self.daily_limits = []  # [(每天受限时段掩码列表, 上限)]
+        self.consecutive = []  # [最多连堂节数]
+        self.capacities = []  # [规则序号]
+        self.preference = np.zeros(len(allowed), dtype=int)  # 软禁排规则的权重 (负数为奖励)
+
+
+class GreedyScheduler:
+    """
+    按 "最受限的课先排" 逐节放置，每节课在当前可排的时段中选同科同天最少、班级当天最空的时段；
+    放不下的课尝试把本班占住某个时段的另一节课挪走 (一层弹出修复)
+    """
+
+    def __init__(self, classes, class_metadata, class_teacher_map, teachers_db, lessons,
+                 forbidden_slots, days, periods, rules=None, fixed_courses=None, seed=0):
+        self.classes = list(classes)
+        self.class_metadata = class_metadata
+        self.class_teacher_map = class_teacher_map
+        self.days = days
+        self.periods = periods
+        self.num_slots = days * periods
+        self.rng = random.Random(seed)
+        self.t_id_to_name = {t['id']: t['name'] for t in teachers_db}
+
+        # 时段序号 s = d * periods + p
+        slot_period = np.arange(self.num_slots) % periods
+        # 老师四五节不连堂: 第4节 (p=3) 与第5节 (p=4) 互为对方的 "邻节"
+        self.partner = np.full(self.num_slots, -1)
+        if periods > 4:
+            self.partner[slot_period == 3] = np.flatnonzero(slot_period == 4)
+            self.partner[slot_period == 4] = np.flatnonzero(slot_period == 3)
+        self.has_partner = self.partner >= 0
+
+        # 参与冲突检查的自然人 (按姓名聚合分身)，只教活动课的虚拟老师不参与
+        taught = collections.defaultdict(set)
+        for (c, s), tid in class_teacher_map.items():
+            taught[self.t_id_to_name.get(tid)].add(s)
+        persons = sorted(name for name, subjects in taught.items()
+                         if name is not None and not subjects.issubset(normal.ACTIVITY_SUBJECTS))
+        person_index = {name: i for i, name in enumerate(persons)}
+
+        class_index = {c: i for i, c in enumerate(self.classes)}
+        self.class_busy = np.zeros((len(self.classes), self.num_slots), dtype=bool)
+        self.person_busy = np.zeros((len(persons), self.num_slots), dtype=bool)
+        self.cells = {}  # (班级序号, 时段) -> bundle
+        self.person_cells = {}  # (自然人序号, 时段) -> bundle
+        self.fixed_keys = collections.defaultdict(set)  # 时段 -> 预排在该时段的 (班级, 科目)，修复时不挪动
+
+        self.bundles = {}
+        for (c, subj), n in lessons.items():
+            if n <= 0 or c not in class_index:
+                continue
+            tid = class_teacher_map.get((c, subj))
+            allowed = np.ones(self.num_slots, dtype=bool)
+            for d, p in forbidden_slots.get((c, subj), ()):
+                if 0 <= d < days and 0 <= p < periods:
+                    allowed[d * periods + p] = False
+            self.bundles[(c, subj)] = _Bundle(
+                (c, subj), class_index[c], tid, person_index.get(self.t_id_to_name.get(tid)), n, allowed
+            )
+
+        self.capacity_limits = []
+        self.capacity_counts = []
+        self.teacher_daily_limits = collections.defaultdict(list)  # tid -> [(每天受限时段掩码列表, 上限)]
+        self.teacher_consecutive = collections.defaultdict(list)  # tid -> [最多连堂节数]
+        self._index_rules(rules or [], teachers_db)
+        self.tid_bundles = collections.defaultdict(list)
+        for bundle in self.bundles.values():
+            self.tid_bundles[bundle.tid].append(bundle)
+
+        self.fixed = []
+        for c_str, fixes in (fixed_courses or {}).items():
+            for slot_key, subj in fixes.items():
+                try:
+                    d_str, p_str = slot_key.split('_')
+                    self.fixed.append((int(c_str), int(d_str), int(p_str), subj))
+                except (ValueError, TypeError):
+                    continue
+
+    def _index_rules(self, rules, teachers_db):
+        """
+        把规则中能在放置时检查的部分挂到对应的 (班级, 科目) 上:
+        硬规则作为可排时段的过滤条件，软禁排规则 (FORBIDDEN_SLOTS, weight < 100) 作为选时段时的偏好
+        """
+        index = normal.RuleIndex(teachers_db, self.class_metadata)
+        tid_keys = collections.defaultdict(list)
+        for key, tid in self.class_teacher_map.items():
+            tid_keys[tid].append(key)
+
+        for rule in rules:
+            weight = rule.get('weight', 100)
+            r_type = rule.get('type')
+            params = rule.get('params', {})
+            targets = rule.get('targets', {})
+            if r_type not in ('ZONE_COUNT', 'DAILY_LIMIT', 'GLOBAL_CAPACITY', 'CONSECUTIVE', 'FORBIDDEN_SLOTS'):
+                continue
+            filtered = index.filter_targets(targets)
+            bundles = [self.bundles[key] for key in filtered['class_subjects'] if key in self.bundles]
+            tids = set(filtered['teacher_ids'])
+            if not tids and targets.get('tags') == ['所有老师']:
+                tids = set(self.class_teacher_map.values())
+
+            if r_type == 'FORBIDDEN_SLOTS':
+                # 硬禁排已在 compute_forbidden_slots 中处理
+                if weight < 100:
+                    slots = self._slot_mask(params.get('slots', []))
+                    keys = {key for tid in tids for key in tid_keys.get(tid, ())}
+                    keys.update(bundle.key for bundle in bundles)
+                    for key in keys:
+                        if key in self.bundles:
+                            self.bundles[key].preference[slots] += weight
+                continue
+            # 规则引擎对 DAILY_LIMIT 始终施加硬约束 (软规则也不例外)，其余软规则不参与构造
+            if weight < 100 and r_type != 'DAILY_LIMIT':
+                continue
+
+            if r_type == 'ZONE_COUNT':
+                zone = self._slot_mask(params.get('slots', []))
+                count = int(params.get('count', 0))
+                rel = params.get('relation', '==')
+                low = count if rel in ('==', '>=') else 0
+                high = count if rel in ('==', '<=') else self.num_slots
+                for bundle in bundles:
+                    bundle.zones.append((zone, low, high))
+
+            elif r_type == 'DAILY_LIMIT':
+                periods = set(params.get('slots_per_day', []))
+                day_masks = [self._slot_mask([(d, p) for p in periods]) for d in range(self.days)]
+                limit = int(params.get('limit', 1))
+                for bundle in bundles:
+                    bundle.daily_limits.append((day_masks, limit))
+                for tid in tids:
+                    self.teacher_daily_limits[tid].append((day_masks, limit))
+
+            elif r_type == 'CONSECUTIVE' and params.get('mode', 'avoid') == 'avoid':
+                limit = int(params.get('max', 1))
+                # 与规则引擎一致: 任课老师已受同一规则限制的 (班级, 科目) 不再单独检查
+                for bundle in bundles:
+                    if bundle.tid not in tids:
+                        bundle.consecutive.append(limit)
+                for tid in tids:
+                    self.teacher_consecutive[tid].append(limit)
+
+            elif r_type == 'GLOBAL_CAPACITY':
+                # 与规则引擎一致: 按 targets.subjects 的原科目名统计
+                subjects = set(targets.get('subjects', []))
+                rule_no = len(self.capacity_limits)
+                self.capacity_limits.append(int(params.get('capacity', 1)))
+                self.capacity_counts.append(np.zeros(self.num_slots, dtype=int))
+                for bundle in self.bundles.values():
+                    if bundle.key[1] in subjects:
+                        bundle.capacities.append(rule_no)
+
+    def _slot_mask(self, slots):
+        mask = np.zeros(self.num_slots, dtype=bool)
+        for d, p in slots:
+            if 0 <= d < self.days and 0 <= p < self.periods:
+                mask[d * self.periods + p] = True
+        return mask
+
+    # ---------- 放置与撤销 ----------
+
+    def _place(self, bundle, s):
+        bundle.slots.append(s)
+        self.class_busy[bundle.ci, s] = True
+        self.cells[(bundle.ci, s)] = bundle
+        if bundle.person is not None:
+            self.person_busy[bundle.person, s] = True
+            self.person_cells[(bundle.person, s)] = bundle
+        for rule_no in bundle.capacities:
+            self.capacity_counts[rule_no][s] += 1
+
+    def _remove(self, bundle, s):
+        bundle.slots.remove(s)
+        self.class_busy[bundle.ci, s] = False
+        del self.cells[(bundle.ci, s)]
+        if bundle.person is not None:
+            self.person_busy[bundle.person, s] = False
+            del self.person_cells[(bundle.person, s)]
+        for rule_no in bundle.capacities:
+            self.capacity_counts[rule_no][s] -= 1
+
+    def _candidates(self, bundle):
+        """该 (班级, 科目) 的下一节课当前可以放在哪些时段"""
+        mask = bundle.allowed & ~self.class_busy[bundle.ci]
+        if bundle.person is not None:
+            busy = self.person_busy[bundle.person]
+            mask &= ~busy & ~(self.has_partner & busy[self.partner])
+
+        remaining = bundle.lessons - len(bundle.slots)
+        placed = np.zeros(self.num_slots, dtype=bool)
+        placed[bundle.slots] = True
+        for zone, low, high in bundle.zones:
+            in_zone = int(np.count_nonzero(placed & zone))
+            if in_zone >= high:
+                mask &= ~zone
+            elif low - in_zone >= remaining:
+                mask &= zone
+        for day_masks, limit in bundle.daily_limits:
+            for day_mask in day_masks:
+                if np.count_nonzero(placed & day_mask) >= limit:
+                    mask &= ~day_mask
+        for limit in bundle.consecutive:
+            mask &= ~self._run_too_long(placed, limit)
+
+        daily_limits = self.teacher_daily_limits.get(bundle.tid, ())
+        consecutive = self.teacher_consecutive.get(bundle.tid, ())
+        if daily_limits or consecutive:
+            taught = np.zeros(self.num_slots, dtype=bool)
+            for other in self.tid_bundles[bundle.tid]:
+                taught[other.slots] = True
+            for day_masks, limit in daily_limits:
+                for day_mask in day_masks:
+                    if np.count_nonzero(taught & day_mask) >= limit:
+                        mask &= ~day_mask
+            for limit in consecutive:
+                mask &= ~self._run_too_long(taught, limit)
+        for rule_no in bundle.capacities:
+            mask &= self.capacity_counts[rule_no] < self.capacity_limits[rule_no]
+        return mask
+
+    def _run_too_long(self, taught, limit):
+        """在哪些时段再排一节会出现超过 limit 节的连堂: 包含该时段、长 limit+1 的窗口里其余各节都已有课"""
+        width = limit + 1
+        if width > self.periods:
+            return np.zeros(self.num_slots, dtype=bool)
+        grid = taught.reshape(self.days, self.periods)
+        cumulative = np.zeros((self.days, self.periods + 1), dtype=int)
+        np.cumsum(grid, axis=1, out=cumulative[:, 1:])
+        full = (cumulative[:, width:] - cumulative[:, :-width]) >= limit
+        blocked = np.zeros(grid.shape, dtype=bool)
+        for offset in range(width):
+            blocked[:, offset:offset + full.shape[1]] |= full
+        return blocked.ravel() & ~taught
+
+    def _choose(self, bundle, mask):
+        """同科尽量分散到不同的天，其次照顾软禁排规则，再选班级当天课少的时段"""
+        options = np.flatnonzero(mask)
+        if not len(options):
+            return None
+        same_day = np.zeros(self.days, dtype=int)
+        for s in bundle.slots:
+            same_day[s // self.periods] += 1
+        day_load = self.class_busy[bundle.ci].reshape(self.days, self.periods).sum(axis=1)
+        option_days = options // self.periods
+        scores = same_day[option_days] * SAME_DAY_PENALTY + bundle.preference[options] + \
+            day_load[option_days] * DAY_LOAD_PENALTY
+        best = options[scores == scores.min()]
+        return int(best[self.rng.randrange(len(best))])
+
+    def _blockers(self, bundle, s):
+        """
+        占住时段 s、使本课无法排入的课: 本班该格的课、同一老师该时段及四五节邻节的课；
+        场地容量已满时再加上一节同时段、还有其他时段可排的同场地课
+        """
+        found = []
+        if (bundle.ci, s) in self.cells:
+            found.append((self.cells[(bundle.ci, s)], s))
+        if bundle.person is not None:
+            for t in (s, int(self.partner[s])):
+                other = self.person_cells.get((bundle.person, t)) if t >= 0 else None
+                if other is not None and (other, t) not in found:
+                    found.append((other, t))
+        for rule_no in bundle.capacities:
+            if self.capacity_counts[rule_no][s] < self.capacity_limits[rule_no] or \
+                    any(rule_no in other.capacities for other, t in found if t == s):
+                continue
+            sharing = (self.cells.get((ci, s)) for ci in range(len(self.classes)))
+            movable = next((other for other in sharing if other is not None and rule_no in other.capacities
+                            and np.count_nonzero(self._candidates(other)) > 0), None)
+            if movable is None:
+                return []
+            found.append((movable, s))
+        return found
+
+    def _repair(self, bundle):
+        """
+        一层弹出修复: 在本课的可排时段中找被其他课占住的时段，把占位的课 (最多各一节) 挪到它们各自的其他可排时段，
+        再把本课排进去；任何一步失败都恢复原状。预排课程不挪动
+        """
+        for s in np.flatnonzero(bundle.allowed):
+            s = int(s)
+            blockers = self._blockers(bundle, s)
+            if not blockers or any(other.key in self.fixed_keys.get(t, ()) for other, t in blockers):
+                continue
+            for other, t in blockers:
+                self._remove(other, t)
+            if not self._candidates(bundle)[s]:
+                for other, t in blockers:
+                    self._place(other, t)
+                continue
+            self._place(bundle, s)
+            moved = []
+            for other, t in blockers:
+                mask = self._candidates(other)
+                mask[t] = False
+                target = self._choose(other, mask)
+                if target is None:
+                    break
+                self._place(other, target)
+                moved.append((other, target))
+            if len(moved) == len(blockers):
+                return True
+            for other, target in moved:
+                self._remove(other, target)
+            self._remove(bundle, s)
+            for other, t in blockers:
+                self._place(other, t)
+        return False
+
+    # ---------- 主流程 ----------
+
+    def run(self):
+        start = time.time()
+        fixed_conflicts = []
+        for c, d, p, subj in self.fixed:
+            bundle = self.bundles.get((c, subj))
+            if bundle is None or not (0 <= d < self.days and 0 <= p < self.periods):
+                continue
+            s = d * self.periods + p
+            if len(bundle.slots) < bundle.lessons and self._candidates(bundle)[s]:
+                self._place(bundle, s)
+                self.fixed_keys[s].add(bundle.key)
+            else:
+                fixed_conflicts.append([c, d, p, subj])
+
+        # 最受限的先排: 可排时段减去课时数 (余量) 越小越先；余量相同时任课老师总课时多的先排
+        person_load = collections.Counter()
+        for bundle in self.bundles.values():
+            person_load[bundle.person] += bundle.lessons
+        order = sorted(
+            self.bundles.values(),
+            key=lambda b: (int(np.count_nonzero(b.allowed)) - b.lessons,
+                           -person_load[b.person] if b.person is not None else 0,
+                           b.ci)
+        )
+
+        unplaced = collections.Counter()
+        repaired = 0
+        for bundle in order:
+            while len(bundle.slots) < bundle.lessons:
+                s = self._choose(bundle, self._candidates(bundle))
+                if s is not None:
+                    self._place(bundle, s)
+                elif self._repair(bundle):
+                    repaired += 1
+                else:
+                    unplaced[bundle.key] = bundle.lessons - len(bundle.slots)
+                    break
+
+        total = sum(b.lessons for b in self.bundles.values())
+        stats = {
+            "lessons": total,
+            "placed": total - sum(unplaced.values()),
+            "unplaced": sum(unplaced.values()),
+            "repaired": repaired,
+            "fixed_conflicts": fixed_conflicts,
+            "seconds": round(time.time() - start, 3)
+        }
+        return self.formatted_schedule(), [
+            {"class": c, "subject": subj.replace('_AUTO_SUB', ''), "count": n}
+            for (c, subj), n in sorted(unplaced.items())
+        ], stats
+
+    def formatted_schedule(self):
+        """与 run_scheduler 相同格式: {(c, d, p): {"subject", "teacher_name", "teacher_id"}}"""
+        schedule = {}
+        for (ci, s), bundle in self.cells.items():
+            c, subj = bundle.key
+            schedule[(c, s // self.periods, s % self.periods)] = {
+                "subject": subj,
+                "teacher_name": self.t_id_to_name.get(bundle.tid, ""),
+                "teacher_id": bundle.tid
+            }
+        return schedule
+
+
+def hint_cells(schedule):
+    """把课表转成热启动使用的基准格子 [[c, d, p, 科目显示名, 老师名], ...]"""
+    return [[c, d, p, info['subject'].replace('_AUTO_SUB', ''), info.get('teacher_name', '')]
+            for (c, d, p), info in sorted(schedule.items())]
+
+
+def build_greedy_schedule(config, seed=0):
+    """
+    为配置生成贪心课表 (不建 CP-SAT 模型)
+    返回与 run_scheduler 成功结果相同的课表相关字段，外加:
+    - unplaced: 放不下的课 [{"class", "subject", "count"}]
+    - greedy: 课时总数、已放置数、修复次数、耗时等统计
+    配置本身有误 (老师姓名不存在、课时超限等) 时原样返回 run_scheduler 的错误结果
+    """
+    start = time.time()
+    prepared = normal.run_scheduler(config, prepare_only=True)
+    if prepared.get('status') != 'success':
+        return prepared
+
+    constraints = config.get('constraints', {}) or {}
+    rules = prepared['rules']
+    forbidden = normal.compute_forbidden_slots(
+        rules, prepared['teachers_db'], prepared['class_metadata'], prepared['class_teacher_map'],
+        constraints.get('teacher_unavailable', {}), prepared['days'], prepared['periods']
+    )
+    scheduler = GreedyScheduler(
+        prepared['classes'], prepared['class_metadata'], prepared['class_teacher_map'], prepared['teachers_db'],
+        prepared['lessons'], forbidden, prepared['days'], prepared['periods'],
+        rules=rules, fixed_courses=constraints.get('fixed_courses'), seed=seed
+    )
+    schedule, unplaced, stats = scheduler.run()
+    rule_report = normal.verify_rules(
+        schedule, rules, prepared['class_metadata'], prepared['teachers_db'], prepared['class_teacher_map'],
+        prepared['days'], prepared['periods']
+    )
+    stats["total_seconds"] = round(time.time() - start, 3)
+    logger.info(f"贪心构造: {stats['placed']}/{stats['lessons']} 节已排，"
+                f"{stats['repaired']} 次修复，构造 {stats['seconds']}s (含准备 {stats['total_seconds']}s)")
+
+    return {
+        "status": "success" if not unplaced else "partial",
+        "schedule": schedule,
+        "unplaced": unplaced,
+        "rule_report": rule_report,
+        "greedy": stats,
+        "teachers_db": prepared['teachers_db'],
+        "class_teacher_map": prepared['class_teacher_map'],
+        "classes": prepared['classes'],
+        "days": prepared['days'],
+        "periods": prepared['periods'],
+        "courses": prepared['courses'],
+        "class_names": {c: prepared['class_metadata'][c]['name'] for c in prepared['classes']},
+        "resources": config.get('resources', [])
+    }
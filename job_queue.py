@@ -0,0 +1,375 @@
+"""
+排课任务队列模块
+将耗时的求解过程放到后台线程池执行，HTTP 请求只负责提交任务和轮询状态，
+避免长时间占用请求线程导致代理超时。
+"""
+import threading
+import time
+import uuid
+import logging
+import collections
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# 任务状态
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCESS = "success"
+JOB_ERROR = "error"
+JOB_CANCELLED = "cancelled"
+# [新增] 持久化任务的状态: 进程重启时未完成 (interrupted)、已由新任务继续 (resumed)
+JOB_INTERRUPTED = "interrupted"
+JOB_RESUMED = "resumed"
+
+FINISHED_STATES = (JOB_SUCCESS, JOB_ERROR, JOB_CANCELLED)
+# 可以用检查点作为提示继续求解的状态 (success: 进程重启后内存会话已丢失，可据检查点重新生成)
+RESUMABLE_STATES = (JOB_INTERRUPTED, JOB_CANCELLED, JOB_ERROR, JOB_SUCCESS)
+
+
+class SolveJob:
+    """单个排课任务的状态记录"""
+    def __init__(self, job_id, config):
+        self.job_id = job_id
+        self.config = config
+        self.state = JOB_QUEUED
+        self.result = None        # 任务完成后的返回数据 (可直接 jsonify)
+        self.http_status = 200    # 同步接口原本应返回的 HTTP 状态码
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.done_event = threading.Event()
+        self.cancel_event = threading.Event()  # [新增] 取消请求 (求解器据此停止搜索)
+        # 求解进度: 每个事件带递增序号 seq，课表快照只保留最新一份
+        self.progress_seq = 0
+        self.latest_progress = None
+        self.latest_snapshot = None
+        self.latest_snapshot_seq = 0
+        self.latest_snapshot_event = None  # 附带最新快照的那条进度事件 (目标值与快照一致)
+        self.checkpoint_seq = 0        # 最近一次写入检查点的快照序号
+        self.checkpoint_at = None
+        self._progress_cond = threading.Condition()
+
+    def publish_progress(self, event):
+        """接收求解器推送的进度事件 (在任务线程中调用)"""
+        event = dict(event)
+        snapshot = event.pop("snapshot", None)
+        with self._progress_cond:
+            self.progress_seq += 1
+            event["seq"] = self.progress_seq
+            self.latest_progress = event
+            if snapshot is not None:
+                self.latest_snapshot = snapshot
+                self.latest_snapshot_seq = self.progress_seq
+                self.latest_snapshot_event = event
+            self._progress_cond.notify_all()
+
+    def wait_for_progress(self, since, timeout):
+        """长轮询: 等待出现序号大于 since 的进度事件或任务结束，最多等待 timeout 秒"""
+        with self._progress_cond:
+            self._progress_cond.wait_for(
+                lambda: self.progress_seq > since or self.done_event.is_set(), timeout
+            )
+
+    def progress_dict(self, since=0):
+        """进度快照: 最新事件，以及 since 之后更新过的课表快照"""
+        with self._progress_cond:
+            data = {"seq": self.progress_seq, "latest": self.latest_progress}
+            if self.latest_snapshot is not None and self.latest_snapshot_seq > since:
+                data["snapshot"] = self.latest_snapshot
+                data["snapshot_seq"] = self.latest_snapshot_seq
+            return data
+
+    def to_dict(self, include_result=True, since=0):
+        """导出为可 JSON 序列化的状态快照"""
+        now = time.time()
+        data = {
+            "job_id": self.job_id,
+            "state": self.state,
+            "created_at": self.created_at,
+            "wait_seconds": round((self.started_at or now) - self.created_at, 2),
+            "elapsed_seconds": round((self.finished_at or now) - self.started_at, 2) if self.started_at else 0,
+        }
+        if self.error:
+            data["error"] = self.error
+        if self.cancel_event.is_set():
+            data["cancel_requested"] = True
+        if self.progress_seq:
+            data["progress"] = self.progress_dict(since)
+        if include_result and self.state in FINISHED_STATES:
+            data["result"] = self.result
+            data["http_status"] = self.http_status
+        return data
+
+
+class SolveJobManager:
+    """
+    后台排课任务管理器
+    solve_func(config, progress) -> (result_dict, http_status)，在工作线程中执行
+    progress 为该任务的进度回调 (SolveJob.publish_progress)
+    cancellable: 为 True 时以 solve_func(config, progress, cancel=SolveJob.cancel_event) 调用
+    store: 可选的任务持久化存储 (ScheduleDatabase)，保存任务元数据，并每隔 checkpoint_interval 秒
+           把当前最优解快照写入检查点；进程重启后可查询这些任务并以检查点为提示继续求解
+    """
+    def __init__(self, solve_func, max_workers=2, max_finished_jobs=200, cancellable=False,
+                 store=None, checkpoint_interval=30.0):
+        self.solve_func = solve_func
+        self.cancellable = cancellable
+        self.store = store
+        self.checkpoint_interval = checkpoint_interval
+        self.max_finished_jobs = max_finished_jobs
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="solve-job")
+        self._jobs = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, config):
+        """提交任务，立即返回 job_id"""
+        job_id = str(uuid.uuid4())
+        job = SolveJob(job_id, config)
+        with self._lock:
+            self._jobs[job_id] = job
+            self._trim_finished()
+        if self.store is not None:
+            self.store.save_job(job_id, config, job.state, job.created_at, max_jobs=self.max_finished_jobs)
+        self._executor.submit(self._run, job)
+        logger.info(f"排课任务已提交 [{job_id}]")
+        return job_id
+
+    def get(self, job_id):
+        """获取任务对象 (不存在返回 None)"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def status(self, job_id, include_result=True, since=0, wait=0):
+        """
+        获取任务状态快照 (不存在返回 None)
+        since/wait: 长轮询参数，最多等待 wait 秒直到出现 since 之后的新进度或任务结束
+        """
+        job = self.get(job_id)
+        if not job:
+            return self.persisted_status(job_id)
+        if wait > 0 and not job.done_event.is_set():
+            job.wait_for_progress(since, wait)
+        return job.to_dict(include_result, since)
+
+    def persisted_status(self, job_id):
+        """[新增] 内存中没有的任务 (如进程重启前提交的) 从持久化存储读取: 状态、结果摘要与最后的检查点"""
+        saved = self.store.load_job(job_id) if self.store is not None else None
+        if not saved:
+            return None
+        data = {
+            "job_id": saved["job_id"],
+            "state": saved["state"],
+            "created_at": saved["created_at"],
+            "finished_at": saved["finished_at"],
+            "persisted": True,
+            "resumable": saved["state"] in RESUMABLE_STATES and bool(saved["config"]),
+            "summary": saved["summary"]
+        }
+        checkpoint = saved["checkpoint"]
+        if checkpoint:
+            # 与运行中任务的进度结构一致，前端可以直接渲染最后的检查点课表
+            data["progress"] = {
+                "seq": checkpoint.get("seq", 0),
+                "latest": {k: v for k, v in checkpoint.items() if k != "snapshot"},
+                "snapshot": checkpoint["snapshot"],
+                "snapshot_seq": checkpoint.get("seq", 0)
+            }
+        return data
+
+    def resume(self, job_id, build_config):
+        """
+        [新增] 继续一个已中断/取消/失败的持久化任务: build_config(saved) 根据保存的配置和检查点生成新任务的配置
+        返回新任务的 job_id；任务不存在或不可继续时返回 None
+        """
+        job = self.get(job_id)
+        if job is not None and job.state not in FINISHED_STATES:
+            return None
+        saved = self.store.load_job(job_id) if self.store is not None else None
+        if not saved or saved["state"] not in RESUMABLE_STATES or not saved["config"]:
+            return None
+        new_job_id = self.submit(build_config(saved))
+        self.store.update_job(job_id, JOB_RESUMED, summary=dict(saved["summary"] or {}, resumed_as=new_job_id))
+        logger.info(f"排课任务 [{job_id}] 以检查点为提示继续求解 -> [{new_job_id}]")
+        return new_job_id
+
+    def wait(self, job_id, timeout=None):
+        """阻塞等待任务结束 (主要用于测试和同步调用)"""
+        job = self.get(job_id)
+        if not job:
+            return None
+        job.done_event.wait(timeout)
+        return job.to_dict()
+
+    def cancel(self, job_id, timeout=0):
+        """
+        [新增] 取消任务: 排队中的任务直接结束；运行中的任务通知求解器停止搜索，
+        最多等待 timeout 秒让它交回当前最优解 ([修改] 默认不等待，最终状态由任务状态查询给出)。
+        返回任务状态快照 (不存在返回 None)
+        """
+        job = self.get(job_id)
+        if not job:
+            return None
+        with self._lock:
+            if job.state == JOB_QUEUED:
+                # 尚未开始求解: 直接结束，工作线程取到该任务时跳过
+                job.cancel_event.set()
+                job.result = {"status": "cancelled", "message": "任务在开始求解前已取消"}
+                job.state = JOB_CANCELLED
+                job.finished_at = time.time()
+                job.done_event.set()
+                logger.info(f"排课任务已取消 (排队中) [{job_id}]")
+                if self.store is not None:
+                    self.store.update_job(job_id, JOB_CANCELLED, finished=True, summary=job.result)
+        if job.state not in FINISHED_STATES:
+            job.cancel_event.set()
+            logger.info(f"排课任务取消请求 [{job_id}] - 正在停止求解")
+            job.done_event.wait(timeout)
+        return job.to_dict()
+
+    def shutdown(self, wait=False):
+        self._executor.shutdown(wait=wait)
+
+    def _run(self, job):
+        with self._lock:
+            if job.state == JOB_CANCELLED:
+                return  # 排队期间已取消
+            job.state = JOB_RUNNING
+            job.started_at = time.time()
+        if self.store is not None:
+            self.store.update_job(job.job_id, JOB_RUNNING)
+        progress = job.publish_progress if self.store is None else (lambda event: self._publish(job, event))
+        try:
+            if self.cancellable:
+                result, http_status = self.solve_func(job.config, progress, cancel=job.cancel_event)
+            else:
+                result, http_status = self.solve_func(job.config, progress)
+            job.result = result
+            job.http_status = http_status
+            status = result.get("status")
+            job.state = JOB_SUCCESS if status in ("success", "partial") else JOB_CANCELLED if status == "cancelled" else JOB_ERROR
+        except Exception as e:
+            logger.error(f"排课任务异常 [{job.job_id}]: {str(e)}", exc_info=True)
+            job.error = str(e)
+            job.result = {"status": "error", "error_type": "system_error", "message": f"系统错误: {str(e)}"}
+            job.http_status = 500
+            job.state = JOB_ERROR
+        finally:
+            job.finished_at = time.time()
+            if self.store is not None:
+                self._checkpoint(job)
+                self.store.update_job(job.job_id, job.state, finished=True, summary=self._summary(job))
+            job.done_event.set()
+            with job._progress_cond:
+                job._progress_cond.notify_all()
+            logger.info(f"排课任务结束 [{job.job_id}] - 状态: {job.state}, 耗时 {job.finished_at - job.started_at:.1f}s")
+
+    def _publish(self, job, event):
+        """转发进度事件，并按 checkpoint_interval 节流写入当前最优解检查点"""
+        job.publish_progress(event)
+        if job.checkpoint_at is None or time.time() - job.checkpoint_at >= self.checkpoint_interval:
+            self._checkpoint(job)
+
+    def _checkpoint(self, job):
+        """把最新的课表快照 (若比上次检查点新) 写入持久化存储"""
+        with job._progress_cond:
+            if job.latest_snapshot is None or job.latest_snapshot_seq <= job.checkpoint_seq:
+                return
+            latest = job.latest_snapshot_event or {}
+            checkpoint = {
+                "seq": job.latest_snapshot_seq,
+                "objective": latest.get("objective"),
+                "best_bound": latest.get("best_bound"),
+                "solution_index": latest.get("solution_index"),
+                "elapsed": latest.get("elapsed"),
+                "saved_at": time.time(),
+                "snapshot": job.latest_snapshot
+            }
+            job.checkpoint_seq = job.latest_snapshot_seq
+        job.checkpoint_at = time.time()
+        self.store.checkpoint_job(job.job_id, checkpoint)
+
+    @staticmethod
+    def _summary(job):
+        """持久化的结果摘要 (完整课表只保存在内存会话中)"""
+        result = job.result or {}
+        summary = {k: result[k] for k in ("status", "schedule_id", "message", "error_type") if result.get(k) is not None}
+        summary["http_status"] = job.http_status
+        return summary
+
+    def _trim_finished(self):
+        """限制已完成任务的保留数量，防止内存无限增长"""
+        finished = [jid for jid, j in self._jobs.items() if j.state in FINISHED_STATES]
+        for jid in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self._jobs[jid]
+
+
+class InflightSolve:
+    """一次正在进行的求解，相同配置的后续请求挂在它上面等待结果"""
+    def __init__(self, key):
+        self.key = key
+        self.result = None
+        self.followers = 0
+        self.started_at = time.time()
+        self.done_event = threading.Event()
+        self._subscribers = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, progress):
+        with self._lock:
+            self._subscribers.append(progress)
+
+    def publish(self, event):
+        """把领头求解的进度事件转发给所有订阅者 (领头请求自己也是订阅者)"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for progress in subscribers:
+            try:
+                progress(event)
+            except Exception as e:
+                logger.warning(f"进度转发失败 [{self.key[:12]}]: {e}")
+
+    def wait(self, timeout=None):
+        self.done_event.wait(timeout)
+        return self.result
+
+
+class InflightSolves:
+    """
+    进行中求解的登记表 (按配置内容哈希)
+    第一个请求成为领头者负责求解，求解结束前到达的相同请求只等待领头者的结果，不再建模
+    """
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def join(self, key, progress=None):
+        """登记一次求解请求，返回 (flight, is_leader)"""
+        with self._lock:
+            flight = self._flights.get(key)
+            is_leader = flight is None
+            if is_leader:
+                flight = InflightSolve(key)
+                self._flights[key] = flight
+            else:
+                flight.followers += 1
+        if progress:
+            flight.subscribe(progress)
+        return flight, is_leader
+
+    def finish(self, flight, result):
+        """领头者结束 (result 为 None 表示求解未完成，等待者需要自行求解)"""
+        with self._lock:
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+        flight.result = result
+        flight.done_event.set()
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            return [
+                {"key": f.key[:12], "followers": f.followers, "running_seconds": round(now - f.started_at, 2)}
+                for f in self._flights.values()
+            ]
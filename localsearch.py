@@ -0,0 +1,670 @@
+"""
+[新增] 局部搜索求解引擎 (模拟退火)，供 CP-SAT 模型过大、经常超时的超大规模学校使用
+配置 "engine": "local_search" 时 run_scheduler 转交本模块:
+- 初始解: 贪心构造 (greedy)，放不下的课先填进本班空格
+- 课表为数组 (班级 x 时段 -> 课程序号)，邻域为同一班级内两个格子互换 (课时数与每格一节始终成立)
+- 目标与 CP-SAT 模型一致: 硬约束违反按 HARD_WEIGHT 计罚，软规则按权重计罚；
+  支持 apply_universal_rules 的全部规则类型，每步只重算互换涉及的课程/老师/时段 (增量评估)
+- 结果与 run_scheduler 成功结果的格式相同，规则验算由 verify_rules 给出；
+  仍有硬约束违反时 status 为 "partial" (不可当作可行课表缓存)
+"""
+import collections
+import logging
+import math
+import random
+import time
+
+import normal
+import greedy
+
+logger = logging.getLogger(__name__)
+
+# 每违反一次硬约束的罚分，远大于任何软规则权重之和的变化量
+HARD_WEIGHT = 10000
+# 未指定时间上限时的搜索时长 (秒)
+DEFAULT_TIME_SECONDS = 120.0
+# 目标值多久未改善即提前结束: 按课时总数缩放 (每千节课 STALL_SECONDS_PER_KILO_LESSONS 秒)，限制在上下限之间
+MIN_STALL_SECONDS = 2.0
+DEFAULT_STALL_SECONDS = 20.0
+STALL_SECONDS_PER_KILO_LESSONS = 3.0
+# 模拟退火温度: 按已用时间比例从初温指数下降到终温
+INITIAL_TEMPERATURE = 40.0
+FINAL_TEMPERATURE = 0.5
+# 每隔多少步检查一次时间/取消并推送进度
+CHECK_EVERY = 1024
+PROGRESS_INTERVAL = 1.0
+
+
+def _windows_over(counts, limit):
+    """一天的逐节课时数中，长 limit+1 且课时数超过 limit 的窗口个数 (连堂规则的违反次数)"""
+    width = limit + 1
+    if width > len(counts):
+        return 0
+    total = sum(counts[:width])
+    over = 1 if total > limit else 0
+    for p in range(width, len(counts)):
+        total += counts[p] - counts[p - width]
+        if total > limit:
+            over += 1
+    return over
+
+
+class LocalSearchState:
+    """
+    数组表示的课表及其增量评估所需的计数:
+    grid[班级序号][时段] = 课程序号 (-1 为空堂)，时段 s = d * periods + p
+    课程 = 一个 (班级, 科目)，附带任课老师、自然人、逐时段的线性罚分与只涉及本课程的规则项
+    """
+
+    def __init__(self, prepared, forbidden_slots, rules):
+        self.classes = list(prepared['classes'])
+        self.class_metadata = prepared['class_metadata']
+        self.class_teacher_map = prepared['class_teacher_map']
+        self.days = prepared['days']
+        self.periods = prepared['periods']
+        self.num_slots = self.days * self.periods
+        self.t_id_to_name = {t['id']: t['name'] for t in prepared['teachers_db']}
+
+        class_index = {c: i for i, c in enumerate(self.classes)}
+        tids = sorted({tid for tid in self.class_teacher_map.values() if tid is not None}, key=str)
+        self.tid_index = {tid: i for i, tid in enumerate(tids)}
+        taught = collections.defaultdict(set)
+        for (c, s), tid in self.class_teacher_map.items():
+            taught[self.t_id_to_name.get(tid)].add(s)
+        persons = sorted(name for name, subjects in taught.items()
+                         if name is not None and not subjects.issubset(normal.ACTIVITY_SUBJECTS))
+        person_index = {name: i for i, name in enumerate(persons)}
+        self.person_names = persons
+        # 硬约束罚分项的系数为 None，计算时取 hard_weight (统计软罚分时临时置 0)
+        self.hard_weight = HARD_WEIGHT
+
+        # 课程表
+        self.keys, self.bundle_class, self.bundle_tid, self.bundle_person, self.lessons = [], [], [], [], []
+        self.linear, self.linear_soft, self.bundle_terms, self.bundle_caps = [], [], [], []
+        self.bundle_of = {}
+        for (c, subj), n in sorted(prepared['lessons'].items(), key=lambda item: (class_index.get(item[0][0], 0), item[0][1])):
+            if n <= 0 or c not in class_index:
+                continue
+            tid = self.class_teacher_map.get((c, subj))
+            self.bundle_of[(c, subj)] = len(self.keys)
+            self.keys.append((c, subj))
+            self.bundle_class.append(class_index[c])
+            self.bundle_tid.append(self.tid_index.get(tid, -1))
+            self.bundle_person.append(person_index.get(self.t_id_to_name.get(tid), -1))
+            self.lessons.append(n)
+            cost = [0] * self.num_slots
+            for d, p in forbidden_slots.get((c, subj), ()):
+                if 0 <= d < self.days and 0 <= p < self.periods:
+                    cost[d * self.periods + p] = HARD_WEIGHT
+            self.linear.append(cost)
+            self.linear_soft.append([0] * self.num_slots)
+            self.bundle_terms.append([])
+            self.bundle_caps.append([])
+
+        self.tid_terms = collections.defaultdict(list)
+        self.caps = []  # [(容量, 每超出一节的罚分)]
+        self._index_rules(rules, prepared['teachers_db'])
+
+        self.grid = [[-1] * self.num_slots for _ in self.classes]
+        self.slots = [set() for _ in self.keys]
+        self.person_count = [[0] * self.num_slots for _ in persons]
+        self.tid_count = [[0] * self.num_slots for _ in tids]
+        self.cap_count = [[0] * self.num_slots for _ in self.caps]
+        self.locked = set()  # 预排课程所在的 (班级序号, 时段)，不参与互换
+        # 老师四五节不连堂 (第4节 p=3、第5节 p=4)
+        self.has_noon_rule = self.periods > 4
+
+    # ---------- 规则 -> 罚分项 ----------
+
+    def _index_rules(self, rules, teachers_db):
+        """与 apply_universal_rules 相同的目标筛选与约束含义，硬规则罚 HARD_WEIGHT，软规则罚其权重"""
+        index = normal.RuleIndex(teachers_db, self.class_metadata)
+        tid_bundles = collections.defaultdict(list)
+        for b, key in enumerate(self.keys):
+            tid_bundles[self.class_teacher_map.get(key)].append(b)
+
+        for rule in rules or []:
+            r_type = rule.get('type')
+            params = rule.get('params', {})
+            targets = rule.get('targets', {})
+            weight = rule.get('weight', 100)
+            hard = weight >= 100
+            filtered = index.filter_targets(targets)
+            bundles = [self.bundle_of[key] for key in filtered['class_subjects'] if key in self.bundle_of]
+            tids = set(filtered['teacher_ids'])
+            all_teachers = targets.get('tags') == ['所有老师']
+
+            if r_type == 'FORBIDDEN_SLOTS':
+                # 硬禁排已由 compute_forbidden_slots 计入线性罚分
+                if hard:
+                    continue
+                # 与规则引擎一致: 同时命中老师与班级-科目的课按两次计罚
+                slots = self._slot_list(params.get('slots', []))
+                affected = bundles + [b for tid in tids for b in tid_bundles.get(tid, ())]
+                for b in affected:
+                    for s in slots:
+                        self._add_linear(b, s, weight)
+
+            elif r_type == 'ZONE_COUNT':
+                zone = frozenset(self._slot_list(params.get('slots', [])))
+                term = ('zone', zone, int(params.get('count', 0)), params.get('relation', '=='),
+                        None if hard else abs(weight))
+                for b in bundles:
+                    self.bundle_terms[b].append(term)
+
+            elif r_type == 'DAILY_LIMIT':
+                # 规则引擎对 DAILY_LIMIT 始终施加硬约束 (软规则也不例外)
+                periods = set(params.get('slots_per_day', []))
+                day_slots = [frozenset(self._slot_list([(d, p) for p in periods])) for d in range(self.days)]
+                term = ('daily', day_slots, int(params.get('limit', 1)))
+                for b in bundles:
+                    self.bundle_terms[b].append(term)
+                for tid in (tids or (self.tid_index if all_teachers else ())):
+                    if tid in self.tid_index:
+                        self.tid_terms[self.tid_index[tid]].append(term)
+
+            elif r_type == 'SPECIAL_DAYS':
+                # 规则引擎对 SPECIAL_DAYS 始终施加硬约束，已由 compute_forbidden_slots 计入
+                continue
+
+            elif r_type == 'CONSECUTIVE' and params.get('mode', 'avoid') == 'avoid':
+                limit = int(params.get('max', 1))
+                term = ('consecutive', limit, None if hard else weight)
+                target_tids = tids or (set(self.tid_index) if all_teachers else set())
+                covered = target_tids if hard else set()
+                for b in bundles:
+                    if self.class_teacher_map.get(self.keys[b]) not in covered:
+                        self.bundle_terms[b].append(term)
+                for tid in target_tids:
+                    if tid in self.tid_index:
+                        self.tid_terms[self.tid_index[tid]].append(term)
+
+            elif r_type == 'FIXED_SLOTS':
+                fixed = frozenset(self._slot_list(params.get('slots', [])))
+                if not fixed:
+                    continue
+                for b in bundles:
+                    if hard:
+                        # 与规则引擎一致: 非固定时段每节罚 1000；课时数等于固定时段数时必须全部排在固定时段，否则至少一节
+                        for s in range(self.num_slots):
+                            if s not in fixed:
+                                self._add_linear(b, s, 1000)
+                        require = len(fixed) if self.lessons[b] == len(fixed) else 1
+                        self.bundle_terms[b].append(('fixed', fixed, require))
+                    else:
+                        for s in fixed:
+                            self._add_linear(b, s, -weight)
+
+            elif r_type == 'GLOBAL_CAPACITY':
+                subjects = set(targets.get('subjects', []))
+                rule_no = len(self.caps)
+                self.caps.append((int(params.get('capacity', 1)), None if hard else weight))
+                for b, (c, subj) in enumerate(self.keys):
+                    if subj in subjects:
+                        self.bundle_caps[b].append(rule_no)
+
+    def _add_linear(self, b, s, weight):
+        self.linear[b][s] += weight
+        self.linear_soft[b][s] += weight
+
+    def _slot_list(self, slots):
+        return [d * self.periods + p for d, p in slots if 0 <= d < self.days and 0 <= p < self.periods]
+
+    # ---------- 罚分计算 ----------
+
+    def _term_cost(self, term, counts_on_day, slots):
+        """计算一个规则项的罚分; counts_on_day(d) 返回该天逐节的课时数列表"""
+        kind = term[0]
+        if kind == 'zone':
+            _, zone, target, rel, factor = term
+            n = len(zone & slots)
+            if factor is not None or rel == '==':
+                # 软规则与规则引擎一致按偏离量计罚
+                return abs(n - target) * (self.hard_weight if factor is None else factor)
+            return max(0, n - target if rel == '<=' else target - n) * self.hard_weight
+        if kind == 'daily':
+            _, day_slots, limit = term
+            return sum(max(0, len(day & slots) - limit) for day in day_slots) * self.hard_weight
+        if kind == 'consecutive':
+            _, limit, factor = term
+            factor = self.hard_weight if factor is None else factor
+            return sum(_windows_over(counts_on_day(d), limit) for d in range(self.days)) * factor
+        if kind == 'fixed':
+            _, fixed, require = term
+            return max(0, require - len(fixed & slots)) * self.hard_weight
+        return 0
+
+    def bundle_cost(self, b):
+        slots = self.slots[b]
+        linear = self.linear[b] if self.hard_weight else self.linear_soft[b]
+        cost = sum(linear[s] for s in slots)
+        if self.bundle_terms[b]:
+            def counts_on_day(d):
+                base = d * self.periods
+                return [1 if base + p in slots else 0 for p in range(self.periods)]
+            for term in self.bundle_terms[b]:
+                cost += self._term_cost(term, counts_on_day, slots)
+        return cost
+
+    def tid_day_cost(self, t, d):
+        """老师 (ID) 某一天的 DAILY_LIMIT / CONSECUTIVE 罚分"""
+        terms = self.tid_terms.get(t)
+        if not terms:
+            return 0
+        base = d * self.periods
+        counts = self.tid_count[t][base:base + self.periods]
+        cost = 0
+        for term in terms:
+            if term[0] == 'daily':
+                day = term[1][d]
+                cost += max(0, sum(self.tid_count[t][s] for s in day) - term[2]) * self.hard_weight
+            elif term[0] == 'consecutive':
+                factor = self.hard_weight if term[2] is None else term[2]
+                cost += _windows_over(counts, term[1]) * factor
+        return cost
+
+    def person_slot_cost(self, person, s):
+        """老师 (自然人) 同一时段多于一节课"""
+        return max(0, self.person_count[person][s] - 1) * self.hard_weight
+
+    def person_day_cost(self, person, d):
+        """老师四五节不连堂"""
+        if not self.has_noon_rule:
+            return 0
+        base = d * self.periods
+        counts = self.person_count[person]
+        return max(0, counts[base + 3] + counts[base + 4] - 1) * self.hard_weight
+
+    def cap_cost(self, rule_no, s):
+        capacity, factor = self.caps[rule_no]
+        return max(0, self.cap_count[rule_no][s] - capacity) * (self.hard_weight if factor is None else factor)
+
+    def total_cost(self):
+        cost = sum(self.bundle_cost(b) for b in range(len(self.keys)))
+        for person in range(len(self.person_count)):
+            cost += sum(self.person_slot_cost(person, s) for s in range(self.num_slots))
+            cost += sum(self.person_day_cost(person, d) for d in range(self.days))
+        for t in self.tid_terms:
+            cost += sum(self.tid_day_cost(t, d) for d in range(self.days))
+        for rule_no in range(len(self.caps)):
+            cost += sum(self.cap_cost(rule_no, s) for s in range(self.num_slots))
+        return cost
+
+    def soft_cost(self):
+        """当前课表的软规则罚分 (与 CP-SAT 的目标值可比)"""
+        self.hard_weight = 0
+        try:
+            return self.total_cost()
+        finally:
+            self.hard_weight = HARD_WEIGHT
+
+    def soft_lower_bound(self):
+        """
+        软罚分的下界: 规则项罚分均非负，线性罚分每门课至多取到其课时数个最小的奖励 (负值)
+        有负系数的规则项时无法给出下界，返回 None
+        """
+        if any(term[0] == 'consecutive' and term[2] is not None and term[2] < 0
+               for terms in list(self.bundle_terms) + list(self.tid_terms.values()) for term in terms) or \
+                any(factor is not None and factor < 0 for _, factor in self.caps):
+            return None
+        return sum(sum(sorted(v for v in self.linear_soft[b] if v < 0)[:self.lessons[b]])
+                   for b in range(len(self.keys)))
+
+    def hard_violations(self):
+        """硬约束违反量 (老师冲突、四五节连堂、硬规则)，即总罚分中 HARD_WEIGHT 的倍数"""
+        return int(round((self.total_cost() - self.soft_cost()) / HARD_WEIGHT))
+
+    # ---------- 修改课表 ----------
+
+    def _set(self, ci, s, b, delta):
+        """把课程 b 放入 (delta=1) 或移出 (delta=-1) 班级 ci 的时段 s"""
+        if delta > 0:
+            self.grid[ci][s] = b
+            self.slots[b].add(s)
+        else:
+            self.grid[ci][s] = -1
+            self.slots[b].discard(s)
+        if self.bundle_person[b] >= 0:
+            self.person_count[self.bundle_person[b]][s] += delta
+        if self.bundle_tid[b] >= 0:
+            self.tid_count[self.bundle_tid[b]][s] += delta
+        for rule_no in self.bundle_caps[b]:
+            self.cap_count[rule_no][s] += delta
+
+    def place(self, ci, s, b):
+        self._set(ci, s, b, 1)
+
+    def _swap(self, ci, s1, s2):
+        b1, b2 = self.grid[ci][s1], self.grid[ci][s2]
+        if b1 >= 0:
+            self._set(ci, s1, b1, -1)
+        if b2 >= 0:
+            self._set(ci, s2, b2, -1)
+        if b1 >= 0:
+            self._set(ci, s2, b1, 1)
+        if b2 >= 0:
+            self._set(ci, s1, b2, 1)
+
+    def _local_cost(self, bundles, s1, s2):
+        """互换只影响这两门课、它们的老师在这两个时段/这两天、以及相关场地在这两个时段的罚分"""
+        d1, d2 = s1 // self.periods, s2 // self.periods
+        days = (d1,) if d1 == d2 else (d1, d2)
+        cost = 0
+        persons, tids, caps = set(), set(), set()
+        for b in bundles:
+            cost += self.bundle_cost(b)
+            if self.bundle_person[b] >= 0:
+                persons.add(self.bundle_person[b])
+            if self.bundle_tid[b] >= 0:
+                tids.add(self.bundle_tid[b])
+            caps.update(self.bundle_caps[b])
+        for person in persons:
+            cost += self.person_slot_cost(person, s1) + self.person_slot_cost(person, s2)
+            for d in days:
+                cost += self.person_day_cost(person, d)
+        for t in tids:
+            for d in days:
+                cost += self.tid_day_cost(t, d)
+        for rule_no in caps:
+            cost += self.cap_cost(rule_no, s1) + self.cap_cost(rule_no, s2)
+        return cost
+
+    def swap_delta(self, ci, s1, s2):
+        """执行互换并返回目标值变化量 (调用方拒绝时再次调用 undo_swap 恢复)"""
+        bundles = [b for b in (self.grid[ci][s1], self.grid[ci][s2]) if b >= 0]
+        before = self._local_cost(bundles, s1, s2)
+        self._swap(ci, s1, s2)
+        return self._local_cost(bundles, s1, s2) - before
+
+    def undo_swap(self, ci, s1, s2):
+        self._swap(ci, s1, s2)
+
+    def snapshot(self):
+        return [row[:] for row in self.grid]
+
+    def restore(self, grid):
+        for ci, row in enumerate(grid):
+            for s in range(self.num_slots):
+                if self.grid[ci][s] >= 0:
+                    self._set(ci, s, self.grid[ci][s], -1)
+        for ci, row in enumerate(grid):
+            for s, b in enumerate(row):
+                if b >= 0:
+                    self._set(ci, s, b, 1)
+
+    def formatted_schedule(self):
+        """与 run_scheduler 相同格式: {(c, d, p): {"subject", "teacher_name", "teacher_id"}}"""
+        schedule = {}
+        for ci, row in enumerate(self.grid):
+            for s, b in enumerate(row):
+                if b >= 0:
+                    c, subj = self.keys[b]
+                    tid = self.class_teacher_map.get((c, subj))
+                    schedule[(c, s // self.periods, s % self.periods)] = {
+                        "subject": subj,
+                        "teacher_name": self.t_id_to_name.get(tid, ""),
+                        "teacher_id": tid
+                    }
+        return schedule
+
+
+def build_initial_state(prepared, config, forbidden_slots, rules, seed):
+    """贪心构造初始课表；放不下的课填进本班线性罚分最小的空格 (违反的硬约束交给搜索修复)"""
+    state = LocalSearchState(prepared, forbidden_slots, rules)
+    constraints = config.get('constraints', {}) or {}
+    schedule, _, greedy_stats = greedy.GreedyScheduler(
+        prepared['classes'], prepared['class_metadata'], prepared['class_teacher_map'], prepared['teachers_db'],
+        prepared['lessons'], forbidden_slots, prepared['days'], prepared['periods'],
+        rules=rules, fixed_courses=constraints.get('fixed_courses'), seed=seed
+    ).run()
+
+    class_index = {c: i for i, c in enumerate(state.classes)}
+    for (c, d, p), info in schedule.items():
+        b = state.bundle_of.get((c, info['subject']))
+        if b is not None:
+            state.place(class_index[c], d * state.periods + p, b)
+
+    overflow = 0
+    for b, (c, subj) in enumerate(state.keys):
+        ci = state.bundle_class[b]
+        for _ in range(state.lessons[b] - len(state.slots[b])):
+            free = [s for s in range(state.num_slots) if state.grid[ci][s] < 0]
+            if not free:
+                overflow += 1
+                continue
+            state.place(ci, min(free, key=lambda s: state.linear[b][s]), b)
+
+    # 预排课程不参与互换
+    for c_str, fixes in (constraints.get('fixed_courses') or {}).items():
+        for slot_key, subj in fixes.items():
+            try:
+                c = int(c_str)
+                d_str, p_str = slot_key.split('_')
+                s = int(d_str) * state.periods + int(p_str)
+            except (ValueError, TypeError):
+                continue
+            if c in class_index and 0 <= s < state.num_slots and \
+                    state.grid[class_index[c]][s] == state.bundle_of.get((c, subj), -2):
+                state.locked.add((class_index[c], s))
+    return state, greedy_stats, overflow
+
+
+def anneal(state, time_limit, stall_seconds, seed, progress=None, cancel=None, deadline_at=None, lower_bound=None):
+    """
+    模拟退火: 随机选一个班级的两个格子互换，变好或持平直接接受，变差按 exp(-delta / T) 接受
+    lower_bound: 软罚分下界，当前最优解没有硬约束违反且达到下界时提前结束 (stop_reason="optimal")
+    返回搜索统计 {"iterations", "accepted", "improvements", "stop_reason", ...}，结束时 state 为找到的最优课表
+    """
+    rng = random.Random(seed)
+    movable = [[s for s in range(state.num_slots) if (ci, s) not in state.locked] for ci in range(len(state.classes))]
+    movable_classes = [ci for ci, slots in enumerate(movable) if len(slots) >= 2]
+
+    cost = state.total_cost()
+    best_cost, best_grid = cost, state.snapshot()
+    start = last_improvement = last_progress = time.time()
+    end = start + time_limit
+    if deadline_at is not None:
+        end = min(end, deadline_at)
+    temperature = INITIAL_TEMPERATURE
+    iterations = accepted = improvements = 0
+    stop_reason = "time_limit"
+    # 总罚分 = 软罚分 + HARD_WEIGHT * 硬违反量，不超过软罚分下界即说明无硬违反且已最优
+    if cancel is not None and cancel.is_set():
+        stop_reason = "cancelled"
+    elif lower_bound is not None and best_cost <= lower_bound:
+        stop_reason = "optimal"
+
+    while movable_classes and stop_reason == "time_limit":
+        iterations += 1
+        if iterations % CHECK_EVERY == 0:
+            now = time.time()
+            if cancel is not None and cancel.is_set():
+                stop_reason = "cancelled"
+                break
+            if now >= end:
+                stop_reason = "deadline" if deadline_at is not None and now >= deadline_at else "time_limit"
+                break
+            if stall_seconds and now - last_improvement >= stall_seconds:
+                stop_reason = "stalled"
+                break
+            fraction = (now - start) / max(1e-6, end - start)
+            temperature = INITIAL_TEMPERATURE * (FINAL_TEMPERATURE / INITIAL_TEMPERATURE) ** fraction
+            if progress and now - last_progress >= PROGRESS_INTERVAL:
+                last_progress = now
+                progress({"type": "solution", "engine": "local_search", "objective": best_cost,
+                          "iterations": iterations, "elapsed": round(now - start, 2)})
+
+        ci = movable_classes[rng.randrange(len(movable_classes))]
+        slots = movable[ci]
+        s1 = slots[rng.randrange(len(slots))]
+        s2 = slots[rng.randrange(len(slots))]
+        row = state.grid[ci]
+        if s1 == s2 or row[s1] == row[s2]:
+            continue
+
+        delta = state.swap_delta(ci, s1, s2)
+        if delta <= 0 or rng.random() < math.exp(-delta / temperature):
+            accepted += 1
+            cost += delta
+            if cost < best_cost:
+                best_cost = cost
+                best_grid = state.snapshot()
+                improvements += 1
+                last_improvement = time.time()
+                if lower_bound is not None and best_cost <= lower_bound:
+                    stop_reason = "optimal"
+                    break
+        else:
+            state.undo_swap(ci, s1, s2)
+
+    state.restore(best_grid)
+    return {
+        "iterations": iterations,
+        "accepted": accepted,
+        "improvements": improvements,
+        "stop_reason": stop_reason,
+        "seconds": round(time.time() - start, 3),
+        "cost": best_cost
+    }
+
+
+def _builtin_report(state):
+    """老师冲突与四五节连堂不是用户规则，verify_rules 不检查，这里按规则报告的格式补充"""
+    report = []
+    conflicts, noon = [], []
+    for person, name in enumerate(state.person_names):
+        for s in range(state.num_slots):
+            if state.person_count[person][s] > 1:
+                conflicts.append(f"{name} 周{s // state.periods + 1}第{s % state.periods + 1}节 同时有 {state.person_count[person][s]} 节课")
+        for d in range(state.days):
+            if state.person_day_cost(person, d):
+                noon.append(f"{name} 周{d + 1} 第4、5节连堂")
+    for name, violations in (("【系统】老师时段冲突", conflicts), ("【系统】老师四五节不连堂", noon)):
+        report.append({
+            "name": name,
+            "type": "SYSTEM",
+            "weight": 100,
+            "is_hard": True,
+            "status": "failed" if violations else "success",
+            "violations": violations[:50],
+            "violation_count": len(violations)
+        })
+    return report
+
+
+class _AssignedValues:
+    """让 evaluate_quality 直接读取已排定的课表 (代替 CpSolver.Value)"""
+
+    def __init__(self, keys):
+        self.keys = keys
+
+    def Value(self, key):
+        return 1 if key in self.keys else 0
+
+
+def solve_local_search(config, progress=None, cancel=None):
+    """
+    局部搜索求解，返回与 run_scheduler 成功结果相同的字段 (不含 solver / vars)
+    solve_info 额外包含 engine、hard_violations 与搜索统计；
+    仍有硬约束违反时 status 为 "partial"，rule_report 中对应规则为 failed
+    """
+    run_start = time.time()
+    prepared = normal.run_scheduler(config, prepare_only=True)
+    if prepared.get('status') != 'success':
+        return prepared
+
+    rules = prepared['rules']
+    constraints = config.get('constraints', {}) or {}
+    forbidden = normal.compute_forbidden_slots(
+        rules, prepared['teachers_db'], prepared['class_metadata'], prepared['class_teacher_map'],
+        constraints.get('teacher_unavailable', {}), prepared['days'], prepared['periods']
+    )
+    seed = int(config.get('random_seed') or 0)
+    build_start = time.time()
+    state, greedy_stats, overflow = build_initial_state(prepared, config, forbidden, rules, seed)
+    model_stats = {
+        "encoding": "local_search",
+        "lessons": sum(state.lessons),
+        "build_seconds": round(time.time() - build_start, 3)
+    }
+
+    solver_params = normal.get_solver_params(config)
+    time_limit = solver_params["max_time_in_seconds"] or DEFAULT_TIME_SECONDS
+    # 未显式配置 stop_rules 时使用局部搜索自己的停滞阈值 (CP-SAT 的默认 60 秒对退火太长)，按课时总数缩放
+    if 'stop_rules' in config:
+        stall_seconds = solver_params["stop_rules"].get("no_improvement_seconds")
+    else:
+        stall_seconds = min(DEFAULT_STALL_SECONDS, max(
+            MIN_STALL_SECONDS, STALL_SECONDS_PER_KILO_LESSONS * model_stats["lessons"] / 1000.0))
+    deadline_at = run_start + float(config['deadline_ms']) / 1000.0 if config.get('deadline_ms') else None
+    if progress:
+        progress({"type": "started", "num_classes": len(state.classes), "max_time_in_seconds": time_limit,
+                  "mode": solver_params["mode"], "engine": "local_search", "warm_start": None})
+
+    lower_bound = state.soft_lower_bound()
+    search = anneal(state, time_limit, stall_seconds, seed, progress, cancel, deadline_at, lower_bound)
+    model_stats["solve_seconds"] = search["seconds"]
+    hard = state.hard_violations()
+    objective = state.soft_cost()
+    logger.info(f"局部搜索: {search['iterations']} 步，硬约束违反 {hard}，软罚分 {objective}，"
+                f"停止原因 {search['stop_reason']}，耗时 {search['seconds']}s")
+
+    schedule = state.formatted_schedule()
+    rule_report = _builtin_report(state) + normal.verify_rules(
+        schedule, rules, prepared['class_metadata'], prepared['teachers_db'], prepared['class_teacher_map'],
+        prepared['days'], prepared['periods']
+    )
+
+    stats = {name: {"total": 0, "daily": [0] * 5} for name in state.t_id_to_name.values()}
+    for (c, d, p), info in schedule.items():
+        if info['teacher_id'] in state.t_id_to_name:
+            stats[info['teacher_name']]["total"] += 1
+            stats[info['teacher_name']]["daily"][d] += 1
+
+    assigned = {(c, d, p, info['subject']) for (c, d, p), info in schedule.items()}
+    evaluation = normal.evaluate_quality(
+        {key: key for key in assigned}, _AssignedValues(assigned), state.classes, state.days, state.periods,
+        prepared['courses'], prepared['class_teacher_map'], prepared['teachers_db']
+    )
+
+    solve_info = {
+        "engine": "local_search",
+        "mode": solver_params["mode"],
+        "deadline_ms": config.get('deadline_ms'),
+        "solver_status": ("OPTIMAL" if search["stop_reason"] == "optimal" else "FEASIBLE") if hard == 0 else "UNKNOWN",
+        "stop_reason": search["stop_reason"],
+        "wall_time": search["seconds"],
+        "objective": objective,
+        "best_bound": lower_bound,
+        "gap": None,
+        "hard_violations": hard,
+        "overflow_lessons": overflow,
+        "greedy": greedy_stats,
+        "search": {k: search[k] for k in ("iterations", "accepted", "improvements")}
+    }
+    if search["stop_reason"] == "cancelled":
+        status = "cancelled"
+    else:
+        status = "success" if hard == 0 else "partial"
+    return {
+        "status": status,
+        "rule_report": rule_report,
+        "sharding_info": prepared.get('sharding_info', []),
+        "stats": stats,
+        "evaluation": evaluation,
+        "schedule": schedule,
+        "teachers_db": prepared['teachers_db'],
+        "class_teacher_map": prepared['class_teacher_map'],
+        "classes": state.classes,
+        "days": state.days,
+        "periods": state.periods,
+        "courses": prepared['courses'],
+        "vars_list": sorted({subj for (c, subj) in state.keys}),
+        "class_names": {c: prepared['class_metadata'][c]['name'] for c in state.classes},
+        "resources": config.get('resources', []),
+        "warm_start": None,
+        "incremental": None,
+        "symmetry": None,
+        "model_stats": model_stats,
+        "solve_info": solve_info
+    }
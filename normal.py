@@ -7,6 +7,10 @@ import logging
 import math
 import json
 import os
+import hashlib
+import time
+import threading
+import contextlib
 
 class StopAfterFirstSolution(cp_model.CpSolverSolutionCallback):
     """在找到第一个可行解时停止搜索的回调类。"""
@@ -18,6 +22,146 @@ class StopAfterFirstSolution(cp_model.CpSolverSolutionCallback):
 
 logger = logging.getLogger(__name__)
 
+# 活动类科目: 由虚拟老师带班，不参与老师冲突约束
+ACTIVITY_SUBJECTS = {'政教活动', '课外活动', '拓展课'}
+
+class SolutionProgressCallback(cp_model.CpSolverSolutionCallback):
+    """
+    每找到一个更优解时推送求解进度 (目标值、下界、耗时) 和紧凑课表快照，
+    让前端在最终结果出来之前就能看到第一张可行课表。
+    publish: 接收事件字典的回调函数 (例如写入跨进程队列)，为 None 时不推送
+    snapshot_interval: 两次课表快照之间的最小间隔 (秒)，第一个可行解总是附带快照
+    """
+    def __init__(self, schedule_vars, class_teacher_map, teacher_names, publish, snapshot_interval=5.0):
+        cp_model.CpSolverSolutionCallback.__init__(self)
+        self.schedule_vars = schedule_vars
+        self.class_teacher_map = class_teacher_map
+        self.teacher_names = teacher_names  # tid -> name
+        self.publish = publish
+        self.snapshot_interval = snapshot_interval
+        self.solution_count = 0
+        self._last_snapshot_time = None
+
+    def compact_snapshot(self):
+        """课表快照: 科目/老师名去重为索引表，每个格子为 [c, d, p, 科目索引, 老师索引]"""
+        subjects, teachers, cells = [], [], []
+        subj_index, teacher_index = {}, {}
+        for (c, d, p, subj), var in self.schedule_vars.items():
+            if not self.BooleanValue(var):
+                continue
+            display_subj = subj.replace('_AUTO_SUB', '')
+            t_name = self.teacher_names.get(self.class_teacher_map.get((c, subj)), "")
+            if display_subj not in subj_index:
+                subj_index[display_subj] = len(subjects)
+                subjects.append(display_subj)
+            if t_name not in teacher_index:
+                teacher_index[t_name] = len(teachers)
+                teachers.append(t_name)
+            cells.append([c, d, p, subj_index[display_subj], teacher_index[t_name]])
+        return {"subjects": subjects, "teachers": teachers, "cells": cells}
+
+    def on_solution_callback(self):
+        self.solution_count += 1
+        if self.publish is None:
+            return
+        elapsed = self.WallTime()
+        event = {
+            "type": "solution",
+            "solution_index": self.solution_count,
+            "objective": self.ObjectiveValue(),
+            "best_bound": self.BestObjectiveBound(),
+            "elapsed": round(elapsed, 2)
+        }
+        if self._last_snapshot_time is None or elapsed - self._last_snapshot_time >= self.snapshot_interval:
+            event["snapshot"] = self.compact_snapshot()
+            self._last_snapshot_time = elapsed
+        try:
+            self.publish(event)
+        except Exception as e:
+            # 推送失败不能影响求解
+            logger.warning(f"求解进度推送失败: {e}")
+
+class EarlyStopCallback(SolutionProgressCallback):
+    """
+    [新增] 在进度推送的基础上按停止规则提前结束优化，stop_reason 记录触发的规则:
+    - no_improvement_seconds: 目标值连续这么多秒没有改善 (由 watch() 的看门狗线程检查) -> "stalled"
+    - relative_gap: 相对间隙 |目标值 - 下界| / |目标值| 不超过该值 -> "gap_reached"
+    - absolute_penalty: 目标值 (总罚分) 不超过该值 -> "penalty_reached"
+    - cancel_event: 调用方取消 (threading.Event 或跨进程 Manager().Event()) -> "cancelled"
+    """
+    def __init__(self, schedule_vars, class_teacher_map, teacher_names, publish=None, stop_rules=None,
+                 cancel_event=None, **kwargs):
+        super().__init__(schedule_vars, class_teacher_map, teacher_names, publish, **kwargs)
+        self.stop_rules = stop_rules or {}
+        self.cancel_event = cancel_event
+        self.stop_reason = None
+        self.best_objective = None
+        self._last_improvement = None  # 最近一次目标值改善的时刻 (time.time())
+
+    def reset(self):
+        """[新增] 目标函数改变后 (规则懒加载新增了罚分项) 重新开始记录最优目标值与停滞时间"""
+        self.best_objective = None
+        self._last_improvement = None
+        self.stop_reason = None
+
+    def on_solution_callback(self):
+        super().on_solution_callback()
+        objective = self.ObjectiveValue()
+        if self.best_objective is None or objective < self.best_objective:
+            self.best_objective = objective
+            self._last_improvement = time.time()
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            self.stop_reason = "cancelled"
+            self.StopSearch()
+            return
+
+        gap = abs(objective - self.BestObjectiveBound()) / max(1.0, abs(objective))
+        if self.stop_rules.get('relative_gap') is not None and gap <= float(self.stop_rules['relative_gap']):
+            self.stop_reason = "gap_reached"
+        elif self.stop_rules.get('absolute_penalty') is not None and objective <= float(self.stop_rules['absolute_penalty']):
+            self.stop_reason = "penalty_reached"
+        if self.stop_reason:
+            logger.info(f"提前停止 ({self.stop_reason}): 目标值 {objective}, 间隙 {gap:.4f}")
+            self.StopSearch()
+
+    @contextlib.contextmanager
+    def watch(self, solver):
+        """
+        求解期间运行看门狗线程: 找到可行解后目标值停滞超过 no_improvement_seconds 即停止搜索；
+        cancel_event 被置位时立即停止搜索
+        """
+        seconds = self.stop_rules.get('no_improvement_seconds')
+        if not seconds and self.cancel_event is None:
+            yield
+            return
+        done = threading.Event()
+
+        def watchdog():
+            while not done.wait(0.5):
+                if self.cancel_event is not None and self.cancel_event.is_set():
+                    self.stop_reason = "cancelled"
+                    logger.info(f"求解已取消，停止搜索 (当前最优 {self.best_objective})")
+                    solver.StopSearch()
+                    return
+                if seconds and self._last_improvement is not None and time.time() - self._last_improvement >= float(seconds):
+                    self.stop_reason = "stalled"
+                    logger.info(f"提前停止 (stalled): 目标值 {seconds}s 未改善，当前 {self.best_objective}")
+                    solver.StopSearch()
+                    return
+
+        thread = threading.Thread(target=watchdog, name="solve-watchdog", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            done.set()
+            thread.join()
+
+def snapshot_hint_cells(snapshot):
+    """[新增] 紧凑课表快照 (见 compact_snapshot) 还原为提示格子 [[c, d, p, 科目, 老师名], ...]"""
+    subjects, teachers = snapshot.get("subjects", []), snapshot.get("teachers", [])
+    return [[c, d, p, subjects[s], teachers[t]] for c, d, p, s, t in snapshot.get("cells", [])]
+
 # 绍兴一中默认规则配置 (用于迁移硬编码)
 SHAOXING_PRESET_RULES = [
     {
@@ -321,7 +465,7 @@ def evaluate_quality(schedule_vars, solver, classes, days, periods, course_requi
         for d in range(days):
             for p in range(periods):
                 for subj in course_requirements:
-                    if solver.Value(schedule_vars[(c, d, p, subj)]):
+                    if (c, d, p, subj) in schedule_vars and solver.Value(schedule_vars[(c, d, p, subj)]):
                         schedule_data[(c, d, p)] = subj
                         tid = class_teacher_map.get((c, subj))
                         if tid:
@@ -394,69 +538,158 @@ def evaluate_quality(schedule_vars, solver, classes, days, periods, course_requi
     }
 
 
-def get_filtered_targets(teachers_db, class_metadata, targets):
+class RuleIndex:
+    """
+    [新增] 规则引擎共享索引，每次建模只构建一次，供所有规则处理共用:
+    - 老师注册表: 按标签 / 任教科目 (含去掉 _AUTO_SUB 的原科目) / 姓名 查老师 ID
+    - 班级-科目表: 按年级 / 科目 查 (班级, 科目)
+    - 老师时段变量: (老师ID, 天, 节) -> 该老师在该时段所有可能的排课变量
+    """
+
+    def __init__(self, teachers_db, class_metadata, tid_to_assignments=None, schedule=None):
+        self.teacher_names = {}
+        self.tids_by_tag = collections.defaultdict(set)
+        self.tids_by_subject = collections.defaultdict(set)
+        self.tids_by_name = collections.defaultdict(set)
+        for t in teachers_db:
+            tid = t['id']
+            self.teacher_names[tid] = t.get('name')
+            for tag in t.get('tags', []):
+                self.tids_by_tag[tag].add(tid)
+            t_subj = t.get('subject', '')
+            self.tids_by_subject[t_subj].add(tid)
+            self.tids_by_subject[t_subj.replace('_AUTO_SUB', '')].add(tid)
+            self.tids_by_name[t.get('name')].add(tid)
+
+        # 班级-科目按班级顺序编号，筛选结果保持与逐个扫描相同的顺序 (老师按 teachers_db 顺序，见 teacher_names)
+        self.class_subject_order = {}
+        self.class_grade = {}
+        self.class_subjects_by_grade = collections.defaultdict(list)
+        self.class_subjects_by_subject = collections.defaultdict(list)
+        for c_id, meta in class_metadata.items():
+            self.class_grade[c_id] = meta.get('grade')
+            for subj in meta.get('requirements', {}).keys():
+                key = (c_id, subj)
+                self.class_subject_order[key] = len(self.class_subject_order)
+                self.class_subjects_by_grade[meta.get('grade')].append(key)
+                self.class_subjects_by_subject[subj].append(key)
+                clean_subj = subj.replace('_AUTO_SUB', '')
+                if clean_subj != subj:
+                    self.class_subjects_by_subject[clean_subj].append(key)
+
+        # (班级, 科目) -> 任课老师ID，(老师ID, 天, 节) -> 变量
+        self.class_subject_tids = collections.defaultdict(list)
+        self.teacher_slot_vars = collections.defaultdict(list)
+        for tid, assignments in (tid_to_assignments or {}).items():
+            for key in assignments:
+                self.class_subject_tids[key].append(tid)
+        for (c, d, p, s), var in (schedule or {}).items():
+            for tid in self.class_subject_tids.get((c, s), ()):
+                self.teacher_slot_vars[(tid, d, p)].append(var)
+
+    def teacher_vars(self, tid, d, p):
+        """老师在某时段所有可能的排课变量 (包括其任教的所有班级)"""
+        return self.teacher_slot_vars.get((tid, d, p), [])
+
+    def filter_targets(self, targets):
+        """与 get_filtered_targets 相同的筛选语义，基于索引查询"""
+        target_tags = set(targets.get('tags', []))
+        target_subjs = set(targets.get('subjects', []))
+        target_grades = set(targets.get('grades', []))
+
+        # 如果没有任何筛选条件，返回空
+        if not target_tags and not target_subjs and not target_grades:
+            return {"teacher_ids": [], "class_subjects": []}
+
+        # 老师满足 标签 / 科目 / 姓名 任一条件即选中
+        selected_tids = set()
+        for tag in target_tags:
+            selected_tids |= self.tids_by_tag.get(tag, set())
+        for subj in target_subjs:
+            selected_tids |= self.tids_by_subject.get(subj, set())
+        for name in targets.get('names', []):
+            selected_tids |= self.tids_by_name.get(name, set())
+
+        # 班级-科目: 年级与科目条件同时满足 (未指定的条件视为全部)
+        if target_subjs:
+            candidates = set()
+            for subj in target_subjs:
+                candidates.update(self.class_subjects_by_subject.get(subj, []))
+            if target_grades:
+                candidates = {key for key in candidates if self.class_grade[key[0]] in target_grades}
+        elif target_grades:
+            candidates = [key for g in target_grades for key in self.class_subjects_by_grade.get(g, [])]
+        else:
+            candidates = self.class_subject_order
+
+        return {
+            "teacher_ids": [tid for tid in self.teacher_names if tid in selected_tids],  # 保持 teachers_db 顺序
+            "class_subjects": sorted(candidates, key=self.class_subject_order.get)
+        }
+
+
+def get_filtered_targets(teachers_db, class_metadata, targets, index=None):
     """
     根据组合条件筛选目标
-    targets: { tags: [], subjects: [], grades: [] }
+    targets: { tags: [], subjects: [], grades: [], names: [] }
+    index: 可选的 RuleIndex，多条规则共用时传入以避免重复扫描
     返回: { teacher_ids: [], class_subjects: [(c_id, subj), ...] }
     """
-    selected_tids = []
-    selected_class_subjects = []
-    
-    # 1. 筛选老师
-    target_tags = set(targets.get('tags', []))
-    target_subjs = set(targets.get('subjects', []))
-    target_grades = set(targets.get('grades', []))
-    
-    # 如果没有任何筛选条件，返回空
-    if not target_tags and not target_subjs and not target_grades:
-        return {"teacher_ids": [], "class_subjects": []}
-
-    # 教师筛选逻辑 (老师必须满足标签或科目标签)
-    for t in teachers_db:
-        match = False
-        if target_tags:
-            # 老师自身的标签
-            if any(tag in t.get('tags', []) for tag in target_tags):
-                match = True
-        
-        if not match and target_subjs:
-            # 老师所教的科目 (兼容 _AUTO_SUB 后缀)
-            t_subj = t.get('subject', '')
-            clean_subj = t_subj.replace('_AUTO_SUB', '')
-            if t_subj in target_subjs or clean_subj in target_subjs:
-                match = True
-
-        # [新增] 名字直接匹配 (用于特指某些老师，如领导)
-        target_names = targets.get('names', [])
-        if not match and target_names:
-            if t.get('name') in target_names:
-                match = True
-        
-        if match:
-            selected_tids.append(t['id'])
+    if index is None:
+        index = RuleIndex(teachers_db, class_metadata)
+    return index.filter_targets(targets)
+
+def compute_forbidden_slots(rules, teachers_db, class_metadata, class_teacher_map, teacher_unavailable, days, periods):
+    """
+    [新增] 定义域缩减: 在创建变量之前，根据始终生效的硬规则算出每个 (班级, 科目) 不可能排课的时段
+    - FORBIDDEN_SLOTS (weight >= 100) 与 SPECIAL_DAYS (规则引擎对其始终施加硬约束)
+    - 老师禁排 constraints.teacher_unavailable
+    目标的筛选与规则引擎完全一致: 命中老师的所有任课 + 命中的班级-科目
+    返回 {(班级, 科目): set((d, p))}
+    """
+    index = RuleIndex(teachers_db, class_metadata)
+    assignments_by_tid = collections.defaultdict(list)
+    for key, tid in class_teacher_map.items():
+        assignments_by_tid[tid].append(key)
+
+    forbidden = collections.defaultdict(set)
+
+    def block(tids, class_subjects, slots):
+        for tid in tids:
+            for key in assignments_by_tid.get(tid, ()):
+                forbidden[key].update(slots)
+        for key in class_subjects:
+            forbidden[key].update(slots)
+
+    for rule in rules or []:
+        r_type = rule.get('type')
+        params = rule.get('params', {})
+        if r_type == 'FORBIDDEN_SLOTS' and rule.get('weight', 100) >= 100:
+            slots = {(d, p) for d, p in params.get('slots', [])}
+        elif r_type == 'SPECIAL_DAYS':
+            slots = {(d, p) for d in params.get('days', []) for p in range(periods)}
+        else:
+            continue
+        filtered = index.filter_targets(rule.get('targets', {}))
+        block(filtered['teacher_ids'], filtered['class_subjects'], slots)
+
+    for t_name, slots in (teacher_unavailable or {}).items():
+        tids = [tid for tid, name in index.teacher_names.items() if name == t_name]
+        block(tids, [], {(d, p) for d, p in slots if 0 <= d < days and 0 <= p < periods})
+
+    return forbidden
 
-    # 班级-科目 筛选逻辑
-    for c_id, meta in class_metadata.items():
-        grade_match = not target_grades or meta.get('grade') in target_grades
-        if not grade_match: continue
-        
-        for subj in meta.get('requirements', {}).keys():
-            clean_subj = subj.replace('_AUTO_SUB', '')
-            subj_match = not target_subjs or (subj in target_subjs or clean_subj in target_subjs)
-            if subj_match:
-                selected_class_subjects.append((c_id, subj))
-                
-    return {
-        "teacher_ids": list(set(selected_tids)),
-        "class_subjects": selected_class_subjects
-    }
 
-def apply_universal_rules(model, schedule, rules, teachers_db, class_metadata, TID_TO_ASSIGNMENTS, ALL_SUBJECTS_IN_VARS, SLOTS, penalties, assumption_literals, rule_mapping):
+def apply_universal_rules(model, schedule, rules, teachers_db, class_metadata, TID_TO_ASSIGNMENTS, ALL_SUBJECTS_IN_VARS, SLOTS, penalties, assumption_literals, rule_mapping, index=None, penalty_tiers=None):
     """
     规则工厂：分发解析并应用通用规则
+    index: 可选的 RuleIndex (未传入时在此构建)，所有规则共用同一份目标与变量索引
+    penalties: 罚分项列表，每项为 (变量, 系数)，变量为 None 时是常数项；由 penalty_objective 合并为目标函数
+    penalty_tiers: 可选，与 penalties 等长的列表，记录每个罚分项所属规则的优先级 (见 rule_priority)
     """
     if not rules: return
+    if index is None:
+        index = RuleIndex(teachers_db, class_metadata, TID_TO_ASSIGNMENTS, schedule)
     
     for idx, rule in enumerate(rules):
         r_type = rule.get('type')
@@ -472,9 +705,10 @@ def apply_universal_rules(model, schedule, rules, teachers_db, class_metadata, T
             assumption_literals.append(switch_var)
             rule_mapping[switch_var.Index()] = f"【用户规则】{rule_name}" 
         
-        filtered = get_filtered_targets(teachers_db, class_metadata, targets)
+        filtered = index.filter_targets(targets)
         tids = filtered['teacher_ids']
         class_subjects = filtered['class_subjects']
+        penalty_start = len(penalties)
         
         if r_type == 'FORBIDDEN_SLOTS':
             # 性能优化：按时段收集所有受限变量
@@ -483,8 +717,7 @@ def apply_universal_rules(model, schedule, rules, teachers_db, class_metadata, T
                 vars_to_block = []
                 # 老师禁排
                 for tid in tids:
-                    if tid in TID_TO_ASSIGNMENTS:
-                        vars_to_block.extend([schedule[(c, d, p, s)] for (c, s) in TID_TO_ASSIGNMENTS[tid] if (c, d, p, s) in schedule])
+                    vars_to_block.extend(index.teacher_vars(tid, d, p))
                 # 班级-科目禁排
                 for c_id, subj in class_subjects:
                     if (c_id, d, p, subj) in schedule:
@@ -492,11 +725,10 @@ def apply_universal_rules(model, schedule, rules, teachers_db, class_metadata, T
                 
                 if vars_to_block:
                     if weight >= 100:
-                        model.Add(sum(vars_to_block) == 0).OnlyEnforceIf(switch_var)
+                        model.Add(cp_model.LinearExpr.Sum(vars_to_block) == 0).OnlyEnforceIf(switch_var)
                     else:
                         # 软约束：如果是负数，则为奖励(尽量排)，正数为惩罚(尽量不排)
-                        for v in vars_to_block:
-                            penalties.append(v * weight)
+                        penalties.extend((v, weight) for v in vars_to_block)
 
         elif r_type == 'ZONE_COUNT':
             zone_slots = params.get('slots', [])
@@ -511,12 +743,19 @@ def apply_universal_rules(model, schedule, rules, teachers_db, class_metadata, T
                         elif rel == '<=': model.Add(sum(relevant_vars) <= count).OnlyEnforceIf(switch_var)
                         elif rel == '>=': model.Add(sum(relevant_vars) >= count).OnlyEnforceIf(switch_var)
                     else:
-                        # 软约束：惩罚偏离度
-                        diff = model.NewIntVar(-10, 10, f'zone_diff_{c_id}_{subj}_{rule.get("name","")}')
-                        model.Add(diff == sum(relevant_vars) - count)
-                        abs_diff = model.NewIntVar(0, 10, f'zone_abs_diff_{c_id}_{subj}')
-                        model.AddAbsEquality(abs_diff, diff)
-                        penalties.append(abs_diff * abs(weight))
+                        # 软约束：惩罚偏离度 |实排 - count|
+                        # [性能优化] 偏离方向确定时直接罚分各变量；否则一个偏离变量 + 两条线性约束 (最小化时等于绝对值)
+                        if count <= 0:
+                            penalties.extend((v, abs(weight)) for v in relevant_vars)
+                            penalties.append((None, -count * abs(weight)))
+                        elif count >= len(relevant_vars):
+                            penalties.extend((v, -abs(weight)) for v in relevant_vars)
+                            penalties.append((None, count * abs(weight)))
+                        else:
+                            deviation = model.NewIntVar(0, max(count, len(relevant_vars) - count), f'zone_dev_{c_id}_{subj}_{idx}')
+                            model.Add(deviation >= sum(relevant_vars) - count)
+                            model.Add(deviation >= count - sum(relevant_vars))
+                            penalties.append((deviation, abs(weight)))
 
         elif r_type == 'DAILY_LIMIT':
             slots_in_day = params.get('slots_per_day', [])
@@ -527,14 +766,13 @@ def apply_universal_rules(model, schedule, rules, teachers_db, class_metadata, T
             target_tids = tids or (TID_TO_ASSIGNMENTS.keys() if is_all_teachers else [])
             for tid in target_tids:
                 if tid in TID_TO_ASSIGNMENTS:
-                    assignments = TID_TO_ASSIGNMENTS[tid]
                     for d in range(5):
-                        daily_vars = [schedule[(c, d, p, s)] for (c, s) in assignments for p in slots_in_day if (c, d, p, s) in schedule]
+                        daily_vars = [v for p in slots_in_day for v in index.teacher_vars(tid, d, p)]
                         if daily_vars:
                             if weight >= 100:
-                                model.Add(sum(daily_vars) <= limit).OnlyEnforceIf(switch_var)
+                                model.Add(cp_model.LinearExpr.Sum(daily_vars) <= limit).OnlyEnforceIf(switch_var)
                             else:
-                                model.Add(sum(daily_vars) <= limit)
+                                model.Add(cp_model.LinearExpr.Sum(daily_vars) <= limit)
                             
             # 对班级生效 (如有需要)
             for c_id, subj in class_subjects:
@@ -552,55 +790,56 @@ def apply_universal_rules(model, schedule, rules, teachers_db, class_metadata, T
                 for p in range(8):
                     vars_to_block = []
                     for tid in tids:
-                        if tid in TID_TO_ASSIGNMENTS:
-                            vars_to_block.extend([schedule[(c, d, p, s)] for (c, s) in TID_TO_ASSIGNMENTS[tid] if (c, d, p, s) in schedule])
+                        vars_to_block.extend(index.teacher_vars(tid, d, p))
                     for c_id, subj in class_subjects:
                         if (c_id, d, p, subj) in schedule:
                             vars_to_block.append(schedule[(c_id, d, p, subj)])
                     
                     if vars_to_block:
                         if weight >= 100:
-                            model.Add(sum(vars_to_block) == 0).OnlyEnforceIf(switch_var)
+                            model.Add(cp_model.LinearExpr.Sum(vars_to_block) == 0).OnlyEnforceIf(switch_var)
                         else:
-                            model.Add(sum(vars_to_block) == 0)
+                            model.Add(cp_model.LinearExpr.Sum(vars_to_block) == 0)
 
         elif r_type == 'CONSECUTIVE':
             mode = params.get('mode', 'avoid') 
             limit = params.get('max', 1)
             
             if mode == 'avoid':
+                target_tids = tids or (TID_TO_ASSIGNMENTS.keys() if targets.get('tags') == ['所有老师'] else [])
+                # [性能优化] 硬约束下，任课老师已受同一规则限制的班级-科目无需重复约束
+                # (老师窗口的变量包含该班级-科目窗口的变量，且共用同一开关)
+                covered_tids = set(target_tids) if weight >= 100 else set()
+
                 # 对班级-科目生效
                 for c_id, subj in class_subjects:
+                    if covered_tids.intersection(index.class_subject_tids.get((c_id, subj), ())):
+                        continue
                     for d in range(5):
                         for p in range(8 - limit):
                             window_vars = [schedule[(c_id, d, p+i, subj)] for i in range(limit + 1) if (c_id, d, p+i, subj) in schedule]
                             if len(window_vars) > limit:
                                 if weight >= 100:
-                                    model.Add(sum(window_vars) <= limit).OnlyEnforceIf(switch_var)
+                                    model.Add(cp_model.LinearExpr.Sum(window_vars) <= limit).OnlyEnforceIf(switch_var)
+                                elif len(window_vars) == 1:
+                                    # [性能优化] max=0 时窗口只有一个变量，"连堂" 就是该变量本身，无需辅助变量
+                                    penalties.append((window_vars[0], weight))
                                 else:
-                                    is_cons = model.NewBoolVar(f'cons_{c_id}_{d}_{p}_{subj}')
-                                    model.Add(sum(window_vars) >= limit + 1).OnlyEnforceIf(is_cons)
-                                    model.Add(sum(window_vars) <= limit).OnlyEnforceIf(is_cons.Not())
-                                    penalties.append(is_cons * weight)
+                                    penalties.append((window_overflow(model, window_vars, limit, weight, f'cons_{c_id}_{d}_{p}_{subj}'), weight))
                 
                 # 对老师生效
-                target_tids = tids or (TID_TO_ASSIGNMENTS.keys() if targets.get('tags') == ['所有老师'] else [])
                 for tid in target_tids:
                     if tid in TID_TO_ASSIGNMENTS:
-                        assignments = TID_TO_ASSIGNMENTS[tid]
                         for d in range(5):
                             for p in range(8 - limit):
                                 window_vars = []
                                 for i in range(limit + 1):
-                                    window_vars.extend([schedule[(c, d, p+i, s)] for (c, s) in assignments if (c, d, p+i, s) in schedule])
+                                    window_vars.extend(index.teacher_vars(tid, d, p + i))
                                 if window_vars:
                                     if weight >= 100:
-                                        model.Add(sum(window_vars) <= limit).OnlyEnforceIf(switch_var)
+                                        model.Add(cp_model.LinearExpr.Sum(window_vars) <= limit).OnlyEnforceIf(switch_var)
                                     else:
-                                        is_cons = model.NewBoolVar(f'cons_tid_{tid}_{d}_{p}')
-                                        model.Add(sum(window_vars) >= limit + 1).OnlyEnforceIf(is_cons)
-                                        model.Add(sum(window_vars) <= limit).OnlyEnforceIf(is_cons.Not())
-                                        penalties.append(is_cons * weight)
+                                        penalties.append((window_overflow(model, window_vars, limit, weight, f'cons_tid_{tid}_{d}_{p}'), weight))
             elif mode == 'force' and weight >= 100:
                 pass
 
@@ -620,9 +859,7 @@ def apply_universal_rules(model, schedule, rules, teachers_db, class_metadata, T
                 if fixed_slot_vars:
                     if weight >= 100:
                         # 非固定时段用高惩罚软约束
-                        if non_fixed_slot_vars:
-                            for v in non_fixed_slot_vars:
-                                penalties.append(v * 1000)
+                        penalties.extend((v, 1000) for v in non_fixed_slot_vars)
                         
                         # [核心修复] 获取该班级该科目的周课时数
                         subj_count = 0
@@ -647,8 +884,7 @@ def apply_universal_rules(model, schedule, rules, teachers_db, class_metadata, T
                                 model.Add(sum(fixed_slot_vars) >= 1)
                     else:
                         # 软约束：奖励排在固定时段
-                        for v in fixed_slot_vars:
-                            penalties.append(v * -weight)
+                        penalties.extend((v, -weight) for v in fixed_slot_vars)
 
         elif r_type == 'GLOBAL_CAPACITY':
             capacity = params.get('capacity', 1)
@@ -663,8 +899,185 @@ def apply_universal_rules(model, schedule, rules, teachers_db, class_metadata, T
                             # 溢出惩罚
                             excess = model.NewIntVar(0, len(class_metadata), f'excess_{d}_{p}_{idx}')
                             model.Add(excess >= sum(slot_vars) - capacity)
-                            penalties.append(excess * weight)
+                            penalties.append((excess, weight))
+
+        if penalty_tiers is not None:
+            penalty_tiers.extend([rule_priority(rule)] * (len(penalties) - penalty_start))
+
+
+def window_overflow(model, window_vars, limit, weight, name):
+    """
+    [新增] 连堂窗口 "课时数超过 limit" 的指示变量 b:
+    - 罚分 (weight > 0): 一条不带开关的线性约束 sum <= limit + (窗口长度 - limit) * b；最小化时未超过则 b 取 0
+    - 奖励且 limit=0: b = max(窗口变量)，一条 lin_max 约束
+    - 奖励且 limit>0: 保留双向开关约束；只写单向时求解器下界很弱，小规模也无法证明最优
+    """
+    overflow = model.NewBoolVar(name)
+    window_sum = cp_model.LinearExpr.Sum(window_vars)
+    if weight > 0:
+        model.Add(window_sum <= limit + (len(window_vars) - limit) * overflow)
+    elif limit == 0:
+        model.AddMaxEquality(overflow, window_vars)
+    else:
+        model.Add(window_sum >= limit + 1).OnlyEnforceIf(overflow)
+        model.Add(window_sum <= limit).OnlyEnforceIf(overflow.Not())
+    return overflow
+
+def penalty_objective(penalties):
+    """
+    [新增] 罚分项 [(变量, 系数), ...] 按变量合并系数 (同一变量被多条规则罚分时只出现一次)，
+    构造一个加权和表达式；变量为 None 的常数项合并为偏移量
+    """
+    coefficients = {}
+    variables = {}
+    offset = 0
+    for var, coef in penalties:
+        if var is None:
+            offset += coef
+            continue
+        index = var.Index()
+        variables[index] = var
+        coefficients[index] = coefficients.get(index, 0) + coef
+    keys = [i for i, coef in coefficients.items() if coef]
+    return cp_model.LinearExpr.WeightedSum([variables[i] for i in keys], [coefficients[i] for i in keys]) + offset
+
+
+# [新增] 分层 (字典序) 优化: 未指定 priority 的规则中，硬 FIXED_SLOTS 的 1000 分罚分项最先优化，其余软规则其次
+LEX_FIXED_SLOTS_PRIORITY = 1
+LEX_DEFAULT_PRIORITY = 2
+
+def rule_priority(rule):
+    """[新增] 规则罚分项的优先级 (数字越小越先优化)，规则可用 "priority" 字段指定"""
+    if rule.get('priority') is not None:
+        return int(rule['priority'])
+    if rule.get('type') == 'FIXED_SLOTS' and rule.get('weight', 100) >= 100:
+        return LEX_FIXED_SLOTS_PRIORITY
+    return LEX_DEFAULT_PRIORITY
+
+# [新增] 规则懒加载的最大轮数，超过后一次加入剩余的全部规则
+LAZY_MAX_ROUNDS = 10
+
+def is_eager_rule(rule):
+    """
+    [新增] 规则懒加载时是否一开始就加入模型:
+    - 定义域缩减处理的硬禁排 / 特殊日
+    - 软规则: 目标函数一直在与之权衡，几乎总会被违反，懒加载只会多一轮求解
+    - 下限/等式类硬规则 (ZONE_COUNT == / >=、FIXED_SLOTS): 只满足核心约束的课表几乎总会违反
+    - 不产生约束的规则 (CONSECUTIVE force、未知类型)
+    其余上限类硬规则 (ZONE_COUNT <=、DAILY_LIMIT、CONSECUTIVE、GLOBAL_CAPACITY) 按需加入
+    """
+    r_type = rule.get('type')
+    params = rule.get('params', {})
+    if r_type == 'DAILY_LIMIT':
+        return False  # 规则引擎对 DAILY_LIMIT 始终施加硬约束
+    if rule.get('weight', 100) < 100:
+        return True
+    if r_type == 'ZONE_COUNT':
+        return params.get('relation', '==') != '<='
+    if r_type == 'CONSECUTIVE':
+        return params.get('mode', 'avoid') != 'avoid'
+    return r_type != 'GLOBAL_CAPACITY'
+
+def count_rule_violations(rule, value, schedule, index, class_metadata, TID_TO_ASSIGNMENTS, SLOTS):
+    """
+    [新增] 按 apply_universal_rules 的建模语义，统计一条规则在当前解下被违反的约束个数
+    (软规则为罚分项非零的个数)；value: 变量 -> 0/1，例如 CpSolver.Value
+    与 verify_rules 不同，这里检查的是模型里的约束本身，用于规则懒加载
+    """
+    r_type = rule.get('type')
+    targets = rule.get('targets', {})
+    params = rule.get('params', {})
+    is_hard = rule.get('weight', 100) >= 100
+    filtered = index.filter_targets(targets)
+    tids = filtered['teacher_ids']
+    class_subjects = filtered['class_subjects']
+    all_tids = tids or (TID_TO_ASSIGNMENTS.keys() if targets.get('tags') == ['所有老师'] else [])
+
+    def class_vars(c_id, subj, slots):
+        return [schedule[(c_id, d, p, subj)] for d, p in slots if (c_id, d, p, subj) in schedule]
+
+    def teacher_vars(tid, slots):
+        return [v for d, p in slots for v in index.teacher_vars(tid, d, p)]
+
+    def total(variables):
+        return sum(value(v) for v in variables)
+
+    violations = 0
+    if r_type in ('FORBIDDEN_SLOTS', 'SPECIAL_DAYS'):
+        if r_type == 'FORBIDDEN_SLOTS':
+            slots = [tuple(slot) for slot in params.get('slots', [])]
+        else:
+            slots = [(d, p) for d in params.get('days', []) for p in range(8)]
+        for tid in tids:
+            violations += total(teacher_vars(tid, slots))
+        for c_id, subj in class_subjects:
+            violations += total(class_vars(c_id, subj, slots))
+
+    elif r_type == 'ZONE_COUNT':
+        count = params.get('count', 0)
+        rel = params.get('relation', '==')
+        for c_id, subj in class_subjects:
+            relevant_vars = class_vars(c_id, subj, params.get('slots', []))
+            if not relevant_vars:
+                continue
+            n = total(relevant_vars)
+            if is_hard:
+                ok = {'==': n == count, '<=': n <= count, '>=': n >= count}.get(rel, True)
+            else:
+                ok = n == count
+            violations += 0 if ok else 1
+
+    elif r_type == 'DAILY_LIMIT':
+        slots_in_day = params.get('slots_per_day', [])
+        limit = params.get('limit', 1)
+        for d in range(5):
+            day_slots = [(d, p) for p in slots_in_day]
+            for tid in all_tids:
+                if tid in TID_TO_ASSIGNMENTS and total(teacher_vars(tid, day_slots)) > limit:
+                    violations += 1
+            for c_id, subj in class_subjects:
+                if total(class_vars(c_id, subj, day_slots)) > limit:
+                    violations += 1
+
+    elif r_type == 'CONSECUTIVE' and params.get('mode', 'avoid') == 'avoid':
+        limit = params.get('max', 1)
+        covered_tids = set(all_tids) if is_hard else set()
+        windows = [[(d, p + i) for i in range(limit + 1)] for d in range(5) for p in range(8 - limit)]
+        for c_id, subj in class_subjects:
+            if covered_tids.intersection(index.class_subject_tids.get((c_id, subj), ())):
+                continue
+            for window in windows:
+                window_vars = class_vars(c_id, subj, window)
+                if len(window_vars) > limit and total(window_vars) > limit:
+                    violations += 1
+        for tid in all_tids:
+            if tid in TID_TO_ASSIGNMENTS:
+                violations += sum(1 for window in windows if total(teacher_vars(tid, window)) > limit)
+
+    elif r_type == 'FIXED_SLOTS' and is_hard:
+        slots = params.get('slots', [])
+        fixed = {tuple(slot) for slot in slots}
+        for c_id, subj in class_subjects:
+            fixed_slot_vars = class_vars(c_id, subj, [slot for slot in SLOTS if slot in fixed])
+            if not fixed_slot_vars:
+                continue
+            violations += total(class_vars(c_id, subj, [slot for slot in SLOTS if slot not in fixed]))
+            req = class_metadata.get(c_id, {}).get('requirements', {}).get(subj, 0)
+            subj_count = req.get('count', 0) if isinstance(req, dict) else req
+            if slots and subj_count == len(slots):
+                violations += len(fixed_slot_vars) - total(fixed_slot_vars)
+            elif total(fixed_slot_vars) < 1:
+                violations += 1
+
+    elif r_type == 'GLOBAL_CAPACITY':
+        capacity = params.get('capacity', 1)
+        subjects = targets.get('subjects', [])
+        for d, p in SLOTS:
+            slot_vars = [schedule[(c, d, p, s)] for c in class_metadata for s in subjects if (c, d, p, s) in schedule]
+            if total(slot_vars) > capacity:
+                violations += 1
 
+    return violations
 
 
 def verify_rules(schedule_map, rules, class_metadata, teachers_db, class_teacher_map, days, periods):
@@ -673,6 +1086,7 @@ def verify_rules(schedule_map, rules, class_metadata, teachers_db, class_teacher
     schedule_map: {(class_id, day, period): {"subject": "xxx", "teacher_name": "xxx", ...}}
     """
     report = []
+    rule_index = RuleIndex(teachers_db, class_metadata)
     
     # 辅助：构建更易查询的数据结构
     # 1. 按班级查询: class_schedule[c][d][p] = subj
@@ -703,8 +1117,8 @@ def verify_rules(schedule_map, rules, class_metadata, teachers_db, class_teacher
         params = rule.get('params', {})
         weight = rule.get('weight', 0)
         
-        # 筛选目标 (复用之前的 get_filtered_targets，但需要只拿 ID/Name)
-        filtered = get_filtered_targets(teachers_db, class_metadata, targets)
+        # 筛选目标 (复用规则引擎的 RuleIndex，但需要只拿 ID/Name)
+        filtered = rule_index.filter_targets(targets)
         target_tids = filtered['teacher_ids']
         target_class_subjs = filtered['class_subjects'] # [(c_id, subj), ...]
 
@@ -741,7 +1155,7 @@ def verify_rules(schedule_map, rules, class_metadata, teachers_db, class_teacher
             # 检查老师 (仅禁排)
             if r_type == 'FORBIDDEN_SLOTS':
                 for tid in target_tids:
-                    t_name = next((t['name'] for t in teachers_db if t['id'] == tid), tid)
+                    t_name = rule_index.teacher_names.get(tid, tid)
                     t_slots = teacher_schedule.get(tid, [])
                     for d, p in check_slots:
                         if (d, p) in t_slots or [d, p] in t_slots:
@@ -768,7 +1182,7 @@ def verify_rules(schedule_map, rules, class_metadata, teachers_db, class_teacher
             limit = params.get('max', 2)
             # 检查老师
             for tid in target_tids:
-                t_name = next((t['name'] for t in teachers_db if t['id'] == tid), tid)
+                t_name = rule_index.teacher_names.get(tid, tid)
                 t_slots = sorted(teacher_schedule.get(tid, []))
                 # 按天分组
                 daily = collections.defaultdict(list)
@@ -804,8 +1218,747 @@ def verify_rules(schedule_map, rules, class_metadata, teachers_db, class_teacher
         
     return report
 
-def run_scheduler(config=None):
+def match_hint_cells(schedule, hint_cells, class_teacher_map, teacher_names):
+    """
+    把基准课表格子 [[c, d, p, 科目, 老师名], ...] 对应到模型变量键 (c, d, p, subj)
+    科目为去掉 _AUTO_SUB 后缀的显示名；同名科目被智能分片拆开时用老师名区分
+    配置变化后对不上的格子直接跳过
+    """
+    chosen = set()
+    for cell in hint_cells:
+        c, d, p, subject = cell[0], cell[1], cell[2], cell[3]
+        t_name = (cell[4] if len(cell) > 4 else "") or ""
+        candidates = [s for s in (subject, f"{subject}_AUTO_SUB") if (c, d, p, s) in schedule]
+        if len(candidates) > 1 and t_name:
+            by_teacher = [s for s in candidates
+                          if teacher_names.get(class_teacher_map.get((c, s)), "").strip() == t_name.strip()]
+            candidates = by_teacher or candidates
+        if candidates:
+            chosen.add((c, d, p, candidates[0]))
+    return chosen
+
+def apply_solution_hints(model, schedule, hint_cells, class_teacher_map, teacher_names):
+    """
+    [新增] 热启动: 把基准课表 (已保存方案或当前会话) 作为解提示 (AddHint) 写入模型
+    基准课表覆盖到的班级，命中的格子提示为 1，其余格子提示为 0 (提示只引导搜索，不是约束)
+    返回: ({"hint_cells": 基准格子数, "matched": 成功对应到变量的格子数}, 命中的变量键集合)
+    """
+    chosen = match_hint_cells(schedule, hint_cells, class_teacher_map, teacher_names)
+    hinted_classes = {c for (c, d, p, s) in chosen}
+    for key, var in schedule.items():
+        if key[0] in hinted_classes:
+            model.AddHint(var, 1 if key in chosen else 0)
+
+    logger.info(f"热启动: 基准课表 {len(hint_cells)} 格，命中 {len(chosen)} 格 ({len(hinted_classes)} 个班级)")
+    return {"hint_cells": len(hint_cells), "matched": len(chosen)}, chosen
+
+def _effective_rules(config):
+    """实际生效的规则列表 (与 run_scheduler 一致: legacy 模式且无规则时使用绍兴预设)"""
+    rules = config.get('rules') or []
+    if not rules and config.get('use_legacy_rules', True):
+        rules = SHAOXING_PRESET_RULES
+    return rules
+
+def _changed_keys(old, new):
+    """两个字典中取值不同 (含新增/删除) 的键"""
+    old, new = old or {}, new or {}
+    return {k for k in set(old) | set(new) if _normalize_for_hash(old.get(k)) != _normalize_for_hash(new.get(k))}
+
+def detect_affected_scope(base_config, config, hint_cells, class_metadata, class_teacher_map, teachers_db):
+    """
+    [新增] 增量重排: 对比基准课表/基准配置与新配置，找出受影响的班级
+    - 班级结构: 新增班级、课时需求变化、任课老师变化
+    - 老师: 课时限制、禁排时段变化的老师，其所教班级全部受影响
+    - 规则: 新增/删除/修改的规则，按目标筛选出涉及的班级
+    - 固定课程: 预排变化的班级
+    base_config 为 None (基准方案没有保存配置) 时，老师和规则相关设置一律视为已变化
+    返回: {"classes": set, "teachers": set, "rules": [规则名]}
+    """
+    t_id_to_name = {t['id']: t['name'] for t in teachers_db}
+    affected_classes = set()
+
+    # 1. 班级结构: 与基准课表逐班比较课时数和任课老师
+    base_counts = collections.Counter()
+    base_teachers = collections.defaultdict(set)
+    for cell in hint_cells:
+        base_counts[(cell[0], cell[3])] += 1
+        if len(cell) > 4 and cell[4]:
+            base_teachers[(cell[0], cell[3])].add(cell[4].strip())
+    base_classes = {cell[0] for cell in hint_cells}
+
+    for c, meta in class_metadata.items():
+        if c not in base_classes:
+            affected_classes.add(c)
+            continue
+        required = {s: int(cfg.get('count', 0)) for s, cfg in meta['requirements'].items()}
+        scheduled = {s: n for (bc, s), n in base_counts.items() if bc == c}
+        if any(scheduled.get(s, 0) != n for s, n in required.items() if n > 0) or \
+                any(s not in required for s in scheduled):
+            affected_classes.add(c)
+    for (c, s), tid in class_teacher_map.items():
+        subject = s.replace('_AUTO_SUB', '')
+        if base_teachers.get((c, subject)) and t_id_to_name.get(tid, '').strip() not in base_teachers[(c, subject)]:
+            affected_classes.add(c)
+
+    # 2. 老师相关设置 (课时限制、禁排时段)
+    new_constraints = config.get('constraints') or {}
+    if base_config is None:
+        affected_teachers = set((config.get('teacher_limits') or {}).keys()) | \
+            set((new_constraints.get('teacher_unavailable') or {}).keys())
+        changed_fixed = set((new_constraints.get('fixed_courses') or {}).keys())
+        old_rules = []
+    else:
+        old_constraints = base_config.get('constraints') or {}
+        affected_teachers = _changed_keys(base_config.get('teacher_limits'), config.get('teacher_limits')) | \
+            _changed_keys(old_constraints.get('teacher_unavailable'), new_constraints.get('teacher_unavailable'))
+        changed_fixed = _changed_keys(old_constraints.get('fixed_courses'), new_constraints.get('fixed_courses'))
+        old_rules = _effective_rules(base_config)
+    affected_teachers = {name.strip() for name in affected_teachers}
+
+    for c_str in changed_fixed:
+        try:
+            affected_classes.add(int(c_str))
+        except (ValueError, TypeError):
+            continue
+
+    # 3. 规则: 以规范化后的内容比较，新增或删除的规则都算变化
+    old_keys = collections.Counter(json.dumps(_normalize_for_hash(r), sort_keys=True, ensure_ascii=False) for r in old_rules)
+    changed_rules = []
+    new_keys = collections.Counter()
+    for rule in _effective_rules(config):
+        key = json.dumps(_normalize_for_hash(rule), sort_keys=True, ensure_ascii=False)
+        new_keys[key] += 1
+        if new_keys[key] > old_keys[key]:
+            changed_rules.append(rule)
+    removed = old_keys - new_keys
+    changed_rules.extend(r for r in old_rules if removed[json.dumps(_normalize_for_hash(r), sort_keys=True, ensure_ascii=False)])
+
+    rule_index = RuleIndex(teachers_db, class_metadata)
+    for rule in changed_rules:
+        filtered = rule_index.filter_targets(rule.get('targets', {}))
+        affected_classes.update(c for c, s in filtered['class_subjects'])
+        affected_teachers.update(t_id_to_name[tid].strip() for tid in filtered['teacher_ids'] if tid in t_id_to_name)
+
+    # 4. 受影响老师所教的班级
+    for (c, s), tid in class_teacher_map.items():
+        if t_id_to_name.get(tid, '').strip() in affected_teachers:
+            affected_classes.add(c)
+
+    return {
+        "classes": {c for c in affected_classes if c in class_metadata},
+        "teachers": affected_teachers,
+        "rules": [r.get('name', r.get('type', '')) for r in changed_rules]
+    }
+
+def build_neighbourhoods(affected_classes, class_metadata, class_teacher_map, release_classes=None):
+    """
+    增量重排的逐级放宽邻域 (每级为允许变动的班级集合)
+    1. 受影响班级  (1b. 加上调用方指定优先放开的班级)  2. 加上与其共用老师的班级  3. 加上同年级的全部班级
+    最后一级 (全部班级) 由常规全量求解兜底，不在此列出
+    """
+    classes_by_teacher = collections.defaultdict(set)
+    for (c, s), tid in class_teacher_map.items():
+        classes_by_teacher[tid].add(c)
+
+    step1 = set(affected_classes)
+    released = step1 | set(release_classes or [])
+    step2 = set(released)
+    for tid, classes in classes_by_teacher.items():
+        if classes & released:
+            step2 |= classes
+    grades = {class_metadata[c]['grade'] for c in step2}
+    step3 = step2 | {c for c, meta in class_metadata.items() if meta['grade'] in grades}
+
+    steps = []
+    for step in (step1, released, step2, step3):
+        if len(step) < len(class_metadata) and (not steps or step != steps[-1]):
+            steps.append(step)
+    return steps
+
+def add_freeze_literals(model, schedule, base_keys):
+    """
+    为基准课表中的每个班级创建冻结开关: 开关为真时该班所有格子固定为基准课表的取值
+    开关通过 assumptions 激活，这样逐级放宽时无需重建模型
+    """
+    base_classes = {key[0] for key in base_keys}
+    freeze_literals = {c: model.NewBoolVar(f'freeze_class_{c}') for c in base_classes}
+    for key, var in schedule.items():
+        if key[0] in freeze_literals:
+            model.Add(var == (1 if key in base_keys else 0)).OnlyEnforceIf(freeze_literals[key[0]])
+    return freeze_literals
+
+def solve_incremental(model, freeze_literals, neighbourhoods, assumption_literals, create_solver, step_seconds,
+                      solution_callback=None, progress=None):
+    """
+    [新增] 大邻域增量求解: 冻结邻域之外的班级，只在邻域内重新优化；邻域无解/超时则放宽到下一级
+    返回: (solver, status, steps)；所有邻域都失败时 solver 为 None，调用方回退到全量求解
+    模型的 assumptions 在返回前恢复为规则开关，保证后续全量求解和冲突诊断不受影响
+    """
+    steps = []
+    solver, status = None, None
+    for level, unfrozen in enumerate(neighbourhoods, 1):
+        frozen = [lit for c, lit in freeze_literals.items() if c not in unfrozen]
+        model.ClearAssumptions()
+        model.AddAssumptions(assumption_literals + frozen)
+        step_solver = create_solver(step_seconds)
+        step_status = step_solver.Solve(model, solution_callback) if solution_callback else step_solver.Solve(model)
+        step = {
+            "level": level,
+            "unfrozen_classes": len(unfrozen),
+            "status": step_solver.StatusName(step_status),
+            "wall_time": round(step_solver.WallTime(), 2)
+        }
+        steps.append(step)
+        logger.info(f"增量重排 第{level}级邻域: 放开 {len(unfrozen)} 个班级 -> {step['status']} ({step['wall_time']}s)")
+        if progress:
+            progress(dict(step, type="incremental_step"))
+        if step_status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+            solver, status = step_solver, step_status
+            break
+
+    model.ClearAssumptions()
+    if assumption_literals:
+        model.AddAssumptions(assumption_literals)
+    return solver, status, steps
+
+def solve_lazy_rules(model, schedule, lazy_rules, add_rules, count_violations, create_solver, time_limit,
+                     solution_callback=None, progress=None, cancel=None):
+    """
+    [新增] 规则懒加载求解 (割平面): 模型只含核心约束与廉价规则，每轮求解后按当前解检查其余 (上限类硬) 规则，
+    只把被违反的规则加入模型重新求解，直到没有规则被违反。最终解满足全部规则且对放宽后的模型最优，
+    所以对完整模型同样最优
+    - 还有规则未检查时每轮最多用剩余时间的一半，留出加入规则后重新求解的时间；加入规则后以当前解为提示重新求解
+    - 没有违反但未证明最优时，加入剩余的全部规则，以当前解 (满足全部规则) 为提示用剩余时间继续优化一轮
+    - 超过 LAZY_MAX_ROUNDS 轮后一次加入剩余的全部规则
+    add_rules(rules): 把规则加入模型 (含开关，并重设 assumptions)
+    count_violations(rule, value): 规则在当前解下被违反的约束个数
+    返回: (solver, status, rounds)；无解或超时时为最后一轮的结果，冲突诊断基于当前模型
+    """
+    pending = list(lazy_rules)
+    rounds = []
+    end = time.time() + time_limit
+    polishing = False
+    while True:
+        remaining = max(0.1, end - time.time())
+        solver = create_solver(remaining if polishing or not pending else remaining / 2)
+        if solution_callback is not None:
+            solution_callback.reset()
+            with solution_callback.watch(solver):
+                status = solver.Solve(model, solution_callback)
+        else:
+            status = solver.Solve(model)
+
+        step = {
+            "round": len(rounds) + 1,
+            "status": solver.StatusName(status),
+            "wall_time": round(solver.WallTime(), 2),
+            "added": []
+        }
+        rounds.append(step)
+        if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE) or polishing:
+            break
+        if (cancel is not None and cancel.is_set()) or \
+                (solution_callback is not None and solution_callback.stop_reason == "cancelled"):
+            break
+
+        violated = [rule for rule in pending if count_violations(rule, solver.Value)]
+        if violated:
+            if len(rounds) >= LAZY_MAX_ROUNDS:
+                violated = pending
+            add_rules(violated)
+            pending = [rule for rule in pending if not any(rule is v for v in violated)]
+            step["added"] = [rule.get('name', rule.get('type')) for rule in violated]
+            # 当前解作为下一轮的提示，加入规则后只需局部修复
+            model.ClearHints()
+            for var in schedule.values():
+                model.AddHint(var, solver.Value(var))
+        elif status == cp_model.FEASIBLE and not solver.parameters.stop_after_first_solution and time.time() < end:
+            # 当前解已满足全部规则，作为提示继续优化；继续优化后不再检查，所以先加入剩余的全部规则
+            polishing = True
+            if pending:
+                add_rules(pending)
+                step["added"] = [rule.get('name', rule.get('type')) for rule in pending]
+                pending = []
+            model.ClearHints()
+            for var in schedule.values():
+                model.AddHint(var, solver.Value(var))
+
+        logger.info(f"规则懒加载 第{step['round']}轮: {step['status']} ({step['wall_time']}s)，"
+                    f"加入 {len(step['added'])} 条被违反的规则，剩余 {len(pending)} 条")
+        if progress:
+            progress(dict(step, type="lazy_round"))
+        if not violated and not polishing:
+            break
+
+    return solver, status, rounds
+
+def solve_lexicographic(model, schedule, penalties, penalty_tiers, create_solver, time_limit,
+                        solution_callback=None, progress=None, cancel=None):
+    """
+    [新增] 分层 (字典序) 优化: 按优先级从小到大逐层最小化该层的罚分和，
+    每层求解后把该层的目标值 (已证明最优时为最优值，否则为当前解) 固定为上限约束，
+    下一层以上一层的解为提示继续优化。剩余时间在尚未求解的各层之间平均分配
+    某层未找到解时停止，返回上一层的结果 (第一层失败时返回该层结果，供冲突诊断)
+    返回: (solver, status, stages)
+    """
+    tiers = sorted(set(penalty_tiers))
+    end = time.time() + time_limit
+    stages = []
+    solver, status = None, None
+    for i, tier in enumerate(tiers):
+        objective = penalty_objective([term for term, t in zip(penalties, penalty_tiers) if t == tier])
+        model.Minimize(objective)
+        stage_solver = create_solver(max(0.1, (end - time.time()) / (len(tiers) - i)))
+        if solution_callback is not None:
+            solution_callback.reset()
+            with solution_callback.watch(stage_solver):
+                stage_status = stage_solver.Solve(model, solution_callback)
+        else:
+            stage_status = stage_solver.Solve(model)
+
+        stage = {
+            "priority": tier,
+            "terms": sum(1 for t in penalty_tiers if t == tier),
+            "status": stage_solver.StatusName(stage_status),
+            "wall_time": round(stage_solver.WallTime(), 2)
+        }
+        stages.append(stage)
+        if stage_status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+            logger.info(f"分层优化 第{i + 1}层 (优先级 {tier}): {stage['status']}，停止")
+            if solver is None:
+                solver, status = stage_solver, stage_status
+            break
+
+        solver, status = stage_solver, stage_status
+        stage["objective"] = stage_solver.ObjectiveValue()
+        stage["best_bound"] = stage_solver.BestObjectiveBound()
+        logger.info(f"分层优化 第{i + 1}层 (优先级 {tier}): {stage['status']}，目标值 {stage['objective']} "
+                    f"({stage['wall_time']}s)")
+        if progress:
+            progress(dict(stage, type="lexicographic_stage"))
+        if (cancel is not None and cancel.is_set()) or \
+                (solution_callback is not None and solution_callback.stop_reason == "cancelled"):
+            break
+
+        # 固定本层的目标值，后续各层不能让它变差
+        model.Add(objective <= int(round(stage["objective"])))
+        model.ClearHints()
+        for var in schedule.values():
+            model.AddHint(var, stage_solver.Value(var))
+
+    # 最终解中各层的罚分 (前面的层在后续优化中可能继续变好)
+    if status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        for stage in stages:
+            stage["final_value"] = solver.Value(penalty_objective(
+                [term for term, t in zip(penalties, penalty_tiers) if t == stage["priority"]]
+            ))
+    return solver, status, stages
+
+# [新增] 分组假设文字 (assumption literal): 固定课程按班级、老师禁排按老师，每组只用一个开关
+# 冲突诊断时仅把第一轮被点名的组细化为逐格开关，其余组保持一个开关
+def add_assumption_group(model, name, label, members, assumption_literals, rule_mapping, assumption_groups):
+    """
+    members: [(逐格说明, 线性表达式, 取值), ...]，每项在开关为真时强制 表达式 == 取值
+    只有一项时直接用逐格说明，无需细化
+    """
+    switch = model.NewBoolVar(name)
+    assumption_literals.append(switch)
+    for _, expr, value in members:
+        model.Add(expr == value).OnlyEnforceIf(switch)
+    if len(members) == 1:
+        rule_mapping[switch.Index()] = members[0][0]
+    else:
+        rule_mapping[switch.Index()] = label
+        assumption_groups[switch.Index()] = members
+
+def refine_assumption_groups(model, conflict_indices, assumption_groups, rule_mapping):
+    """
+    为冲突集中的分组开关创建组内逐格开关 (约束与分组开关相同)，返回新开关列表
+    逐格开关作为假设、分组开关不作为假设时，分组约束随之失效，只剩逐格约束
+    """
+    refined = []
+    for group_index in conflict_indices:
+        for k, (label, expr, value) in enumerate(assumption_groups.get(group_index, ())):
+            switch = model.NewBoolVar(f'sys_refined_{group_index}_{k}')
+            model.Add(expr == value).OnlyEnforceIf(switch)
+            rule_mapping[switch.Index()] = label
+            refined.append(switch)
+    if refined:
+        logger.info(f"冲突诊断: 细化分组开关，新增 {len(refined)} 个逐格开关")
+    return refined
+
+
+def find_interchangeable_classes(classes, class_metadata, class_teacher_map, teachers_db, config, rules):
+    """
+    [新增] 对称性检测: 找出可以整体互换课表的班级组
+    两个班级可互换的条件: 同年级、课时需求相同、不涉及固定课程，且每门课要么由同一位共享老师任教，
+    要么由只教本班、没有课时限制/禁排/标签/点名规则的专属老师任教 (专属老师随班级一起互换)
+    返回: [[c1, c2, ...], ...]，每组至少两个班级，组内升序
+    """
+    t_by_id = {t['id']: t for t in teachers_db}
+    classes_by_name = collections.defaultdict(set)
+    for (c, s), tid in class_teacher_map.items():
+        classes_by_name[t_by_id.get(tid, {}).get('name', tid)].add(c)
+
+    constraints = config.get('constraints') or {}
+    constrained_names = {name.strip() for name in (config.get('teacher_limits') or {})}
+    constrained_names |= {name.strip() for name in (constraints.get('teacher_unavailable') or {})}
+    for rule in rules:
+        constrained_names |= {name.strip() for name in rule.get('targets', {}).get('names', [])}
+    fixed_classes = set()
+    for c_str in (constraints.get('fixed_courses') or {}):
+        try:
+            fixed_classes.add(int(c_str))
+        except (ValueError, TypeError):
+            continue
+
+    entries_by_class = collections.defaultdict(list)
+    for (c, s), tid in class_teacher_map.items():
+        entries_by_class[c].append((s, tid))
+
+    groups = collections.defaultdict(list)
+    for c in classes:
+        if c in fixed_classes:
+            continue
+        shared, private = [], collections.defaultdict(set)
+        for s, tid in sorted(entries_by_class[c], key=lambda e: e[0]):
+            teacher = t_by_id.get(tid, {})
+            name = teacher.get('name', tid)
+            if classes_by_name[name] == {c} and name.strip() not in constrained_names and not teacher.get('tags'):
+                private[name].add(s)
+            else:
+                shared.append((s, name))
+        signature = (
+            class_metadata[c]['grade'],
+            json.dumps(class_metadata[c]['requirements'], sort_keys=True, ensure_ascii=False),
+            tuple(shared),
+            frozenset(frozenset(subjects) for subjects in private.values())
+        )
+        groups[signature].append(c)
+    return [sorted(group) for group in groups.values() if len(group) > 1]
+
+def add_lex_leq(model, xs, ys, name):
+    """字典序约束 xs <= ys: 前缀全部相等时，下一位必须 x <= y"""
+    prefix_equal = None  # None 表示空前缀 (恒为真)
+    for k, (x, y) in enumerate(zip(xs, ys)):
+        if prefix_equal is None:
+            model.Add(x <= y)
+        else:
+            model.Add(x <= y).OnlyEnforceIf(prefix_equal)
+        if k == len(xs) - 1:
+            break
+        # 只需单向蕴含: 前缀相等且本位相等 => 下一段前缀相等 (其余情况求解器可自由取假)
+        is_equal = model.NewBoolVar(f'{name}_eq_{k}')
+        model.Add(x != y).OnlyEnforceIf(is_equal.Not())
+        next_equal = model.NewBoolVar(f'{name}_prefix_{k}')
+        model.AddBoolOr([is_equal.Not(), next_equal] + ([prefix_equal.Not()] if prefix_equal is not None else []))
+        prefix_equal = next_equal
+
+def add_symmetry_breaking(model, schedule, groups, subjects, slots):
+    """
+    [新增] 对可互换班级组添加字典序对称破缺: 组内相邻班级的课表向量按字典序非降
+    课表向量按时段排列，每个格子的取值为科目序号 (空堂为 0)
+    """
+    subject_index = {s: i + 1 for i, s in enumerate(subjects)}
+
+    def cell_values(c):
+        return [sum(subject_index[s] * schedule[(c, d, p, s)] for s in subjects if (c, d, p, s) in schedule)
+                for d, p in slots]
+
+    for group in groups:
+        values = {c: cell_values(c) for c in group}
+        for a, b in zip(group, group[1:]):
+            add_lex_leq(model, values[a], values[b], f'sym_{a}_{b}')
+
+# [新增] 求解模式: feasible_first 找到第一个可行解即返回；balanced 相对间隙达到阈值即停止；
+# optimal (默认) 在时间上限内持续优化
+SOLVE_MODES = ("feasible_first", "balanced", "optimal")
+# [新增] 求解引擎: CP-SAT (默认) 或模拟退火局部搜索 (localsearch，超大规模学校)
+SOLVER_ENGINES = ("cpsat", "local_search")
+BALANCED_RELATIVE_GAP = 0.02
+# [新增] 允许按请求覆盖的 CP-SAT 参数 (组合求解的各成员使用不同的搜索策略)，枚举值用名称字符串
+SOLVER_OVERRIDE_KEYS = ("search_branching", "linearization_level", "cp_model_probing_level", "optimize_with_core")
+# [新增] 默认停止规则: 目标值 60 秒未改善即结束 (配置 stop_rules 覆盖，{} 表示关闭)
+DEFAULT_STOP_RULES = {"no_improvement_seconds": 60}
+STOP_RULE_KEYS = ("no_improvement_seconds", "relative_gap", "absolute_penalty")
+# [新增] 自适应求解预算: 时间上限 = 基础时间 + 每千个变量/约束的增量，限定在 [最短, 最长] 之间
+BUDGET_MIN_SECONDS = 60.0
+BUDGET_MAX_SECONDS = 600.0
+BUDGET_SECONDS_PER_KILO_ITEMS = 4.0
+# 搜索线程数不超过可用核数；小模型多开线程收益有限
+BUDGET_MAX_WORKERS = 16
+BUDGET_SMALL_MODEL_ITEMS = 20000
+BUDGET_SMALL_MODEL_WORKERS = 8
+
+def get_solver_params(config):
+    """
+    根据配置计算求解器参数 (时间上限、线程数、求解模式等)
+    [修改] 未显式指定的时间上限与线程数为 None，建模完成后由 plan_solver_budget 按实际模型规模确定
+    """
+    max_time, workers = None, None
+    if config.get('max_time_in_seconds'):
+        max_time = float(config['max_time_in_seconds'])  # 显式指定的时间上限 (基准测试等)
+    if config.get('deadline_ms'):
+        max_time = max(0.1, float(config['deadline_ms']) / 1000.0)  # 调用方指定的截止时间
+    if config.get('num_search_workers'):
+        workers = max(1, int(config['num_search_workers']))  # 组合求解按 CPU 预算分给各成员
+    mode = config.get('mode') or 'optimal'
+    if mode not in SOLVE_MODES:
+        logger.warning(f"未知求解模式 {mode}，按 optimal 处理")
+        mode = 'optimal'
+    stop_rules = config.get('stop_rules', DEFAULT_STOP_RULES) or {}
+    params = {
+        "max_time_in_seconds": max_time,
+        "num_search_workers": workers,
+        "randomize_search": True,
+        "mode": mode,
+        "stop_rules": {k: stop_rules[k] for k in STOP_RULE_KEYS if stop_rules.get(k) is not None}
+    }
+    if config.get('random_seed') is not None:
+        params["random_seed"] = int(config['random_seed'])
+    overrides = {k: v for k, v in (config.get('solver_overrides') or {}).items() if k in SOLVER_OVERRIDE_KEYS}
+    if overrides:
+        params["overrides"] = overrides
+    if mode == 'feasible_first':
+        params["stop_after_first_solution"] = True
+    elif mode == 'balanced':
+        params["relative_gap_limit"] = BALANCED_RELATIVE_GAP
+    return params
+
+def _cgroup_cpu_quota():
+    """读取 cgroup 的 CPU 配额 (v2: cpu.max，v1: cfs_quota_us / cfs_period_us)，未限制时返回 None"""
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()[:2]
+        if quota != 'max':
+            return int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as f:
+            quota = int(f.read())
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as f:
+            period = int(f.read())
+        if quota > 0 and period > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+    return None
+
+def available_cpus():
+    """[新增] 本进程实际可用的核数: CPU 亲和性与 cgroup 配额取较小值 (容器内 os.cpu_count 是宿主机核数)"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        cpus = os.cpu_count() or 1
+    quota = _cgroup_cpu_quota()
+    if quota:
+        cpus = min(cpus, int(quota))
+    return max(1, cpus)
+
+def plan_solver_budget(solver_params, model_stats, num_assumptions, cpus=None, cpu_grant=None):
+    """
+    [新增] 按实际模型规模与可用核数补全 solver_params 中未指定的时间上限和搜索线程数
+    带 assumptions (硬规则开关) 的模型 CP-SAT 只能单线程搜索，此时只分配 1 个线程
+    cpu_grant: 准入控制 (admission.py) 分给本次求解的核数，线程数 (含显式指定的) 不超过该值
+    返回写入结果 solve_info["budget"] 的预算摘要
+    """
+    cpus = cpus or available_cpus()
+    if cpu_grant:
+        cpus = min(cpus, int(cpu_grant))
+    items = model_stats["variables"] + model_stats["constraints"]
+    budget = {
+        "cpus": cpus,
+        "variables": model_stats["variables"],
+        "constraints": model_stats["constraints"],
+        "assumptions": num_assumptions,
+        "time_source": "config",
+        "workers_source": "config"
+    }
+    if solver_params["max_time_in_seconds"] is None:
+        solver_params["max_time_in_seconds"] = round(min(
+            BUDGET_MAX_SECONDS, BUDGET_MIN_SECONDS + BUDGET_SECONDS_PER_KILO_ITEMS * items / 1000.0
+        ), 1)
+        budget["time_source"] = "model_size"
+    if solver_params["num_search_workers"] is None:
+        if num_assumptions:
+            solver_params["num_search_workers"] = 1
+            budget["workers_source"] = "assumptions"
+        else:
+            cap = BUDGET_SMALL_MODEL_WORKERS if items < BUDGET_SMALL_MODEL_ITEMS else BUDGET_MAX_WORKERS
+            solver_params["num_search_workers"] = max(1, min(cpus, cap))
+            budget["workers_source"] = "cpus"
+    elif cpu_grant and solver_params["num_search_workers"] > cpus:
+        solver_params["num_search_workers"] = cpus
+        budget["workers_source"] = "admission"
+    budget["max_time_in_seconds"] = solver_params["max_time_in_seconds"]
+    budget["num_search_workers"] = solver_params["num_search_workers"]
+    return budget
+
+def expected_search_workers(config, cpus):
+    """
+    [新增] 建模前估计本次求解的搜索线程数 (准入控制按此申请核数)，与 plan_solver_budget 的分配一致:
+    显式指定时按指定值；有硬规则、预排课程或老师禁排时模型带 assumptions，CP-SAT 只用 1 个线程
+    """
+    if config.get('num_search_workers'):
+        return max(1, int(config['num_search_workers']))
+    constraints = config.get('constraints') or {}
+    if constraints.get('fixed_courses') or constraints.get('teacher_unavailable') or \
+            any(rule.get('weight', 100) >= 100 for rule in _effective_rules(config)):
+        return 1
+    return max(1, min(int(cpus), BUDGET_MAX_WORKERS))
+
+def apply_solver_overrides(parameters, overrides):
+    """[新增] 把白名单内的参数写入 CpSolver.parameters，枚举参数按名称解析 (如 "PORTFOLIO_SEARCH")"""
+    for key, value in (overrides or {}).items():
+        if key not in SOLVER_OVERRIDE_KEYS:
+            continue
+        if isinstance(value, str):
+            value = getattr(type(parameters), value)
+        setattr(parameters, key, value)
+
+def stop_reason_for(status, solver_params, deadline_ms=None, callback=None):
+    """[新增] 本次求解结束的原因 (停止规则 / 最优 / 无解 / 首个可行解 / 截止时间 / 时间上限)"""
+    if callback is not None and callback.stop_reason:
+        return callback.stop_reason
+    if status == cp_model.OPTIMAL:
+        return "gap_limit" if solver_params.get("relative_gap_limit") else "optimal"
+    if status == cp_model.INFEASIBLE:
+        return "infeasible"
+    if status == cp_model.FEASIBLE and solver_params.get("stop_after_first_solution"):
+        return "first_solution"
+    return "deadline" if deadline_ms else "time_limit"
+
+def describe_solve(solver, status, solver_params, deadline_ms=None, callback=None):
+    """[新增] 求解结果摘要: 模式、截止时间、状态、停止原因，有解时附带目标值、下界与相对间隙"""
+    info = {
+        "mode": solver_params["mode"],
+        "deadline_ms": deadline_ms,
+        "solver_status": solver.StatusName(status),
+        "stop_reason": stop_reason_for(status, solver_params, deadline_ms, callback),
+        "wall_time": round(solver.WallTime(), 3)
+    }
+    if status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        objective, bound = solver.ObjectiveValue(), solver.BestObjectiveBound()
+        info.update({
+            "objective": objective,
+            "best_bound": bound,
+            "gap": round(abs(objective - bound) / max(1.0, abs(objective)), 4)
+        })
+    return info
+
+
+def cancelled_result(model_stats=None, solve_info=None):
+    """[新增] 取消时尚未找到可行课表的返回结果"""
+    return {
+        "status": "cancelled",
+        "error_type": "cancelled",
+        "message": "求解已取消，取消前尚未找到可行课表",
+        "suggestions": ["修改配置后重新生成"],
+        "model_stats": model_stats,
+        "solve_info": solve_info
+    }
+
+
+def model_size_stats(model, encoding):
+    """[新增] 统计模型规模 (变量数、约束数、目标函数项数、带开关的约束数、假设文字数)，用于对比不同编码方式"""
+    proto = model.Proto()
+    return {
+        "encoding": encoding,
+        "variables": len(proto.variables),
+        "constraints": len(proto.constraints),
+        "objective_terms": len(proto.objective.vars),
+        "reified_constraints": sum(1 for c in proto.constraints if c.enforcement_literal),
+        "assumptions": len(proto.assumptions)
+    }
+
+
+# 影响排课结果的配置项 (结果缓存的内容哈希只看这些字段)
+CACHE_CONFIG_KEYS = (
+    "num_classes", "courses", "grades", "teacher_names", "grade_teacher_names",
+    "teacher_limits", "rules", "constraints", "use_legacy_rules", "resources"
+)
+
+def _normalize_for_hash(value):
+    """递归规范化: 去掉字符串首尾空格、空容器，使语义相同的配置得到相同哈希"""
+    if isinstance(value, dict):
+        normalized = {}
+        for k, v in value.items():
+            v = _normalize_for_hash(v)
+            if v in (None, "", [], {}):
+                continue
+            normalized[str(k).strip()] = v
+        return normalized
+    if isinstance(value, (list, tuple)):
+        return [_normalize_for_hash(v) for v in value]
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+def _normalize_courses(courses):
+    """课程配置统一为 {科目: {"count": n, "type": ...}} (兼容数字和列表两种旧格式)"""
+    if isinstance(courses, list):
+        courses = {item['name']: item for item in courses if isinstance(item, dict) and item.get('name')}
+    normalized = {}
+    for s, c in (courses or {}).items():
+        if isinstance(c, dict):
+            normalized[s] = {k: v for k, v in c.items() if k != 'name'}
+        else:
+            normalized[s] = {"count": int(c), "type": "main" if int(c) >= 5 else "minor"}
+    return normalized
+
+def solve_strategy(config):
+    """
+    [新增] 影响求解结果的求解方式 (引擎、分层优化、组合/分解求解、编码、提示等)，未指定的取默认值
+    结果缓存与进行中请求合并都按此区分: 不同方式得到的课表与附加报告 (portfolio / decomposition 等) 不同
+    """
+    return {
+        "engine": config.get("engine") or "cpsat",  # 局部搜索不保证可行
+        "lexicographic": bool(config.get("lexicographic")),  # 规则优先级已包含在 rules 中
+        "portfolio": config.get("portfolio") or False,
+        "decompose": config.get("decompose", "auto"),  # auto 的判定只依赖年级配置，已在哈希中
+        "model_encoding": config.get("model_encoding") or "boolean",
+        "symmetry_breaking": bool(config.get("symmetry_breaking")),
+        "lazy_rules": bool(config.get("lazy_rules")),
+        "prune_domains": bool(config.get("prune_domains", True)),
+        "greedy_hints": bool(config.get("greedy_hints")),
+        "hint_cells": config.get("hint_cells") or []
+    }
+
+def canonical_config_hash(config):
+    """
+    计算配置的规范化内容哈希 (SHA-256)，用于结果缓存和重复请求识别
+    包含年级/课程/老师/限制/规则/约束、求解方式 (solve_strategy)，以及最终生效的求解器参数
+    """
+    canonical = {k: config.get(k) for k in CACHE_CONFIG_KEYS}
+    canonical["use_legacy_rules"] = config.get("use_legacy_rules", True)
+    canonical["courses"] = _normalize_courses(config.get("courses"))
+    grades = {}
+    for grade_name, info in (config.get("grades") or {}).items():
+        info = dict(info)
+        info["courses"] = _normalize_courses(info.get("courses"))
+        grades[grade_name] = info
+    canonical["grades"] = grades
+    canonical["solver_params"] = get_solver_params(config)
+    canonical["strategy"] = solve_strategy(config)
+    payload = json.dumps(_normalize_for_hash(canonical), sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def run_scheduler(config=None, progress=None, prepare_only=False, cancel=None):
+    """
+    progress: 可选回调，接收求解进度事件 (见 SolutionProgressCallback)
+    prepare_only: 只生成班级/老师分配数据，不建模求解 (供分解求解规划使用)
+    cancel: 可选的取消事件 (有 is_set() 方法)，置位后停止搜索并返回 status="cancelled" 与当前最优课表
+    """
     if config is None: config = DEFAULT_CONFIG
+    # 冲突诊断重建模型时沿用原请求的开始时间 (run_started_at)，deadline_ms 不重新计时
+    run_start = config.get('run_started_at') or time.time()
+
+    # [新增] 局部搜索引擎 (超大规模学校): 不建 CP-SAT 模型，由 localsearch 模块搜索
+    if config.get('engine') == 'local_search' and not prepare_only:
+        import localsearch
+        return localsearch.solve_local_search(config, progress=progress, cancel=cancel)
     
     NUM_CLASSES = int(config.get('num_classes', 10))
     original_courses = config.get('courses', DEFAULT_CONFIG['courses'])
@@ -1008,7 +2161,6 @@ def run_scheduler(config=None):
         
         # [性能优化] 活动类科目不需要真实老师资源，使用虚拟老师池
         # 这些科目一个老师可以同时带多个班级，不产生老师冲突
-        ACTIVITY_SUBJECTS = {'政教活动', '课外活动', '拓展课'}
         is_activity_subject = subj in ACTIVITY_SUBJECTS
         
         # [核心修复] 如果并发需求超过了可用老师数，标记为需要一对一分配
@@ -1195,15 +2347,83 @@ def run_scheduler(config=None):
                     }
     # ====================================================================
 
+    t_id_to_name = {t['id']: t['name'] for t in TEACHERS_DB}
+
+    def subject_lessons(c, subj):
+        """该班级该科目 (含 _AUTO_SUB 分片) 的周课时: 原老师受课时上限约束，超出部分由分片老师承担"""
+        base_subj = subj.replace("_AUTO_SUB", "")
+        c_reqs = class_metadata[c]["requirements"]
+        t_name = t_id_to_name.get(CLASS_TEACHER_MAP.get((c, base_subj)), "")
+        limit = 999
+        for k, v in config.get("teacher_limits", {}).items():
+             if k.strip() == t_name.strip() and v.get('max'): limit = int(v['max'])
+        total_needed = c_reqs[base_subj]["count"]
+        if "_AUTO_SUB" in subj:
+            return total_needed - limit if total_needed > limit else 0
+        return min(total_needed, limit)
+
+    def lesson_counts():
+        """各 (班级, 科目) 的周课时 (含 _AUTO_SUB 分片)"""
+        return {(c, subj): subject_lessons(c, subj) for c in CLASSES for subj in ALL_SUBJECTS_IN_VARS
+                if subj.replace('_AUTO_SUB', '') in class_metadata[c]['requirements']}
+
+    # [新增] 分解求解: 只返回建模前的班级与老师分配，供 decomposition 模块规划时段预留
+    # 同时返回各 (班级, 科目) 的周课时，供贪心构造 (greedy) 直接使用
+    if prepare_only:
+        return {
+            "status": "success",
+            "class_metadata": class_metadata,
+            "teachers_db": TEACHERS_DB,
+            "class_teacher_map": CLASS_TEACHER_MAP,
+            "classes": CLASSES,
+            "days": DAYS,
+            "periods": PERIODS,
+            "rules": _effective_rules(config),
+            "courses": global_course_requirements,
+            "lessons": lesson_counts(),
+            "sharding_info": sharding_report
+        }
+
+    # [新增] 年级子问题: 只为指定年级的班级建模
+    # 老师分配仍基于全量配置生成，保证各年级子问题与最终合并时的老师 ID 一致
+    decompose_grade = config.get('decompose_grade')
+    if decompose_grade is not None:
+        CLASSES = [c for c in CLASSES if class_metadata[c]['grade'] == decompose_grade]
+        class_metadata = {c: class_metadata[c] for c in CLASSES}
+        CLASS_TEACHER_MAP = {k: v for k, v in CLASS_TEACHER_MAP.items() if k[0] in class_metadata}
+        logger.info(f"年级子问题 [{decompose_grade}]: {len(CLASSES)} 个班级")
+
     # 2. 建模
     # 2. 建模
+    build_start = time.time()
     model = cp_model.CpModel()
     
     # [核心新增] 全局冲突诊断映射表
     assumption_literals = []
     rule_mapping = {}
+    assumption_groups = {}  # [新增] 分组开关 Index -> 组内逐格约束，冲突诊断时细化
     schedule = {}
     penalties = []
+    penalty_tiers = []  # [新增] 每个罚分项的优先级，分层优化时使用
+
+    # [新增] 定义域缩减: 始终生效的硬规则禁止的时段、课时为 0 的 _AUTO_SUB 分片不创建变量
+    # 配置 prune_domains=False 时创建全部变量 (冲突诊断时使用，让每条规则都能通过开关定位)
+    prune_domains = config.get('prune_domains', True)
+    forbidden_slots = {}
+    if prune_domains:
+        forbidden_slots = compute_forbidden_slots(
+            _effective_rules(config), TEACHERS_DB, class_metadata, CLASS_TEACHER_MAP,
+            config.get('constraints', {}).get('teacher_unavailable', {}), DAYS, PERIODS
+        )
+        # 预排课程的变量必须保留，否则预排会被静默忽略，无法报告与禁排规则的冲突
+        for c_str, fixes in config.get('constraints', {}).get('fixed_courses', {}).items():
+            for slot_key, subj_name in fixes.items():
+                try:
+                    d_str, p_str = slot_key.split('_')
+                    forbidden_slots.get((int(c_str), subj_name), set()).discard((int(d_str), int(p_str)))
+                except (ValueError, TypeError):
+                    continue
+    pruned_vars = 0
 
     # [性能优化] 只为每个班级需要的科目创建变量，而非全部科目
     # 这可以将变量规模减少约 90%，极大提升求解速度
@@ -1211,12 +2431,21 @@ def run_scheduler(config=None):
         # 获取该班级需要的科目列表
         required_subjects = set(class_metadata[c]['requirements'].keys())
         
-        for d in range(DAYS):
-            for p in range(PERIODS):
-                for subj in ALL_SUBJECTS_IN_VARS:
-                    # 只有该班级需要的科目才创建变量
-                    if subj in required_subjects or subj.replace('_AUTO_SUB', '') in required_subjects:
-                        schedule[(c, d, p, subj)] = model.NewBoolVar(f'c{c}_{d}_{p}_{subj}')
+        for subj in ALL_SUBJECTS_IN_VARS:
+            # 只有该班级需要的科目才创建变量
+            if not (subj in required_subjects or subj.replace('_AUTO_SUB', '') in required_subjects):
+                continue
+            if prune_domains and "_AUTO_SUB" in subj and subject_lessons(c, subj) == 0:
+                pruned_vars += len(SLOTS)
+                continue
+            blocked = forbidden_slots.get((c, subj), ())
+            for d, p in SLOTS:
+                if (d, p) in blocked:
+                    pruned_vars += 1
+                    continue
+                schedule[(c, d, p, subj)] = model.NewBoolVar(f'c{c}_{d}_{p}_{subj}')
+    if prune_domains:
+        logger.info(f"定义域缩减: 跳过 {pruned_vars} 个不可能为真的变量，创建 {len(schedule)} 个")
 
     # === [新增] 特定老师的课时约束 ===
     # [修改版] 更健壮的名字匹配
@@ -1227,6 +2456,9 @@ def run_scheduler(config=None):
     for (c, s), t_id in CLASS_TEACHER_MAP.items():
         teacher_assignments[t_id].append((c, s))
 
+    # [性能优化] 老师注册表与 (老师, 天, 节) -> 变量 索引只构建一次，冲突约束、规则引擎、禁排设置共用
+    rule_index = RuleIndex(TEACHERS_DB, class_metadata, teacher_assignments, schedule)
+
     for t_name, limits in teacher_limits.items():
         clean_name = t_name.strip() # 输入的名字也去除空格
         
@@ -1255,11 +2487,29 @@ def run_scheduler(config=None):
 
     # --- 约束条件 (包含之前的修复：允许空堂) ---
     
+    # [新增] 建模方式: "boolean" (默认，线性求和) 或 "compact" (AtMostOne/ExactlyOne + 格子整数 + element 通道)
+    compact_encoding = config.get('model_encoding') == 'compact'
+    cell_subject = {}  # compact: (c, d, p) -> 该格科目序号 (0 为空堂)
+
     # 1. 唯一性: 每个格子 <= 1 门课
     for c in CLASSES:
+        class_subjects = [s for s in ALL_SUBJECTS_IN_VARS if any((c, d, p, s) in schedule for d, p in SLOTS)]
+        # 课时恰好排满一周的班级每格恰好一门课 (有老师课时上限时课时数可能被压缩，不做此推断)
+        full_week = not teacher_limits and \
+            sum(int(cfg.get('count', 0)) for cfg in class_metadata[c]['requirements'].values()) == len(SLOTS)
         for d, p in SLOTS:
-            # [性能优化兼容] 只对存在的变量求和
-            model.Add(sum(schedule[(c, d, p, s)] for s in ALL_SUBJECTS_IN_VARS if (c, d, p, s) in schedule) <= 1)
+            cell_vars = [schedule[(c, d, p, s)] for s in ALL_SUBJECTS_IN_VARS if (c, d, p, s) in schedule]
+            if not compact_encoding:
+                # [性能优化兼容] 只对存在的变量求和
+                model.Add(cp_model.LinearExpr.Sum(cell_vars) <= 1)
+                continue
+            if full_week:
+                model.AddExactlyOne(cell_vars)
+            else:
+                model.AddAtMostOne(cell_vars)
+            cell = model.NewIntVar(0, len(class_subjects), f'cell_{c}_{d}_{p}')
+            model.Add(cell == sum((i + 1) * schedule[(c, d, p, s)] for i, s in enumerate(class_subjects) if (c, d, p, s) in schedule))
+            cell_subject[(c, d, p)] = (cell, class_subjects)
     
     # 2. 差异化课时总量控制 (硬约束，不需要诊断开关)
     # [性能优化] 移除了为每个(班级,科目)创建诊断开关的逻辑
@@ -1267,41 +2517,14 @@ def run_scheduler(config=None):
     for c in CLASSES:
         c_reqs = class_metadata[c]["requirements"]
         for subj in ALL_SUBJECTS_IN_VARS:
-
-            if "_AUTO_SUB" in subj:
-                base_subj = subj.replace("_AUTO_SUB", "")
-                if base_subj in c_reqs:
-                    t_id = CLASS_TEACHER_MAP.get((c, base_subj))
-                    t_name = next((t['name'] for t in TEACHERS_DB if t['id'] == t_id), "")
-                    limit = 999 
-                    for k, v in config.get("teacher_limits", {}).items():
-                         if k.strip() == t_name.strip() and v.get('max'): limit = int(v['max'])
-                    
-                    total_needed = c_reqs[base_subj]["count"]
-                    if total_needed > limit:
-                        model.Add(sum(schedule[(c, d, p, subj)] for d, p in SLOTS if (c, d, p, subj) in schedule) == (total_needed - limit))
-                    else:
-                        model.Add(sum(schedule[(c, d, p, subj)] for d, p in SLOTS if (c, d, p, subj) in schedule) == 0)
-                else:
-                    pass  # [性能优化] 该班级不需要此科目，跳过；变量根本不存在
-            else:
-                if subj in c_reqs:
-                    t_id = CLASS_TEACHER_MAP.get((c, subj))
-                    t_name = next((t['name'] for t in TEACHERS_DB if t['id'] == t_id), "")
-                    limit = 999
-                    for k, v in config.get("teacher_limits", {}).items():
-                         if k.strip() == t_name.strip() and v.get('max'): limit = int(v['max'])
-                    
-                    total_needed = c_reqs[subj]["count"]
-                    model.Add(sum(schedule[(c, d, p, subj)] for d, p in SLOTS if (c, d, p, subj) in schedule) == min(total_needed, limit))
-                else:
-                    if "_AUTO_SUB" not in subj:
-                        pass  # [性能优化] 该班级不需要此科目，跳过；变量根本不存在
+            if subj.replace("_AUTO_SUB", "") not in c_reqs:
+                continue  # [性能优化] 该班级不需要此科目，跳过；变量根本不存在
+            # 定义域缩减后可能一个变量都没有: 需要 0 节时恒成立，需要多节时模型直接无解
+            model.Add(sum(schedule[(c, d, p, subj)] for d, p in SLOTS if (c, d, p, subj) in schedule) == subject_lessons(c, subj))
 
 
     # 3. 老师冲突约束 (核心约束：同一老师同一时刻只能在一个班级上课)
     # [性能优化] 活动类科目使用虚拟老师，跳过冲突约束
-    ACTIVITY_SUBJECTS = {'政教活动', '课外活动', '拓展课'}
     
     # [修复] 新增：按"自然人"（姓名）聚合所有 TID，解决主课老师跨年级"分身"问题
     # 之前只按 TID 遍历，导致 "t_王老师_初一" 和 "t_王老师_初二" 被视为两个人
@@ -1309,6 +2532,11 @@ def run_scheduler(config=None):
     for t in TEACHERS_DB:
         real_person_map[t['name']].append(t['id'])
     
+    # compact: 格子老师 = element(该班 科目序号 -> 老师序号, 格子科目)，同一时段各班的格子老师互不相同
+    # 空堂和活动课映射为各班独有的占位序号，不参与冲突
+    conflict_person_index = {}
+    cell_teacher_tables = {}
+    
     for name, tids in real_person_map.items():
         # 获取该自然人名下所有 ID 的所有课程分配
         all_assignments = []
@@ -1323,21 +2551,43 @@ def run_scheduler(config=None):
         taught_subjects = set(s for (c, s) in all_assignments)
         if taught_subjects.issubset(ACTIVITY_SUBJECTS):
             continue  # 活动类科目的虚拟老师不需要冲突约束
+
+        if compact_encoding:
+            person = conflict_person_index.setdefault(name, len(conflict_person_index) + 1)
+            for (c, s) in all_assignments:
+                cell_teacher_tables[(c, s)] = person
             
         for d in range(DAYS):
-            for p in range(PERIODS):
-                # 该自然人在这个时段的所有可能排课变量（包括所有"分身"）
-                teacher_slot_vars = [schedule[(c, d, p, s)] for (c, s) in all_assignments if (c, d, p, s) in schedule]
-                # 约束：同一时刻最多只能上一节课
-                if teacher_slot_vars:
-                    model.Add(sum(teacher_slot_vars) <= 1)
+            if not compact_encoding:
+                for p in range(PERIODS):
+                    # 该自然人在这个时段的所有可能排课变量（包括所有"分身"）
+                    teacher_slot_vars = [v for tid in tids for v in rule_index.teacher_vars(tid, d, p)]
+                    # 约束：同一时刻最多只能上一节课
+                    if teacher_slot_vars:
+                        model.Add(cp_model.LinearExpr.Sum(teacher_slot_vars) <= 1)
             
             # --- [绍兴一中补全] 4.4.3 老师四五节不连堂 (硬约束) ---
             # 规则：上午最后一节 (p=3) 和下午第一节 (p=4) 不连堂
-            vars_p3 = [schedule[(c, d, 3, s)] for (c, s) in all_assignments if (c, d, 3, s) in schedule]
-            vars_p4 = [schedule[(c, d, 4, s)] for (c, s) in all_assignments if (c, d, 4, s) in schedule]
+            vars_p3 = [v for tid in tids for v in rule_index.teacher_vars(tid, d, 3)]
+            vars_p4 = [v for tid in tids for v in rule_index.teacher_vars(tid, d, 4)]
             if vars_p3 and vars_p4:
-                model.Add(sum(vars_p3) + sum(vars_p4) <= 1)
+                if compact_encoding:
+                    model.AddAtMostOne(vars_p3 + vars_p4)
+                else:
+                    model.Add(cp_model.LinearExpr.Sum(vars_p3 + vars_p4) <= 1)
+
+    if compact_encoding:
+        placeholder_base = len(conflict_person_index) + 1
+        for d, p in SLOTS:
+            slot_teachers = []
+            for ci, c in enumerate(CLASSES):
+                cell, class_subjects = cell_subject[(c, d, p)]
+                own = placeholder_base + ci  # 本班独有的占位序号
+                table = [own] + [cell_teacher_tables.get((c, s), own) for s in class_subjects]
+                teacher = model.NewIntVar(min(table), max(table), f'cell_teacher_{c}_{d}_{p}')
+                model.AddElement(cell, table, teacher)
+                slot_teachers.append(teacher)
+            model.AddAllDifferent(slot_teachers)
 
     # ====================================================================
     # 4. 规则引擎集成 (New Rule Engine)
@@ -1359,8 +2609,22 @@ def run_scheduler(config=None):
         rules = SHAOXING_PRESET_RULES
         logger.info("Using SHAOXING_PRESET_RULES because rules list is empty and legacy mode is enabled.")
 
+    # [新增] 规则懒加载 (lazy_rules): 先只注入廉价规则，其余规则求解后按当前解检查，被违反时才加入模型
+    # 增量重排的邻域逐级放宽依赖完整模型，不与懒加载同时使用
+    lazy = None
+    eager_rules = rules
+    if config.get('lazy_rules') and not config.get('incremental') and not config.get('lexicographic'):
+        eager_rules = [r for r in rules if is_eager_rule(r)]
+        lazy = {
+            "eager_rules": len(eager_rules),
+            "lazy_rules": len(rules) - len(eager_rules),
+            "activated": [],
+            "rounds": []
+        }
+        logger.info(f"规则懒加载: 先加入 {lazy['eager_rules']} 条规则，{lazy['lazy_rules']} 条按需加入")
+
     # 注入通用规则
-    apply_universal_rules(model, schedule, rules, TEACHERS_DB, class_metadata, teacher_assignments, ALL_SUBJECTS_IN_VARS, SLOTS, penalties, assumption_literals, rule_mapping)
+    apply_universal_rules(model, schedule, eager_rules, TEACHERS_DB, class_metadata, teacher_assignments, ALL_SUBJECTS_IN_VARS, SLOTS, penalties, assumption_literals, rule_mapping, rule_index, penalty_tiers)
 
     # --- 6. 教室资源约束 (Classroom Constraints) ---
         
@@ -1399,6 +2663,7 @@ def run_scheduler(config=None):
     '''
 
     # 处理老师禁排与固定课程
+    # [修改] 每个班级的固定课程、每位老师的禁排各用一个分组开关 (原为逐格一个开关)
     unavailable_settings = CONSTRAINTS.get('teacher_unavailable', {})
     fixed_courses = CONSTRAINTS.get('fixed_courses', {})
 
@@ -1408,63 +2673,209 @@ def run_scheduler(config=None):
             except: continue
             if c not in CLASSES: continue
             
+            members = []
             for slot_key, subj_name in fixes.items():
                 if subj_name not in ALL_SUBJECTS_IN_VARS: continue
                 try:
                     d_str, p_str = slot_key.split('_')
                     d, p = int(d_str), int(p_str)
-                    
-                    # 创建开关
-                    sys_switch = model.NewBoolVar(f'sys_fixed_{c}_{d}_{p}')
-                    assumption_literals.append(sys_switch)
-                    rule_mapping[sys_switch.Index()] = f"【系统预排】{c}班_{subj_name}_固定({d},{p})"
-                    
-                    model.Add(schedule[(c, d, p, subj_name)] == 1).OnlyEnforceIf(sys_switch)
+                    members.append((f"【系统预排】{c}班_{subj_name}_固定({d},{p})", schedule[(c, d, p, subj_name)], 1))
                 except: pass
+            if members:
+                add_assumption_group(model, f'sys_fixed_{c}', f"【系统预排】{c}班_固定课程 ({len(members)} 节)",
+                                     members, assumption_literals, rule_mapping, assumption_groups)
 
     for t_name, slots in unavailable_settings.items():
         tids = name_to_tids.get(t_name, [])
+        members = []
         for tid in tids:
             assignments = teacher_assignments.get(tid, [])
             if not assignments: continue
             for day, period in slots:
                  if 0 <= day < DAYS and 0 <= period < PERIODS:
-                    sys_switch = model.NewBoolVar(f'sys_unavail_{t_name}_{day}_{period}')
-                    assumption_literals.append(sys_switch)
-                    rule_mapping[sys_switch.Index()] = f"【老师禁排】{t_name}_周{day+1}第{period+1}节"
-                    model.Add(sum(schedule[(c, day, period, s)] for (c, s) in assignments) == 0).OnlyEnforceIf(sys_switch)
+                    members.append((f"【老师禁排】{t_name}_周{day+1}第{period+1}节",
+                                    cp_model.LinearExpr.Sum(rule_index.teacher_vars(tid, day, period)), 0))
+        if members:
+            add_assumption_group(model, f'sys_unavail_{t_name}', f"【老师禁排】{t_name} ({len(members)} 个时段)",
+                                 members, assumption_literals, rule_mapping, assumption_groups)
+
+
+    # [新增] 对称破缺 (可选): 可互换的班级按课表字典序排列，避免搜索大量等价排列
+    # 热启动/增量重排时基准课表已经确定了班级顺序，不再添加
+    symmetry = None
+    if config.get('symmetry_breaking') and not config.get('hint_cells'):
+        symmetry_groups = find_interchangeable_classes(
+            CLASSES, class_metadata, CLASS_TEACHER_MAP, TEACHERS_DB, config, rules
+        )
+        add_symmetry_breaking(model, schedule, symmetry_groups, ALL_SUBJECTS_IN_VARS, SLOTS)
+        symmetry = {"groups": len(symmetry_groups), "classes": sum(len(g) for g in symmetry_groups)}
+        logger.info(f"对称破缺: {symmetry['groups']} 组可互换班级，共 {symmetry['classes']} 个班级")
+
+    # [新增] 热启动: 以基准课表作为解提示，配置小改动时能很快找到第一个好解
+    warm_start = None
+    base_keys = set()
+    hint_cells = config.get('hint_cells')
+    if hint_cells:
+        warm_start, base_keys = apply_solution_hints(
+            model, schedule, hint_cells, CLASS_TEACHER_MAP, {t['id']: t['name'] for t in TEACHERS_DB}
+        )
+    elif config.get('greedy_hints') and prune_domains:
+        # [新增] 没有基准课表时，以贪心构造的课表作为解提示 (放不下的课对应格子提示为 0)
+        import greedy
+        constructed, _, greedy_stats = greedy.GreedyScheduler(
+            CLASSES, class_metadata, CLASS_TEACHER_MAP, TEACHERS_DB, lesson_counts(), forbidden_slots,
+            DAYS, PERIODS, rules=_effective_rules(config),
+            fixed_courses=config.get('constraints', {}).get('fixed_courses'), seed=config.get('random_seed', 0)
+        ).run()
+        warm_start, _ = apply_solution_hints(
+            model, schedule, greedy.hint_cells(constructed), CLASS_TEACHER_MAP, t_id_to_name
+        )
+        warm_start.update(source="greedy", greedy=greedy_stats)
 
+    # [新增] 增量重排: 找出受配置改动影响的班级，其余班级冻结为基准课表
+    incremental = None
+    if config.get('incremental') and base_keys:
+        scope = detect_affected_scope(
+            config.get('base_config'), config, hint_cells, class_metadata, CLASS_TEACHER_MAP, TEACHERS_DB
+        )
+        freeze_literals = add_freeze_literals(model, schedule, base_keys)
+        # 稳定性目标: 每挪动一节基准课表中的课记 1 分，尽量少改老师已经看到的课表
+        stability_tier = max(penalty_tiers, default=LEX_DEFAULT_PRIORITY) + 1
+        penalties.extend((schedule[key], -1) for key in base_keys)
+        penalties.append((None, len(base_keys)))
+        penalty_tiers.extend([stability_tier] * (len(base_keys) + 1))
+        incremental = {
+            "affected_classes": sorted(scope["classes"]),
+            "affected_teachers": sorted(scope["teachers"]),
+            "changed_rules": scope["rules"],
+            "steps": []
+        }
+        logger.info(f"增量重排: 受影响班级 {incremental['affected_classes']}，老师 {incremental['affected_teachers']}")
 
     # 设置总目标：最小化惩罚
+    # [修改] 罚分项按变量合并为一个加权和 (原为逐项相加的表达式)
     if penalties:
-        model.Minimize(sum(penalties))
+        model.Minimize(penalty_objective(penalties))
 
     # 激活所有开关
     logger.info(f"DEBUG: assumption_literals count: {len(assumption_literals)}")
     if assumption_literals:
         model.AddAssumptions(assumption_literals)
 
+    # [新增] 记录模型规模与建模耗时，便于对比 boolean / compact 两种编码
+    model_stats = model_size_stats(model, 'compact' if compact_encoding else 'boolean')
+    model_stats["build_seconds"] = round(time.time() - build_start, 3)
+    logger.info(f"模型规模 ({model_stats['encoding']}): {model_stats['variables']} 个变量, "
+                f"{model_stats['constraints']} 条约束, 建模 {model_stats['build_seconds']}s")
+
     # 求解
-    solver = cp_model.CpSolver()
-    # 根据班级数动态调整求解时间
-    if NUM_CLASSES >= 100:
-        solver.parameters.max_time_in_seconds = 600.0  # 10分钟
-        solver.parameters.num_search_workers = 24  # 最大线程
-        logger.info(f"Large scale mode: 100+ classes, solver timeout 10min, 24 threads")
-    elif NUM_CLASSES >= 60:
-        solver.parameters.max_time_in_seconds = 300.0  # 5分钟
-        solver.parameters.num_search_workers = 16
-    else:
-        solver.parameters.max_time_in_seconds = 180.0  # 3分钟
-        solver.parameters.num_search_workers = 12
-    solver.parameters.randomize_search = True 
-    solver.parameters.log_search_progress = True
-    
+    # [修改] 时间上限与线程数按实际模型规模和可用核数确定 (原先按 config['num_classes'] 分档)
+    solver_params = get_solver_params(config)
+    budget = plan_solver_budget(solver_params, model_stats, len(assumption_literals), cpu_grant=config.get('cpu_grant'))
+    logger.info(f"求解预算: {budget['max_time_in_seconds']}s ({budget['time_source']}), "
+                f"{budget['num_search_workers']} 个搜索线程 ({budget['workers_source']}), 可用核数 {budget['cpus']}")
+
+    # [新增] deadline_ms 从收到请求 (进入 run_scheduler) 开始计时，建模耗时也计入
+    deadline_at = run_start + float(config['deadline_ms']) / 1000.0 if config.get('deadline_ms') else None
+
+    def create_solver(max_time=None):
+        solver = cp_model.CpSolver()
+        max_time = max_time or solver_params["max_time_in_seconds"]
+        if deadline_at is not None:
+            max_time = max(0.1, min(max_time, deadline_at - time.time()))
+        solver.parameters.max_time_in_seconds = max_time
+        solver.parameters.num_search_workers = solver_params["num_search_workers"]
+        solver.parameters.randomize_search = solver_params["randomize_search"]
+        if solver_params.get("stop_after_first_solution"):
+            solver.parameters.stop_after_first_solution = True
+        if solver_params.get("relative_gap_limit"):
+            solver.parameters.relative_gap_limit = solver_params["relative_gap_limit"]
+        if "random_seed" in solver_params:
+            solver.parameters.random_seed = solver_params["random_seed"]
+        apply_solver_overrides(solver.parameters, solver_params.get("overrides"))
+        solver.parameters.log_search_progress = True
+        return solver
+
     # [修复] 移除 StopAfterFirstSolution 回调，让求解器进行完整优化
     # 这样软约束 (weight < 100) 的惩罚才会真正被最小化
-    status = solver.Solve(model)
+    # [新增] 如果调用方订阅了进度，则挂载只推送、不中断搜索的回调
+    # [新增] 配置了停止规则时，即使没有订阅进度也挂载回调，用于提前结束停滞的优化
+    progress_callback = None
+    if progress:
+        progress({
+            "type": "started",
+            "num_classes": len(CLASSES),
+            "max_time_in_seconds": solver_params["max_time_in_seconds"],
+            "mode": solver_params["mode"],
+            "warm_start": warm_start
+        })
+    if progress or solver_params["stop_rules"] or cancel is not None:
+        progress_callback = EarlyStopCallback(
+            schedule, CLASS_TEACHER_MAP, {t['id']: t['name'] for t in TEACHERS_DB}, progress,
+            stop_rules=solver_params["stop_rules"], cancel_event=cancel
+        )
+    if cancel is not None and cancel.is_set():
+        logger.info("求解开始前已取消")
+        return cancelled_result(model_stats)
+
+    solve_start = time.time()
+    solver, status = None, None
+    if incremental is not None:
+        solver, status, incremental["steps"] = solve_incremental(
+            model, freeze_literals,
+            build_neighbourhoods(scope["classes"], class_metadata, CLASS_TEACHER_MAP, config.get('incremental_release')),
+            assumption_literals, create_solver, float(config.get('incremental_step_seconds', 30)),
+            progress_callback, progress
+        )
+        if solver is None:
+            logger.info("增量重排: 各级邻域均未找到可行解，回退到全量求解")
+
+    # [新增] 分层优化 (lexicographic): 罚分项分属两个以上优先级时逐层求解
+    lexicographic = None
+    if solver is None and config.get('lexicographic') and len(set(penalty_tiers)) > 1:
+        solver, status, stages = solve_lexicographic(
+            model, schedule, penalties, penalty_tiers, create_solver, solver_params["max_time_in_seconds"],
+            solution_callback=progress_callback, progress=progress, cancel=cancel
+        )
+        lexicographic = {"stages": stages}
+
+    if solver is None and lazy is not None:
+        def add_rules(new_rules):
+            apply_universal_rules(model, schedule, new_rules, TEACHERS_DB, class_metadata, teacher_assignments,
+                                  ALL_SUBJECTS_IN_VARS, SLOTS, penalties, assumption_literals, rule_mapping, rule_index,
+                                  penalty_tiers)
+            model.ClearAssumptions()
+            if assumption_literals:
+                model.AddAssumptions(assumption_literals)
+            lazy["activated"].extend(r.get('name', r.get('type')) for r in new_rules)
+
+        def count_violations(rule, value):
+            return count_rule_violations(rule, value, schedule, rule_index, class_metadata, teacher_assignments, SLOTS)
+
+        solver, status, lazy["rounds"] = solve_lazy_rules(
+            model, schedule, [r for r in rules if not is_eager_rule(r)], add_rules, count_violations,
+            create_solver, solver_params["max_time_in_seconds"], solution_callback=progress_callback, progress=progress, cancel=cancel
+        )
+        final = model_size_stats(model, model_stats["encoding"])
+        lazy["final_model"] = {"variables": final["variables"], "constraints": final["constraints"]}
+
+    if solver is None:
+        solver = create_solver()
+        if progress_callback:
+            with progress_callback.watch(solver):
+                status = solver.Solve(model, progress_callback)
+        else:
+            status = solver.Solve(model)
     
-    logger.info(f"Solver status: {solver.StatusName(status)}")
+    model_stats["solve_seconds"] = round(time.time() - solve_start, 3)
+    solve_info = describe_solve(solver, status, solver_params, config.get('deadline_ms'), progress_callback)
+    solve_info["budget"] = budget
+    if lexicographic is not None and status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        # 最后一层的目标值只是该层的罚分，改为报告全部罚分的总和；分层求解没有整体下界
+        solve_info.update(objective=solver.Value(penalty_objective(penalties)), best_bound=None, gap=None)
+    logger.info(f"Solver status: {solver.StatusName(status)} (模式 {solve_info['mode']}, "
+                f"停止原因 {solve_info['stop_reason']}, 间隙 {solve_info.get('gap')})")
+    cancelled = solve_info['stop_reason'] == 'cancelled'
 
     if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
         # === 统计模块 ===
@@ -1481,7 +2892,7 @@ def run_scheduler(config=None):
             for d in range(DAYS):
                 for p in range(PERIODS):
                     for subj in global_course_requirements:
-                        if solver.Value(schedule[(c, d, p, subj)]) == 1:
+                        if (c, d, p, subj) in schedule and solver.Value(schedule[(c, d, p, subj)]) == 1:
                             # 1. 统计老师课时
                             tid = CLASS_TEACHER_MAP.get((c, subj))
                             if tid is not None and tid in t_id_to_name:
@@ -1492,7 +2903,7 @@ def run_scheduler(config=None):
                             # 2. 存入结果字典
                             tid = CLASS_TEACHER_MAP.get((c, subj))
                             t_name = ""
-                            if tid: t_name = next((t['name'] for t in TEACHERS_DB if t['id'] == tid), "")
+                            if tid: t_name = t_id_to_name.get(tid, "")
                             formatted_schedule[(c, d, p)] = {
                                 "subject": subj,
                                 "teacher_name": t_name,
@@ -1505,6 +2916,11 @@ def run_scheduler(config=None):
             formatted_schedule, rules, class_metadata, TEACHERS_DB, CLASS_TEACHER_MAP, DAYS, PERIODS
         )
 
+        if incremental is not None:
+            # 相比基准课表被挪动的课时数 (包括落在新禁排时段、已没有对应变量的格子)
+            incremental["changed_cells"] = (warm_start["hint_cells"] - warm_start["matched"]) + \
+                sum(1 for key in base_keys if solver.Value(schedule[key]) == 0)
+
         # [新增] 调用评估函数
         evaluation = evaluate_quality(
             schedule, solver, CLASSES, DAYS, PERIODS, 
@@ -1512,7 +2928,7 @@ def run_scheduler(config=None):
         )
 
         return {
-            "status": "success",
+            "status": "cancelled" if cancelled else "success",  # [新增] 取消时返回取消前的最优课表
             "rule_report": rule_report,  # <--- 将报告返回给前端
             "sharding_info": sharding_report, # [新增] 向前端传递替换详情
             "stats": stats,
@@ -1528,10 +2944,31 @@ def run_scheduler(config=None):
             "courses": global_course_requirements,
             "vars_list": ALL_SUBJECTS_IN_VARS,
             "class_names": {c: class_metadata[c]['name'] for c in CLASSES}, # [新增] 返回包含年级前缀的完整班级名
-            "resources": config.get('resources', [])  # 使用配置中的resources
+            "resources": config.get('resources', []),  # 使用配置中的resources
+            "warm_start": warm_start,  # [新增] 热启动命中情况 (未使用基准课表时为 None)
+            "incremental": incremental,  # [新增] 增量重排的影响范围与各级邻域求解记录
+            "lazy_rules": lazy,  # [新增] 规则懒加载: 按需加入的规则与各轮求解记录 (未开启时为 None)
+            "lexicographic": lexicographic,  # [新增] 分层优化: 各优先级的目标值与求解记录 (未开启时为 None)
+            "symmetry": symmetry,  # [新增] 对称破缺涉及的班级组 (未开启时为 None)
+            "model_stats": model_stats,  # [新增] 模型规模与建模/求解耗时
+            "solve_info": solve_info  # [新增] 求解模式、目标值/下界/间隙 (截止时间到达时为当前最优解)
         }
     else:
         # === INFEASIBLE 诊断模块 ===
+        if cancelled:
+            return cancelled_result(model_stats, solve_info)
+        if status == cp_model.INFEASIBLE and pruned_vars:
+            # [新增] 缩减后的模型里被剪掉的变量不受规则开关控制，逐条剔除规则时无法还原其定义域；
+            # 关闭定义域缩减重建完整模型，让冲突诊断能定位到禁排类规则
+            # 诊断只需证明无解: 不再走增量/分层/懒加载，只用原预算剩余的时间，截止时间不变
+            logger.info("定义域缩减后无解，重建完整模型进行冲突诊断")
+            remaining = solver_params["max_time_in_seconds"] - (time.time() - solve_start)
+            diagnose_config = {k: v for k, v in config.items()
+                               if k not in ('incremental', 'lexicographic', 'lazy_rules', 'greedy_hints')}
+            diagnose_config.update(prune_domains=False, mode='feasible_first', run_started_at=run_start,
+                                   max_time_in_seconds=max(1.0, remaining))
+            return run_scheduler(diagnose_config, progress=progress, cancel=cancel)
+
         suggestions = ["尝试减少课时需求", "检查是否有老师课时超限", "移除部分固定课程"]
         error_msg = "无法找到满足所有硬性约束的课表 (INFEASIBLE)"
         
@@ -1548,6 +2985,7 @@ def run_scheduler(config=None):
                 算法：对于每个疑似冲突规则，测试移除它后是否仍然无解。
                      如果仍无解，说明该规则不是必要的，可以剔除。
                      如果变为有解，说明该规则是冲突的必要成员。
+                [修改] 返回最小冲突集中的开关变量 (由调用方转换为规则名称)
                 """
                 # 将 indices 转换为对应的 assumption 变量
                 idx_to_var = {var.Index(): var for var in all_assumptions}
@@ -1555,7 +2993,7 @@ def run_scheduler(config=None):
                 
                 if len(conflict_vars) <= 2:
                     # 已经足够小，无需进一步精简
-                    return [rule_mapping.get(v.Index(), f"未知规则({v.Index()})") for v in conflict_vars]
+                    return conflict_vars
                 
                 logger.info(f"DEBUG: 开始精简冲突集，初始大小: {len(conflict_vars)}")
                 
@@ -1596,7 +3034,7 @@ def run_scheduler(config=None):
                 model.ClearAssumptions()
                 model.AddAssumptions(all_assumptions)
                 
-                return [rule_mapping.get(v.Index(), f"未知规则({v.Index()})") for v in minimal_set]
+                return minimal_set
             
             # 先获取初步冲突规则
             initial_conflict_rules = [rule_mapping[i] for i in conflict_indices if i in rule_mapping]
@@ -1611,14 +3049,24 @@ def run_scheduler(config=None):
                 if status_diag == cp_model.INFEASIBLE:
                     conflict_indices = solver_diag.SufficientAssumptionsForInfeasibility()
                     initial_conflict_rules = [rule_mapping[i] for i in conflict_indices if i in rule_mapping]
-            
+
             # 执行精确定位
-            if len(conflict_indices) > 2:
+            # [修改] 分两轮: 先在分组开关 (整班固定课程/整位老师禁排) 层面精简，
+            # 再只把留在冲突集中的分组细化为逐格开关，在组内继续精简
+            idx_to_var = {var.Index(): var for var in assumption_literals}
+            conflict_vars = [idx_to_var[i] for i in conflict_indices if i in idx_to_var]
+            if len(conflict_vars) > 2:
                 logger.info("DEBUG: 执行最小冲突子集算法...")
-                conflict_rules = find_minimal_conflict_set(model, assumption_literals, conflict_indices, rule_mapping)
-                logger.info(f"DEBUG: 精简后冲突集大小: {len(conflict_rules)}")
-            else:
-                conflict_rules = initial_conflict_rules
+                conflict_vars = find_minimal_conflict_set(model, assumption_literals, conflict_indices, rule_mapping)
+            refined = refine_assumption_groups(model, [v.Index() for v in conflict_vars], assumption_groups, rule_mapping)
+            if refined:
+                candidates = [v for v in conflict_vars if v.Index() not in assumption_groups] + refined
+                conflict_vars = find_minimal_conflict_set(model, assumption_literals + refined,
+                                                          [v.Index() for v in candidates], rule_mapping)
+                model.ClearAssumptions()
+                model.AddAssumptions(assumption_literals)
+            conflict_rules = [rule_mapping.get(v.Index(), f"未知规则({v.Index()})") for v in conflict_vars]
+            logger.info(f"DEBUG: 精简后冲突集大小: {len(conflict_rules)}")
             
             if conflict_rules:
                 error_msg = f"排课失败: 检测到 {len(conflict_rules)} 个规则导致核心冲突"
@@ -1633,5 +3081,39 @@ def run_scheduler(config=None):
             "status": "error",
             "error_type": "infeasible", 
             "message": error_msg,
-            "suggestions": suggestions
-        }
\ No newline at end of file
+            "suggestions": suggestions,
+            "solver_status": solver.StatusName(status),  # [新增] INFEASIBLE (已证明无解) 或 UNKNOWN (超时未定)
+            "model_stats": model_stats,
+            "solve_info": solve_info
+        }
+
+# 求解器内部对象：不可序列化且占用大量内存，跨进程返回或长期保存前必须剥离
+SOLVER_OBJECT_KEYS = ("solver", "vars")
+
+def to_plain_result(result):
+    """
+    将 run_scheduler 的返回值转换为纯数据字典 (可 pickle，可长期存放在会话中)
+    保留 schedule / stats / rule_report / evaluation 等结果，去掉 CpSolver 与变量对象
+    """
+    return {k: v for k, v in result.items() if k not in SOLVER_OBJECT_KEYS}
+
+
+def pack_result(result):
+    """
+    将纯数据结果转换为可 JSON 序列化的结构 (元组键 -> 列表)，用于写入 SQLite
+    schedule: {(c, d, p): info} -> [[c, d, p, info], ...]
+    class_teacher_map: {(c, subj): tid} -> [[c, subj, tid], ...]
+    """
+    packed = to_plain_result(result)
+    packed["schedule"] = [[c, d, p, info] for (c, d, p), info in result.get("schedule", {}).items()]
+    packed["class_teacher_map"] = [[c, s, tid] for (c, s), tid in result.get("class_teacher_map", {}).items()]
+    packed["class_names"] = [[c, name] for c, name in result.get("class_names", {}).items()]
+    return packed
+
+def unpack_result(packed):
+    """pack_result 的逆过程"""
+    result = dict(packed)
+    result["schedule"] = {(c, d, p): info for c, d, p, info in packed.get("schedule", [])}
+    result["class_teacher_map"] = {(c, s): tid for c, s, tid in packed.get("class_teacher_map", [])}
+    result["class_names"] = {c: name for c, name in packed.get("class_names", [])}
+    return result
@@ -0,0 +1,162 @@
+"""
+组合求解 (Portfolio) 模块
+同一份配置同时启动 K 个独立的求解进程，各自使用不同的随机种子和搜索参数，
+共享一份 CPU 预算。任一成员证明最优 (或证明无解) 后立即终止其余成员，
+否则等全部成员在各自的时间上限内结束，取目标值最优的课表。
+带硬规则开关 (assumptions) 的模型在 CP-SAT 内部只能单线程搜索，多进程组合是利用多核的主要方式。
+"""
+import time
+import queue
+import logging
+
+from solver_pool import _get_mp_context, CANCEL_GRACE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# 成员的搜索参数，按顺序循环使用 (种子各不相同)
+PORTFOLIO_VARIANTS = [
+    {},
+    {"search_branching": "PORTFOLIO_WITH_QUICK_RESTART_SEARCH"},
+    {"linearization_level": 2},
+    {"search_branching": "FIXED_SEARCH"},
+    {"linearization_level": 0},
+    {"search_branching": "PSEUDO_COST_SEARCH"},
+]
+
+# 子进程在时间上限之外额外允许的时间 (建模、无解诊断、结果回传)
+MEMBER_GRACE_SECONDS = 60
+
+
+def _member_worker(index, config, result_queue, cancel_event=None):
+    """组合成员: 在独立进程中求解，结果 (纯数据) 通过队列交回"""
+    import normal
+    progress = (lambda event: result_queue.put(("progress", index, event))) if index == 0 else None
+    try:
+        result = normal.to_plain_result(normal.run_scheduler(config, progress=progress, cancel=cancel_event))
+    except Exception as e:
+        result = {"status": "error", "error_type": "system_error", "message": f"组合成员异常: {e}", "suggestions": []}
+    result_queue.put(("result", index, result))
+
+
+def build_members(config, size, cpu_budget=None):
+    """生成 size 个成员的配置: 不同的随机种子与搜索参数，CPU 预算平均分配"""
+    import normal
+    cpu_budget = cpu_budget or normal.available_cpus()
+    workers = max(1, cpu_budget // size)
+    base_seed = int(config.get('random_seed', 0))
+    members = []
+    for i in range(size):
+        variant = PORTFOLIO_VARIANTS[i % len(PORTFOLIO_VARIANTS)]
+        member = {k: v for k, v in config.items() if k != 'portfolio'}
+        member.update(
+            random_seed=base_seed + i,
+            solver_overrides=dict(config.get('solver_overrides') or {}, **variant),
+            num_search_workers=workers
+        )
+        members.append(member)
+    return members
+
+
+def _is_proven(result):
+    """已证明最优或证明无解: 其他成员不可能给出更好的结论"""
+    solver_status = (result.get('solve_info') or {}).get('solver_status')
+    return solver_status == 'OPTIMAL' or (result['status'] != 'success' and solver_status == 'INFEASIBLE')
+
+
+def _member_stats(index, member, result, elapsed, cancelled=False):
+    solve_info = (result or {}).get('solve_info') or {}
+    return {
+        "member": index,
+        "random_seed": member['random_seed'],
+        "overrides": member['solver_overrides'],
+        "num_search_workers": member['num_search_workers'],
+        "status": "cancelled" if cancelled else result['status'],
+        "solver_status": solve_info.get('solver_status'),
+        "stop_reason": solve_info.get('stop_reason'),
+        "objective": solve_info.get('objective'),
+        "gap": solve_info.get('gap'),
+        "elapsed": round(elapsed, 2)
+    }
+
+
+def solve_portfolio(config, size=None, progress=None, cpu_budget=None, cancel=None):
+    """
+    组合求解入口，返回与 run_scheduler 相同结构的纯数据结果 (附加 portfolio 报告)
+    size: 成员数 (默认取 config['portfolio'])；progress 只转发第一个成员的进度事件
+    cancel: 可选的 threading.Event，置位后各成员停止搜索，在宽限期内收集它们的当前最优解
+    """
+    import normal
+    size = max(1, int(size or config.get('portfolio') or 1))
+    members = build_members(config, size, cpu_budget)
+    time_limit = normal.get_solver_params(members[0])["max_time_in_seconds"] or normal.BUDGET_MAX_SECONDS
+
+    ctx = _get_mp_context()
+    result_queue = ctx.Queue()
+    stop_event = ctx.Event()
+    processes = []
+    for i, member in enumerate(members):
+        proc = ctx.Process(target=_member_worker, args=(i, member, result_queue, stop_event), daemon=True,
+                           name=f"portfolio-{i}")
+        proc.start()
+        processes.append(proc)
+    logger.info(f"组合求解: {size} 个成员，每个 {members[0]['num_search_workers']} 个搜索线程，时间上限 {time_limit}s")
+
+    start = time.time()
+    results, finished_at = {}, {}
+    winner = None
+    give_up_at = start + time_limit + MEMBER_GRACE_SECONDS
+    try:
+        while len(results) < size and time.time() < give_up_at:
+            if cancel is not None and cancel.is_set() and not stop_event.is_set():
+                logger.info("组合求解已取消，等待各成员交回当前最优解")
+                stop_event.set()
+                give_up_at = min(give_up_at, time.time() + CANCEL_GRACE_SECONDS)
+            try:
+                kind, index, payload = result_queue.get(timeout=0.5)
+            except queue.Empty:
+                if all(not p.is_alive() for i, p in enumerate(processes) if i not in results):
+                    break  # 剩余成员已异常退出
+                continue
+            if kind == "progress":
+                if progress:
+                    progress(dict(payload, member=index))
+                continue
+            results[index] = payload
+            finished_at[index] = time.time() - start
+            if _is_proven(payload):
+                winner = index
+                logger.info(f"组合求解: 成员 {index} 已证明 {payload['solve_info']['solver_status']}，终止其余成员")
+                break
+    finally:
+        for proc in processes:
+            if proc.is_alive():
+                proc.terminate()
+        for proc in processes:
+            proc.join(timeout=5)
+
+    if winner is None:
+        solved = [i for i, r in results.items() if r['status'] == 'success' or r.get('schedule')]
+        if solved:
+            winner = min(solved, key=lambda i: results[i].get('solve_info', {}).get('objective', float('inf')))
+        elif results:
+            winner = min(results)
+
+    stats = [
+        _member_stats(i, members[i], results.get(i), finished_at.get(i, time.time() - start), cancelled=i not in results)
+        for i in range(size)
+    ]
+    if winner is None and stop_event.is_set():
+        return dict(normal.cancelled_result(), portfolio={"winner": None, "members": stats})
+    if winner is None:
+        return {
+            "status": "error",
+            "error_type": "worker_crashed",
+            "message": "组合求解的所有成员均未返回结果",
+            "suggestions": ["减少组合成员数后重试", "检查服务器内存是否充足"],
+            "portfolio": {"winner": None, "members": stats}
+        }
+    result = results[winner]
+    if stop_event.is_set() and result['status'] == 'success':
+        result['status'] = 'cancelled'  # 取消时各成员交回的是当前最优解
+    result['portfolio'] = {"winner": winner, "members": stats}
+    return result
@@ -0,0 +1,280 @@
+"""
+求解进程池模块
+在独立的工作进程中建模并运行 CP-SAT，Web 进程只拿回纯数据结果：
+- 求解崩溃或内存暴涨不会拖垮 Flask 进程
+- 工作进程预先导入 ortools，省去每次求解的导入开销
+- 每个进程池累计处理 N 个任务后整体回收，限制内存增长
+- 可取消的求解在独立进程中运行，取消超时只终止该进程，不影响进程池中的其他求解
+"""
+import os
+import time
+import queue
+import atexit
+import threading
+import logging
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor, wait as wait_futures
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger(__name__)
+
+# 取消后等待子进程交回当前最优解的宽限期 (秒)，超过后强制终止进程
+CANCEL_GRACE_SECONDS = 15.0
+
+
+def _warm_worker():
+    """工作进程初始化：预先导入求解依赖"""
+    import ortools.sat.python.cp_model  # noqa: F401
+    import normal  # noqa: F401
+
+
+def _ping():
+    return os.getpid()
+
+
+def _solve_worker(config, progress_queue=None, cancel_event=None):
+    """
+    在工作进程中执行完整排课，只返回可 pickle 的纯数据
+    progress_queue: 可选的跨进程队列，求解进度事件会写入其中
+    cancel_event: 可选的跨进程取消事件 (Manager().Event())
+    """
+    import normal
+    progress = progress_queue.put if progress_queue is not None else None
+    result = normal.run_scheduler(config, progress=progress, cancel=cancel_event)
+    return normal.to_plain_result(result)
+
+
+def _dedicated_worker(config, result_conn, progress_queue=None, cancel_event=None):
+    """[新增] 独立求解进程的入口: 通过管道交回结果，子进程异常以 ("error", 描述) 交回"""
+    try:
+        result_conn.send(("ok", _solve_worker(config, progress_queue, cancel_event)))
+    except Exception as e:
+        result_conn.send(("error", repr(e)))
+    finally:
+        result_conn.close()
+
+
+def _collect_result(proc, result_conn, future):
+    """[新增] 在后台线程中接收独立求解进程的结果并填入 future"""
+    try:
+        kind, payload = result_conn.recv()
+    except (EOFError, OSError):
+        # 进程在交回结果前退出 (被终止或崩溃)
+        future.set_exception(BrokenProcessPool("求解进程异常退出"))
+    else:
+        if kind == "ok":
+            future.set_result(payload)
+        else:
+            future.set_exception(RuntimeError(payload))
+    finally:
+        result_conn.close()
+        proc.join()
+
+
+def _drain_progress(future, progress_queue, progress):
+    """在等待子进程结果的同时，把进度事件转发给 progress 回调"""
+    while True:
+        try:
+            progress(progress_queue.get(timeout=0.5))
+        except queue.Empty:
+            if future.done():
+                break
+        except (EOFError, OSError):
+            break
+    # 子进程结束后再取一次，避免丢掉最后的事件
+    while True:
+        try:
+            progress(progress_queue.get_nowait())
+        except (queue.Empty, EOFError, OSError):
+            break
+
+
+def _wait_cancellable(future, cancel, remote_cancel, progress_queue=None, progress=None,
+                      grace=CANCEL_GRACE_SECONDS):
+    """
+    等待子进程结果 (同时转发进度)；cancel 置位后通知子进程停止搜索
+    子进程在宽限期内交回结果返回 True，否则返回 False (由调用方强制终止)
+    """
+    cancelled_at = None
+    while not future.done():
+        if cancelled_at is None and cancel.is_set():
+            remote_cancel.set()
+            cancelled_at = time.time()
+        if cancelled_at is not None and time.time() - cancelled_at > grace:
+            return future.done()
+        if progress_queue is None:
+            wait_futures([future], timeout=0.5)
+            continue
+        try:
+            progress(progress_queue.get(timeout=0.5))
+        except queue.Empty:
+            pass
+        except (EOFError, OSError):
+            progress_queue = None
+    if progress_queue is not None:
+        _drain_progress(future, progress_queue, progress)
+    return True
+
+
+def _get_mp_context():
+    # Web 进程是多线程的，fork 可能继承锁状态导致死锁，优先使用 forkserver
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+class SolverProcessPool:
+    """
+    预热的求解进程池
+    max_workers: 同时运行的求解进程数
+    max_jobs_per_worker: 平均每个进程处理多少个任务后回收整个进程池
+    """
+    def __init__(self, max_workers=2, max_jobs_per_worker=5):
+        self.max_workers = max(1, max_workers)
+        self.max_jobs_per_worker = max(1, max_jobs_per_worker)
+        self._executor = None
+        self._jobs_on_executor = 0
+        self._manager = None  # 跨进程进度队列的管理进程 (首次订阅进度时创建)
+        self._lock = threading.Lock()
+
+    def _create_executor(self):
+        executor = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=_get_mp_context(),
+            initializer=_warm_worker
+        )
+        # 预热：提前拉起全部工作进程并完成 ortools 导入
+        for _ in range(self.max_workers):
+            executor.submit(_ping)
+        logger.info(f"求解进程池已启动 (进程数: {self.max_workers})")
+        return executor
+
+    def _acquire_executor(self):
+        with self._lock:
+            if self._executor is None or self._jobs_on_executor >= self.max_workers * self.max_jobs_per_worker:
+                if self._executor is not None:
+                    # 旧进程池在当前任务完成后自然退出，新任务进入新进程池
+                    logger.info(f"求解进程池已处理 {self._jobs_on_executor} 个任务，回收并重建")
+                    self._executor.shutdown(wait=False)
+                self._executor = self._create_executor()
+                self._jobs_on_executor = 0
+            self._jobs_on_executor += 1
+            return self._executor
+
+    def _discard_executor(self, executor):
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+
+    def warm_up(self):
+        """主动预热 (服务启动时调用，可选)"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = self._create_executor()
+                self._jobs_on_executor = 0
+
+    def _get_manager(self):
+        with self._lock:
+            if self._manager is None:
+                self._manager = _get_mp_context().Manager()
+            return self._manager
+
+    def _progress_queue(self):
+        return self._get_manager().Queue()
+
+    def _start_dedicated(self, config, progress_queue, remote_cancel):
+        """
+        [新增] 在独立进程中启动一次可取消的求解，返回 (进程, future)
+        取消超时时只需终止这一个进程 (终止进程池的工作进程会使整个进程池失效)
+        """
+        ctx = _get_mp_context()
+        parent_conn, child_conn = ctx.Pipe(duplex=False)
+        proc = ctx.Process(target=_dedicated_worker, args=(config, child_conn, progress_queue, remote_cancel),
+                           daemon=True)
+        proc.start()
+        child_conn.close()
+        future = Future()
+        threading.Thread(target=_collect_result, args=(proc, parent_conn, future), daemon=True).start()
+        return proc, future
+
+    def solve(self, config, progress=None, cancel=None):
+        """
+        在工作进程中求解，返回 run_scheduler 的纯数据结果
+        progress: 可选回调，在当前线程中接收子进程推送的求解进度事件
+        cancel: 可选的 threading.Event，置位后子进程停止搜索并返回当前最优解 (status="cancelled")；
+                [修改] 传入 cancel 时在独立进程中求解，宽限期内未返回时只终止该进程
+        """
+        if cancel is not None:
+            return self._solve_cancellable(config, progress, cancel)
+        executor = self._acquire_executor()
+        try:
+            if progress is None:
+                return executor.submit(_solve_worker, config).result()
+            progress_queue = self._progress_queue()
+            future = executor.submit(_solve_worker, config, progress_queue)
+            _drain_progress(future, progress_queue, progress)
+            return future.result()
+        except BrokenProcessPool as e:
+            logger.error(f"求解进程异常退出: {e}")
+            self._discard_executor(executor)
+            return _worker_crashed_result()
+
+    def _solve_cancellable(self, config, progress, cancel):
+        """[新增] 可取消的求解: 在独立进程中运行，取消后宽限期内未退出则只终止该进程"""
+        progress_queue = self._progress_queue() if progress is not None else None
+        remote_cancel = self._get_manager().Event()
+        proc, future = self._start_dedicated(config, progress_queue, remote_cancel)
+        try:
+            if not _wait_cancellable(future, cancel, remote_cancel, progress_queue, progress):
+                logger.warning(f"求解取消后 {CANCEL_GRACE_SECONDS:.0f}s 内未退出，终止求解进程 (pid={proc.pid})")
+                proc.terminate()
+                import normal
+                return normal.cancelled_result()
+            return future.result()
+        except BrokenProcessPool as e:
+            logger.error(f"求解进程异常退出: {e}")
+            return _worker_crashed_result()
+
+    def shutdown(self, wait=False):
+        with self._lock:
+            executor, self._executor = self._executor, None
+            manager, self._manager = self._manager, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+        if manager is not None:
+            manager.shutdown()
+
+
+def _worker_crashed_result():
+    return {
+        "status": "error",
+        "error_type": "worker_crashed",
+        "message": "求解进程异常退出（可能是内存不足或求解器崩溃），请稍后重试",
+        "suggestions": ["减少班级数或规则数量后重试", "检查服务器内存是否充足"]
+    }
+
+
+class InlineSolver:
+    """不使用子进程的求解器 (SCHEDULE_SOLVER_PROCESSES=0 时使用，便于调试)"""
+    def solve(self, config, progress=None, cancel=None):
+        import normal
+        return normal.to_plain_result(normal.run_scheduler(config, progress=progress, cancel=cancel))
+
+    def warm_up(self):
+        pass
+
+    def shutdown(self, wait=False):
+        pass
+
+
+def create_solver_pool():
+    """根据环境变量创建求解器：SCHEDULE_SOLVER_PROCESSES=0 表示在 Web 进程内求解"""
+    num_processes = int(os.getenv("SCHEDULE_SOLVER_PROCESSES", "2"))
+    if num_processes <= 0:
+        return InlineSolver()
+    pool = SolverProcessPool(
+        max_workers=num_processes,
+        max_jobs_per_worker=int(os.getenv("SCHEDULE_WORKER_MAX_JOBS", "5"))
+    )
+    atexit.register(pool.shutdown)
+    return pool
@@ -60,6 +60,9 @@ class SubstitutionSystem:
         # 仅在有 solver 时解析原始课表变量
         if self.solver:
             self._parse_original_schedule()
+        elif solver_result.get('schedule'):
+            # [新增] 子进程求解只返回纯数据，直接从格式化课表重建
+            self._load_formatted_schedule(solver_result['schedule'])
 
     def _parse_original_schedule(self):
         for c in self.classes:
@@ -93,6 +96,31 @@ class SubstitutionSystem:
                             self.teacher_busy.add((tid, d, p))
                             break
 
+    def _load_formatted_schedule(self, formatted_schedule):
+        """从 run_scheduler 返回的 schedule {(c, d, p): {subject, teacher_name, teacher_id}} 重建课表"""
+        for (c, d, p), info in formatted_schedule.items():
+            subj = info['subject']
+            tid = info.get('teacher_id')
+            course_config = self.courses.get(subj, {})
+            if isinstance(course_config, dict):
+                course_type = course_config.get("type", "minor")
+            else:
+                course_type = "main" if course_config >= 5 else "minor"
+
+            entry = {
+                "subject": subj,
+                "teacher_id": tid,
+                "teacher_name": info.get('teacher_name') or self.id_to_name.get(tid, "Unknown"),
+                "is_sub": False,
+                "course_type": course_type
+            }
+            if subj in self.subj_room_map:
+                entry['room'] = self.subj_room_map[subj]
+
+            self.final_schedule[(c, d, p)] = entry
+            if tid:
+                self.teacher_busy.add((tid, d, p))
+
     def process_leaves(self, leave_requests):
         """
         处理请假请求 (支持精确节次)
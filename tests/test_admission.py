@@ -0,0 +1,88 @@
+import unittest
+import sys
+import os
+import json
+import threading
+import time
+
+# Ensure we can import modules from the parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from admission import CpuAdmission, AdmissionTimeout
+
+
+class TestCpuAdmission(unittest.TestCase):
+    def test_full_then_reduced_grant(self):
+        admission = CpuAdmission(8)
+        first = admission.acquire("a", 6)
+        second = admission.acquire("b", 6)
+        self.assertEqual(first.workers, 6)
+        self.assertEqual(second.workers, 2)  # 只剩 2 核: 少分而不是排队
+        stats = admission.stats()
+        self.assertEqual(stats["cores_in_use"], 8)
+        self.assertEqual(stats["per_user"]["b"]["workers"], 2)
+        admission.release(first)
+        admission.release(second)
+        self.assertEqual(admission.stats()["cores_in_use"], 0)
+
+    def test_queue_timeout(self):
+        admission = CpuAdmission(2)
+        held = admission.acquire("a", 2)
+        with self.assertRaises(AdmissionTimeout):
+            admission.acquire("b", 1, timeout=0.2)
+        self.assertEqual(admission.stats()["queue_length"], 0)
+        admission.release(held)
+
+    def test_fairness_across_users(self):
+        admission = CpuAdmission(2)
+        held_a = admission.acquire("a", 1)
+        held_c = admission.acquire("c", 1)
+        order = []
+        positions = []
+
+        def request(user):
+            with admission.admit(user, 1, on_wait=positions.append):
+                order.append(user)
+                time.sleep(0.05)
+
+        # 用户 a 先排队，用户 b 后到；空出 1 核时 a 已有求解在运行，所以 b 先获得分配
+        waiter_a = threading.Thread(target=request, args=("a",))
+        waiter_a.start()
+        while admission.stats()["queue_length"] < 1:
+            time.sleep(0.01)
+        waiter_b = threading.Thread(target=request, args=("b",))
+        waiter_b.start()
+        while admission.stats()["queue_length"] < 2:
+            time.sleep(0.01)
+        self.assertEqual(admission.stats()["per_user"]["a"], {"running": 1, "workers": 1, "waiting": 1})
+
+        admission.release(held_c)
+        waiter_b.join(5)
+        self.assertTrue(waiter_a.is_alive())
+        admission.release(held_a)
+        waiter_a.join(5)
+        self.assertEqual(order, ["b", "a"])
+        self.assertEqual(sorted(positions), [1, 2])
+        self.assertGreater(admission.stats()["max_wait_seconds"], 0)
+
+    def test_fair_share_caps_new_grants(self):
+        admission = CpuAdmission(8)
+        held = admission.acquire("a", 2)
+        grant = admission.acquire("b", 8)
+        self.assertEqual(grant.workers, 4)  # 两位活跃用户平分 8 核
+        admission.release(held)
+        admission.release(grant)
+
+
+class TestSolverStatusEndpoint(unittest.TestCase):
+    def test_status_endpoint(self):
+        import app as app_module
+        response = app_module.app.test_client().get('/api/solver/status')
+        data = json.loads(response.data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data["admission"]["total_cores"], app_module.SOLVER_ADMISSION.total_cores)
+        self.assertIn("queue_length", data["admission"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+import time
+
+# Ensure we can import modules from the parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import normal
+import solver_pool
+from database import ScheduleDatabase
+
+
+CONFIG = {
+    "num_classes": 4,
+    "courses": {
+        "语文": {"count": 5, "type": "main"},
+        "数学": {"count": 5, "type": "main"},
+        "音乐": {"count": 2, "type": "minor"}
+    },
+    "teacher_names": {"语文": ["张三", "王五"], "数学": ["李四", "赵六"], "音乐": ["孙七"]},
+    "use_legacy_rules": False
+}
+
+
+class TestSolveModes(unittest.TestCase):
+    def test_mode_parameters(self):
+        self.assertEqual(normal.get_solver_params(dict(CONFIG, deadline_ms=1500))['max_time_in_seconds'], 1.5)
+        self.assertTrue(normal.get_solver_params(dict(CONFIG, mode='feasible_first'))['stop_after_first_solution'])
+        self.assertEqual(normal.get_solver_params(dict(CONFIG, mode='balanced'))['relative_gap_limit'],
+                         normal.BALANCED_RELATIVE_GAP)
+        self.assertEqual(normal.get_solver_params(dict(CONFIG, mode='unknown'))['mode'], 'optimal')
+
+    def test_result_reports_gap(self):
+        result = normal.run_scheduler(dict(CONFIG, mode='feasible_first', deadline_ms=5000))
+        self.assertEqual(result['status'], 'success')
+        info = result['solve_info']
+        self.assertEqual((info['mode'], info['deadline_ms']), ('feasible_first', 5000))
+        self.assertIn(info['solver_status'], ('FEASIBLE', 'OPTIMAL'))
+        self.assertGreaterEqual(info['gap'], 0)
+
+
+class TestStopRules(unittest.TestCase):
+    def test_default_and_disabled_rules(self):
+        self.assertEqual(normal.get_solver_params(CONFIG)['stop_rules'], normal.DEFAULT_STOP_RULES)
+        self.assertEqual(normal.get_solver_params(dict(CONFIG, stop_rules={}))['stop_rules'], {})
+
+    def test_penalty_threshold_stops_search(self):
+        result = normal.run_scheduler(dict(CONFIG, stop_rules={"absolute_penalty": 10 ** 6}))
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(result['solve_info']['stop_reason'], 'penalty_reached')
+
+    def test_natural_stop_reasons(self):
+        result = normal.run_scheduler(dict(CONFIG, stop_rules={}))
+        self.assertEqual(result['solve_info']['stop_reason'], 'optimal')
+        result = normal.run_scheduler(dict(CONFIG, mode='feasible_first'))
+        self.assertIn(result['solve_info']['stop_reason'], ('first_solution', 'optimal'))
+
+    def test_watchdog_stops_stalled_search(self):
+        class FakeSolver:
+            stopped = False
+
+            def StopSearch(self):
+                self.stopped = True
+
+        callback = normal.EarlyStopCallback({}, {}, {}, stop_rules={"no_improvement_seconds": 1})
+        callback._last_improvement = time.time() - 5
+        solver = FakeSolver()
+        with callback.watch(solver):
+            time.sleep(1.0)
+        self.assertTrue(solver.stopped)
+        self.assertEqual(callback.stop_reason, 'stalled')
+
+
+class DeadlineLimitedSolver:
+    """第一次求解伪装成截止时间到达时的未最优结果，之后正常求解"""
+    def __init__(self):
+        self.inline = solver_pool.InlineSolver()
+        self.calls = []
+
+    def solve(self, config, progress=None, cancel=None):
+        self.calls.append(config)
+        result = self.inline.solve(config, progress, cancel)
+        if len(self.calls) == 1:
+            result['solve_info'] = dict(result['solve_info'], solver_status='FEASIBLE', stop_reason='deadline',
+                                        objective=result['solve_info']['objective'] + 100)
+        return result
+
+
+class TestBackgroundRefine(unittest.TestCase):
+    def setUp(self):
+        import app as app_module
+        self.app_module = app_module
+        self.original = (app_module.storage, app_module.SOLVE_JOBS.store, app_module.SOLVER_POOL)
+        tmpdir = tempfile.mkdtemp()
+        app_module.storage = ScheduleDatabase(db_path=os.path.join(tmpdir, "anytime.db"), json_dir=tmpdir)
+        app_module.SOLVE_JOBS.store = app_module.storage
+        app_module.SOLVER_POOL = DeadlineLimitedSolver()
+        self.client = app_module.app.test_client()
+
+    def tearDown(self):
+        self.app_module.storage, self.app_module.SOLVE_JOBS.store, self.app_module.SOLVER_POOL = self.original
+
+    def post(self, payload):
+        response = self.client.post('/api/init', data=json.dumps(payload), content_type='application/json')
+        return response.status_code, json.loads(response.data)
+
+    def test_invalid_mode_rejected(self):
+        status, data = self.post(dict(CONFIG, mode='fastest'))
+        self.assertEqual(status, 400)
+        self.assertEqual(data['error_type'], 'invalid_mode')
+
+    def test_refine_replaces_session_schedule(self):
+        status, data = self.post(dict(CONFIG, mode='optimal', deadline_ms=5000))
+        self.assertEqual(status, 200)
+        self.assertIsNotNone(data['refine_job_id'])
+
+        job = self.app_module.SOLVE_JOBS.wait(data['refine_job_id'], timeout=60)
+        self.assertTrue(job['result']['refined'])
+        self.assertEqual(job['result']['schedule_id'], data['schedule_id'])
+
+        refine_config = self.app_module.SOLVER_POOL.calls[1]
+        self.assertNotIn('deadline_ms', refine_config)
+        self.assertTrue(refine_config['hint_cells'])
+        session = self.app_module.SCHEDULE_SESSIONS[data['schedule_id']]
+        self.assertEqual(session['result']['solve_info']['objective'], job['result']['objective_after'])
+
+    def test_no_refine_when_optimal(self):
+        self.app_module.SOLVER_POOL.calls.append({})  # 跳过伪装，直接得到最优结果
+        status, data = self.post(dict(CONFIG, mode='optimal', deadline_ms=5000))
+        self.assertEqual(status, 200)
+        self.assertIsNone(data['refine_job_id'])
+
+
+if __name__ == '__main__':
+    unittest.main()
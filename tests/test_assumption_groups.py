@@ -0,0 +1,61 @@
+import unittest
+import sys
+import os
+
+# Ensure we can import modules from the parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ortools.sat.python import cp_model
+import normal
+from test_greedy import CONFIG
+
+# 孙七周一全天、周二上午禁排；1 班两节固定课程、2 班两节固定课程
+CONSTRAINTS = {
+    "teacher_unavailable": {"孙七": [[0, p] for p in range(8)] + [[1, p] for p in range(4)]},
+    "fixed_courses": {"1": {"2_5": "音乐", "3_0": "语文"}, "2": {"3_1": "语文", "3_2": "数学"}}
+}
+
+
+class TestAssumptionGroups(unittest.TestCase):
+    def test_one_literal_per_teacher_and_class(self):
+        result = normal.run_scheduler(dict(CONFIG, constraints=CONSTRAINTS, max_time_in_seconds=20))
+        self.assertEqual(result['status'], 'success')
+        # 两条用户规则 + 孙七 1 个 + 两个班级各 1 个 (原为 12 + 4 个逐格开关)
+        self.assertEqual(result['model_stats']['assumptions'], 2 + 1 + 2)
+        self.assertEqual(result['schedule'][(1, 2, 5)]['subject'], '音乐')
+        self.assertEqual(result['schedule'][(2, 3, 2)]['subject'], '数学')
+
+    def test_refine_only_flagged_group(self):
+        model = cp_model.CpModel()
+        xs = [model.NewBoolVar(f'x{i}') for i in range(3)]
+        assumptions, mapping, groups = [], {}, {}
+        normal.add_assumption_group(model, 'g', '组', [(f'格{i}', x, 1) for i, x in enumerate(xs)],
+                                    assumptions, mapping, groups)
+        normal.add_assumption_group(model, 'single', '单格', [('单格', xs[0], 0)], assumptions, mapping, groups)
+        self.assertEqual(list(groups), [assumptions[0].Index()])
+        self.assertEqual(mapping[assumptions[1].Index()], '单格')
+
+        refined = normal.refine_assumption_groups(model, [lit.Index() for lit in assumptions], groups, mapping)
+        self.assertEqual(sorted(mapping[lit.Index()] for lit in refined), ['格0', '格1', '格2'])
+        self.assertEqual(normal.refine_assumption_groups(model, [assumptions[1].Index()], groups, mapping), [])
+
+        # 逐格开关替代分组开关作为假设
+        model.AddAssumptions(assumptions[1:] + refined)
+        solver = cp_model.CpSolver()
+        self.assertEqual(solver.Solve(model), cp_model.INFEASIBLE)
+        core = {mapping[i] for i in solver.SufficientAssumptionsForInfeasibility()}
+        self.assertEqual(core, {'格0', '单格'})
+
+    def test_diagnosis_names_single_slot(self):
+        fixed = {"1": {"2_5": "音乐", "1_2": "音乐"}, "2": CONSTRAINTS['fixed_courses']['2']}
+        config = dict(CONFIG, constraints=dict(CONSTRAINTS, fixed_courses=fixed), max_time_in_seconds=20)
+        result = normal.run_scheduler(config)
+        self.assertEqual(result['error_type'], 'infeasible')
+        core = result['suggestions'][0]
+        self.assertIn('【老师禁排】孙七_周2第3节', core)
+        self.assertIn('【系统预排】1班_音乐_固定(1,2)', core)
+        self.assertNotIn('个时段', core)
+
+
+if __name__ == '__main__':
+    unittest.main()
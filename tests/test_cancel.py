@@ -0,0 +1,142 @@
+import unittest
+import sys
+import os
+import threading
+import time
+
+# Ensure we can import modules from the parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import normal
+import job_queue
+
+
+CONFIG = {
+    "num_classes": 2,
+    "courses": {
+        "语文": {"count": 6, "type": "main"},
+        "数学": {"count": 6, "type": "main"},
+        "音乐": {"count": 2, "type": "minor"}
+    },
+    "teacher_names": {"音乐": ["孙七"]},
+    "use_legacy_rules": False
+}
+
+
+class TestCancelSolve(unittest.TestCase):
+    def test_cancel_before_search(self):
+        cancel = threading.Event()
+        cancel.set()
+        result = normal.run_scheduler(CONFIG, cancel=cancel)
+        self.assertEqual(result['status'], 'cancelled')
+        self.assertNotIn('schedule', result)
+
+    def test_cancel_returns_best_solution(self):
+        cancel = threading.Event()
+
+        def progress(event):
+            if event['type'] == 'solution':
+                cancel.set()  # 拿到第一个可行解后取消
+
+        result = normal.run_scheduler(CONFIG, progress=progress, cancel=cancel)
+        self.assertEqual(result['status'], 'cancelled')
+        self.assertEqual(result['solve_info']['stop_reason'], 'cancelled')
+        self.assertEqual(len(result['schedule']), 2 * 14)
+
+    def test_watchdog_stops_on_cancel(self):
+        class FakeSolver:
+            stopped = False
+
+            def StopSearch(self):
+                self.stopped = True
+
+        cancel = threading.Event()
+        callback = normal.EarlyStopCallback({}, {}, {}, cancel_event=cancel)
+        solver = FakeSolver()
+        with callback.watch(solver):
+            cancel.set()
+            time.sleep(1.0)
+        self.assertTrue(solver.stopped)
+        self.assertEqual(callback.stop_reason, 'cancelled')
+
+
+class TestCancelJob(unittest.TestCase):
+    def test_cancel_running_job(self):
+        def solve(config, progress, cancel=None):
+            cancel.wait(10)
+            return {"status": "cancelled", "schedule_id": "partial"}, 200
+
+        manager = job_queue.SolveJobManager(solve, max_workers=1, cancellable=True)
+        job_id = manager.submit({})
+        while manager.get(job_id).state != job_queue.JOB_RUNNING:
+            time.sleep(0.01)
+        job = manager.cancel(job_id, timeout=5)
+        self.assertEqual(job['state'], job_queue.JOB_CANCELLED)
+        self.assertEqual(job['result']['schedule_id'], 'partial')
+        manager.shutdown()
+
+    def test_cancel_does_not_wait_by_default(self):
+        release = threading.Event()
+
+        def solve(config, progress, cancel=None):
+            cancel.wait(10)
+            release.wait(10)  # 模拟求解器收到取消后仍需一段时间才交回结果
+            return {"status": "cancelled"}, 200
+
+        manager = job_queue.SolveJobManager(solve, max_workers=1, cancellable=True)
+        job_id = manager.submit({})
+        while manager.get(job_id).state != job_queue.JOB_RUNNING:
+            time.sleep(0.01)
+        job = manager.cancel(job_id)
+        self.assertEqual(job['state'], job_queue.JOB_RUNNING)
+        self.assertTrue(job['cancel_requested'])
+        release.set()
+        self.assertEqual(manager.wait(job_id, timeout=5)['state'], job_queue.JOB_CANCELLED)
+        manager.shutdown()
+
+    def test_cancel_queued_job(self):
+        release = threading.Event()
+        manager = job_queue.SolveJobManager(lambda c, progress, cancel=None: (release.wait(10), ({"status": "success"}, 200))[1],
+                                            max_workers=1, cancellable=True)
+        first = manager.submit({})
+        queued = manager.submit({})
+        job = manager.cancel(queued, timeout=0)
+        self.assertEqual(job['state'], job_queue.JOB_CANCELLED)
+        release.set()
+        self.assertEqual(manager.wait(first, timeout=5)['state'], job_queue.JOB_SUCCESS)
+        manager.shutdown()
+
+
+class TestCancelEndpoint(unittest.TestCase):
+    def test_unknown_job(self):
+        import app as app_module
+        response = app_module.app.test_client().post('/api/jobs/not-a-job/cancel')
+        self.assertEqual(response.status_code, 404)
+
+    def test_running_job_returns_cancelling(self):
+        import app as app_module
+        release = threading.Event()
+
+        def solve(config, progress, cancel=None):
+            cancel.wait(10)
+            release.wait(10)
+            return {"status": "cancelled"}, 200
+
+        original = app_module.SOLVE_JOBS
+        app_module.SOLVE_JOBS = job_queue.SolveJobManager(solve, max_workers=1, cancellable=True)
+        try:
+            job_id = app_module.SOLVE_JOBS.submit({})
+            while app_module.SOLVE_JOBS.get(job_id).state != job_queue.JOB_RUNNING:
+                time.sleep(0.01)
+            response = app_module.app.test_client().post(f'/api/jobs/{job_id}/cancel')
+            self.assertEqual(response.status_code, 202)
+            self.assertEqual(response.get_json()['status'], 'cancelling')
+            release.set()
+            self.assertEqual(app_module.SOLVE_JOBS.wait(job_id, timeout=5)['state'], job_queue.JOB_CANCELLED)
+        finally:
+            app_module.SOLVE_JOBS.shutdown()
+            app_module.SOLVE_JOBS = original
+
+
+if __name__ == '__main__':
+    unittest.main()
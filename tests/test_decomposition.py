@@ -0,0 +1,82 @@
+import unittest
+import sys
+import os
+
+# Ensure we can import modules from the parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import decomposition
+import solver_pool
+
+
+COURSES = {
+    "语文": {"count": 6, "type": "main"},
+    "数学": {"count": 6, "type": "main"},
+    "音乐": {"count": 2, "type": "minor"},
+    "体育": {"count": 3, "type": "minor"}
+}
+
+CONFIG = {
+    "grades": {
+        "初一": {"count": 3, "courses": COURSES},
+        "初二": {"count": 3, "courses": COURSES}
+    },
+    "num_classes": 6,
+    "teacher_names": {"音乐": ["孙七"], "体育": ["吴九", "郑十"]},
+    "rules": [{"name": "体育容量", "type": "GLOBAL_CAPACITY", "targets": {"subjects": ["体育"]},
+               "params": {"capacity": 3}, "weight": 100}],
+    "use_legacy_rules": False,
+    "decompose": True
+}
+
+
+class TestReservation(unittest.TestCase):
+    def test_teacher_slots_are_disjoint_and_sufficient(self):
+        reserved = decomposition.reserve_teacher_slots({"初一": 12, "初二": 6}, {(0, 0)}, 5, 8)
+        self.assertFalse(reserved["初一"] & reserved["初二"])
+        self.assertGreaterEqual(len(reserved["初一"]), 12)
+        self.assertGreaterEqual(len(reserved["初二"]), 6)
+        self.assertNotIn((0, 0), reserved["初一"] | reserved["初二"])
+        # 第4、5节总是分给同一个年级
+        for d in range(5):
+            self.assertEqual((d, 3) in reserved["初一"], (d, 4) in reserved["初一"])
+
+    def test_overloaded_teacher_cannot_be_split(self):
+        self.assertIsNone(decomposition.reserve_teacher_slots({"初一": 30, "初二": 20}, set(), 5, 8))
+
+    def test_capacity_split(self):
+        shares = decomposition.split_capacity(5, {"初一": 90, "初二": 30}, 40)
+        self.assertEqual(sum(shares.values()), 5)
+        self.assertGreaterEqual(shares["初一"] * 40, 90)
+        self.assertIsNone(decomposition.split_capacity(2, {"初一": 90, "初二": 30}, 40))
+
+    def test_should_decompose(self):
+        self.assertTrue(decomposition.should_decompose(CONFIG))
+        self.assertFalse(decomposition.should_decompose(dict(CONFIG, decompose="auto")))
+        self.assertFalse(decomposition.should_decompose(dict(CONFIG, decompose=False)))
+
+
+class TestSolveDecomposed(unittest.TestCase):
+    def test_grades_solved_separately_then_merged(self):
+        result = decomposition.solve_decomposed(CONFIG, solver_pool.InlineSolver().solve)
+        self.assertEqual(result['status'], 'success')
+        report = result['decomposition']
+        self.assertEqual([g['status'] for g in report['grades']], ['success', 'success'])
+        self.assertIn('孙七', report['coupled_teachers'])
+        self.assertEqual(sum(report['capacity_shares']['体育容量'].values()), 3)
+        self.assertEqual(len(result['schedule']), 6 * sum(c['count'] for c in COURSES.values()))
+
+        # 合并后的课表满足跨年级约束: 同一老师同一时段只上一节，体育同时段不超过容量
+        busy = set()
+        pe_per_slot = {}
+        for (c, d, p), info in result['schedule'].items():
+            key = (info['teacher_name'], d, p)
+            self.assertNotIn(key, busy)
+            busy.add(key)
+            if info['subject'] == '体育':
+                pe_per_slot[(d, p)] = pe_per_slot.get((d, p), 0) + 1
+        self.assertLessEqual(max(pe_per_slot.values()), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
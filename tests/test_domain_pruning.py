@@ -0,0 +1,78 @@
+import unittest
+import sys
+import os
+
+# Ensure we can import modules from the parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import normal
+
+
+CONFIG = {
+    "num_classes": 2,
+    "courses": {
+        "语文": {"count": 5, "type": "main"},
+        "数学": {"count": 5, "type": "main"},
+        "体育": {"count": 2, "type": "minor"}
+    },
+    "teacher_names": {"语文": ["张三"], "数学": ["李四"], "体育": ["吴九"]},
+    "rules": [{"name": "体育不排上午", "type": "FORBIDDEN_SLOTS", "targets": {"subjects": ["体育"]},
+               "params": {"slots": [[d, p] for d in range(5) for p in range(4)]}, "weight": 100}],
+    "use_legacy_rules": False
+}
+
+
+class TestForbiddenSlots(unittest.TestCase):
+    def test_masks_from_rules_and_unavailable(self):
+        prepared = normal.run_scheduler(CONFIG, prepare_only=True)
+        forbidden = normal.compute_forbidden_slots(
+            CONFIG['rules'], prepared['teachers_db'], prepared['class_metadata'], prepared['class_teacher_map'],
+            {"张三": [[0, 7], [9, 9]]}, 5, 8
+        )
+        self.assertEqual(len(forbidden[(1, "体育")]), 20)
+        self.assertEqual(forbidden[(2, "语文")], {(0, 7)})
+        self.assertNotIn((1, "数学"), forbidden)
+
+
+class TestPrunedModel(unittest.TestCase):
+    def test_pruned_variables_never_created(self):
+        pruned = normal.run_scheduler(CONFIG)
+        full = normal.run_scheduler(dict(CONFIG, prune_domains=False))
+        self.assertEqual(pruned['status'], 'success')
+        self.assertEqual(full['model_stats']['variables'] - pruned['model_stats']['variables'], 2 * 20)
+        self.assertFalse(any(s == '体育' and p < 4 for (c, d, p, s) in pruned['vars']))
+        self.assertTrue(all(p >= 4 for (c, d, p), info in pruned['schedule'].items() if info['subject'] == '体育'))
+
+    def test_diagnosis_still_names_pruned_rule(self):
+        config = dict(CONFIG, rules=CONFIG['rules'] + [
+            {"name": "体育不排下午", "type": "FORBIDDEN_SLOTS", "targets": {"subjects": ["体育"]},
+             "params": {"slots": [[d, p] for d in range(5) for p in range(4, 8)]}, "weight": 100}
+        ])
+        events = []
+        result = normal.run_scheduler(config, progress=events.append)
+        self.assertEqual(result['status'], 'error')
+        self.assertIn('体育不排', ' '.join(result['suggestions']))
+        # 重建完整模型诊断时继续推送进度
+        self.assertEqual(sum(1 for e in events if e['type'] == 'started'), 2)
+
+    def test_diagnosis_uses_remaining_budget(self):
+        config = dict(CONFIG, max_time_in_seconds=5, rules=CONFIG['rules'] + [
+            {"name": "体育不排下午", "type": "FORBIDDEN_SLOTS", "targets": {"subjects": ["体育"]},
+             "params": {"slots": [[d, p] for d in range(5) for p in range(4, 8)]}, "weight": 100}
+        ])
+        result = normal.run_scheduler(config)
+        self.assertEqual(result['status'], 'error')
+        # 诊断重建只拿到原预算剩余的时间，不重新计时
+        self.assertLess(result['solve_info']['budget']['max_time_in_seconds'], 5)
+        self.assertEqual(result['model_stats']['variables'],
+                         normal.run_scheduler(dict(config, prune_domains=False))['model_stats']['variables'])
+
+    def test_fixed_course_on_forbidden_slot_is_reported(self):
+        config = dict(CONFIG, constraints={"fixed_courses": {"1": {"0_0": "体育"}}})
+        result = normal.run_scheduler(config)
+        self.assertEqual(result['status'], 'error')
+        self.assertIn('体育不排上午', ' '.join(result['suggestions']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import unittest
+import sys
+import os
+import json
+import copy
+import collections
+
+# Ensure we can import modules from the parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import normal
+import greedy
+
+
+CONFIG = {
+    "num_classes": 4,
+    "courses": {
+        "语文": {"count": 6, "type": "main"},
+        "数学": {"count": 6, "type": "main"},
+        "音乐": {"count": 2, "type": "minor"},
+        "体育": {"count": 3, "type": "minor"}
+    },
+    "teacher_names": {"语文": ["张三", "李四"], "数学": ["王五", "赵六"], "音乐": ["孙七"], "体育": ["吴九"]},
+    "rules": [
+        {"name": "体育不排第一节", "type": "FORBIDDEN_SLOTS", "targets": {"subjects": ["体育"]},
+         "params": {"slots": [[d, 0] for d in range(5)]}, "weight": 100},
+        {"name": "语文上午4节", "type": "ZONE_COUNT", "targets": {"subjects": ["语文"]},
+         "params": {"slots": [[d, p] for d in range(5) for p in range(4)], "count": 4, "relation": "=="}, "weight": 100}
+    ],
+    "constraints": {
+        "teacher_unavailable": {"孙七": [[0, p] for p in range(8)]},
+        "fixed_courses": {"1": {"2_5": "音乐"}}
+    },
+    "use_legacy_rules": False
+}
+
+
+class TestGreedySchedule(unittest.TestCase):
+    def test_hard_constraints_hold(self):
+        result = greedy.build_greedy_schedule(CONFIG)
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(result['unplaced'], [])
+        self.assertEqual(result['schedule'][(1, 2, 5)]['subject'], '音乐')
+
+        counts = collections.Counter((c, info['subject']) for (c, d, p), info in result['schedule'].items())
+        for c in range(1, 5):
+            self.assertEqual([counts[(c, s)] for s in CONFIG['courses']], [6, 6, 2, 3])
+
+        busy = set()
+        for (c, d, p), info in result['schedule'].items():
+            key = (info['teacher_name'], d, p)
+            self.assertNotIn(key, busy)
+            busy.add(key)
+            if info['subject'] == '体育':
+                self.assertNotEqual(p, 0)
+            if info['teacher_name'] == '孙七':
+                self.assertNotEqual(d, 0)
+        # 老师四五节不连堂
+        for name, d, p in busy:
+            if p == 3:
+                self.assertNotIn((name, d, 4), busy)
+
+        hard = [r for r in result['rule_report'] if r['is_hard']]
+        self.assertTrue(all(r['violation_count'] == 0 for r in hard), hard)
+
+    def test_preset_rules_sixty_classes_fast(self):
+        rules = copy.deepcopy(normal.SHAOXING_PRESET_RULES)
+        for rule in rules:
+            if rule['type'] == 'GLOBAL_CAPACITY':
+                rule['params']['capacity'] = 30
+        result = greedy.build_greedy_schedule(dict(normal.DEFAULT_CONFIG, num_classes=60, rules=rules))
+        self.assertEqual(result['status'], 'success')
+        self.assertLess(result['greedy']['seconds'], 1.0)
+        hard = [r for r in result['rule_report'] if r['is_hard']]
+        self.assertTrue(all(r['violation_count'] == 0 for r in hard), hard)
+
+    def test_soft_daily_limit_enforced(self):
+        # 规则引擎对 DAILY_LIMIT 始终施加硬约束，贪心构造也必须遵守，否则热启动提示不可行
+        rule = {"name": "语文下午每天最多1节", "type": "DAILY_LIMIT", "targets": {"subjects": ["语文"]},
+                "params": {"slots_per_day": [4, 5, 6, 7], "limit": 1}, "weight": 10}
+        result = greedy.build_greedy_schedule(dict(CONFIG, rules=CONFIG['rules'] + [rule]))
+        self.assertEqual(result['status'], 'success')
+        per_day = collections.Counter((c, d) for (c, d, p), info in result['schedule'].items()
+                                      if info['subject'] == '语文' and p >= 4)
+        self.assertEqual(max(per_day.values()), 1)
+
+    def test_unplaced_lessons_reported(self):
+        # 默认体育场地容量 (15) 不够 60 个班只能排在周五的体育课
+        result = greedy.build_greedy_schedule(dict(normal.DEFAULT_CONFIG, num_classes=60))
+        self.assertEqual(result['status'], 'partial')
+        self.assertEqual({u['subject'] for u in result['unplaced']}, {'体育'})
+        self.assertEqual(sum(u['count'] for u in result['unplaced']), result['greedy']['unplaced'])
+
+    def test_config_error_passed_through(self):
+        result = greedy.build_greedy_schedule(dict(CONFIG, teacher_limits={"不存在": {"max": 3}}))
+        self.assertEqual(result['error_type'], 'invalid_name')
+
+
+class TestGreedyHints(unittest.TestCase):
+    def test_solver_starts_from_greedy_schedule(self):
+        result = normal.run_scheduler(dict(CONFIG, greedy_hints=True))
+        self.assertEqual(result['status'], 'success')
+        warm = result['warm_start']
+        self.assertEqual(warm['source'], 'greedy')
+        self.assertEqual(warm['matched'], warm['greedy']['placed'])
+        self.assertEqual(warm['greedy']['unplaced'], 0)
+
+
+class TestPreviewEndpoint(unittest.TestCase):
+    def test_preview(self):
+        import app as app_module
+        client = app_module.app.test_client()
+        response = client.post('/api/preview', data=json.dumps(CONFIG), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual(data['status'], 'success')
+        self.assertEqual(data['schedule']['1']['5']['2']['subject'], '音乐')
+        self.assertEqual(len(data['hint_cells']), 4 * 17)
+
+
+if __name__ == '__main__':
+    unittest.main()
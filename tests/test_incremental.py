@@ -0,0 +1,103 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+
+# Ensure we can import modules from the parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import normal
+from database import ScheduleDatabase
+
+
+CONFIG = {
+    "num_classes": 4,
+    "courses": {
+        "语文": {"count": 5, "type": "main"},
+        "数学": {"count": 5, "type": "main"},
+        "音乐": {"count": 2, "type": "minor"}
+    },
+    "teacher_names": {"语文": ["张三", "王五"], "数学": ["李四", "赵六"], "音乐": ["孙七"]},
+    "use_legacy_rules": False
+}
+
+
+def to_cells(schedule):
+    return [[c, d, p, info['subject'], info['teacher_name']] for (c, d, p), info in schedule.items()]
+
+
+class TestIncrementalResolve(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.base = normal.run_scheduler(CONFIG)
+        cls.cells = to_cells(cls.base['schedule'])
+
+    def resolve(self, new_config):
+        return normal.run_scheduler(dict(new_config, hint_cells=self.cells, base_config=CONFIG, incremental=True))
+
+    def test_unchanged_config_keeps_schedule(self):
+        result = self.resolve(CONFIG)
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(result['incremental']['affected_classes'], [])
+        self.assertEqual(result['incremental']['changed_cells'], 0)
+
+    def test_teacher_unavailable_only_touches_their_classes(self):
+        busy = [[d, p] for (c, d, p), info in self.base['schedule'].items() if info['teacher_name'] == '张三'][:2]
+        result = self.resolve(dict(CONFIG, constraints={"teacher_unavailable": {"张三": busy}}))
+        self.assertEqual(result['status'], 'success')
+
+        zhang_classes = sorted({c for (c, d, p), info in self.base['schedule'].items() if info['teacher_name'] == '张三'})
+        report = result['incremental']
+        self.assertEqual(report['affected_classes'], zhang_classes)
+        self.assertEqual(report['affected_teachers'], ['张三'])
+        self.assertEqual(report['steps'][0]['level'], 1)
+        self.assertGreater(report['changed_cells'], 0)
+        for (c, d, p), info in self.base['schedule'].items():
+            if c not in zhang_classes:
+                self.assertEqual(result['schedule'][(c, d, p)]['subject'], info['subject'])
+        for d, p in busy:
+            self.assertFalse(any(info['teacher_name'] == '张三' and (d2, p2) == (d, p)
+                                 for (c, d2, p2), info in result['schedule'].items()))
+
+    def test_class_hours_change_marks_class(self):
+        grades = {"高一": {"count": 2, "courses": CONFIG["courses"]},
+                  "高二": {"count": 2, "courses": dict(CONFIG["courses"], 音乐={"count": 3, "type": "minor"})}}
+        scope = normal.detect_affected_scope(
+            dict(CONFIG), dict(CONFIG), self.cells,
+            {c: {"grade": "高一" if c <= 2 else "高二", "requirements": grades["高一" if c <= 2 else "高二"]["courses"]}
+             for c in range(1, 5)},
+            self.base['class_teacher_map'], self.base['teachers_db']
+        )
+        self.assertEqual(scope['classes'], {3, 4})
+
+    def test_neighbourhoods_grow_through_shared_teachers(self):
+        class_metadata = {c: {"grade": "Default"} for c in range(1, 5)}
+        class_teacher_map = {(1, "语文"): "t1", (2, "语文"): "t1", (3, "语文"): "t2", (4, "语文"): "t2"}
+        steps = normal.build_neighbourhoods({1}, class_metadata, class_teacher_map)
+        # 同年级已覆盖全部班级的那一级交给全量求解
+        self.assertEqual(steps, [{1}, {1, 2}])
+
+
+class TestIncrementalInit(unittest.TestCase):
+    def setUp(self):
+        import app as app_module
+        self.app_module = app_module
+        self.original_storage = app_module.storage
+        tmpdir = tempfile.mkdtemp()
+        app_module.storage = ScheduleDatabase(db_path=os.path.join(tmpdir, "inc.db"), json_dir=tmpdir)
+        self.client = app_module.app.test_client()
+
+    def tearDown(self):
+        self.app_module.storage = self.original_storage
+
+    def test_incremental_from_live_session(self):
+        first = json.loads(self.client.post('/api/init', data=json.dumps(CONFIG), content_type='application/json').data)
+        payload = dict(CONFIG, teacher_limits={"孙七": {"max": 20}}, base_schedule=first['schedule_id'], incremental=True)
+        data = json.loads(self.client.post('/api/init', data=json.dumps(payload), content_type='application/json').data)
+        self.assertEqual(data['status'], 'success')
+        self.assertEqual(data['incremental']['affected_teachers'], ['孙七'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import unittest
+import sys
+import os
+import tempfile
+import threading
+import time
+
+# Ensure we can import modules from the parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import job_queue
+import normal
+from database import ScheduleDatabase
+
+
+SNAPSHOT = {"subjects": ["语文", "数学"], "teachers": ["张三", "李四"], "cells": [[1, 0, 0, 0, 0], [1, 0, 1, 1, 1]]}
+
+
+def make_store():
+    tmpdir = tempfile.mkdtemp()
+    return ScheduleDatabase(db_path=os.path.join(tmpdir, "jobs.db"), json_dir=tmpdir)
+
+
+class TestJobCheckpoint(unittest.TestCase):
+    def test_metadata_and_checkpoint_persisted(self):
+        store = make_store()
+
+        def solve(config, progress):
+            progress({"type": "solution", "solution_index": 1, "objective": 30, "snapshot": SNAPSHOT})
+            progress({"type": "solution", "solution_index": 2, "objective": 20})
+            return {"status": "success", "schedule_id": "s1"}, 200
+
+        manager = job_queue.SolveJobManager(solve, max_workers=1, store=store, checkpoint_interval=0)
+        job_id = manager.submit({"num_classes": 1})
+        manager.wait(job_id, timeout=5)
+        manager.shutdown()
+
+        saved = store.load_job(job_id)
+        self.assertEqual(saved["state"], job_queue.JOB_SUCCESS)
+        self.assertEqual(saved["config"], {"num_classes": 1})
+        self.assertEqual(saved["summary"]["schedule_id"], "s1")
+        # 检查点的目标值与快照来自同一个解
+        self.assertEqual(saved["checkpoint"]["objective"], 30)
+        self.assertEqual(saved["checkpoint"]["snapshot"], SNAPSHOT)
+
+    def test_interrupted_job_visible_and_resumable_after_restart(self):
+        store = make_store()
+        release = threading.Event()
+
+        def solve(config, progress):
+            progress({"type": "solution", "solution_index": 1, "objective": 30, "snapshot": SNAPSHOT})
+            release.wait(10)
+            return {"status": "success"}, 200
+
+        # 第一个进程: 求解进行中时"重启"
+        old = job_queue.SolveJobManager(solve, max_workers=1, store=store, checkpoint_interval=0)
+        job_id = old.submit({"num_classes": 1})
+        while not (store.load_job(job_id) or {}).get("checkpoint"):
+            time.sleep(0.01)
+        self.assertEqual(store.mark_interrupted_jobs(), 1)
+
+        # 新进程: 内存中没有该任务，从数据库读取状态与检查点
+        submitted = []
+        new = job_queue.SolveJobManager(lambda c, p: (submitted.append(c), ({"status": "success"}, 200))[1],
+                                        max_workers=1, store=store)
+        status = new.status(job_id)
+        self.assertEqual(status["state"], job_queue.JOB_INTERRUPTED)
+        self.assertTrue(status["resumable"])
+        self.assertEqual(status["progress"]["snapshot"], SNAPSHOT)
+        self.assertEqual(status["progress"]["latest"]["objective"], 30)
+
+        new_job_id = new.resume(job_id, lambda saved: dict(
+            saved["config"], hint_cells=normal.snapshot_hint_cells(saved["checkpoint"]["snapshot"])))
+        new.wait(new_job_id, timeout=5)
+        self.assertEqual(submitted[0]["hint_cells"], [[1, 0, 0, "语文", "张三"], [1, 0, 1, "数学", "李四"]])
+        self.assertEqual(store.load_job(job_id)["state"], job_queue.JOB_RESUMED)
+        self.assertIsNone(new.resume(job_id, lambda saved: saved["config"]))  # 不能重复继续
+
+        release.set()
+        old.shutdown(wait=True)
+        new.shutdown()
+
+
+class TestSolverStorageStartup(unittest.TestCase):
+    def test_tables_created_and_jobs_recovered_at_startup(self):
+        import app as app_module
+        tmpdir = tempfile.mkdtemp()
+        db_path = os.path.join(tmpdir, "startup.db")
+        store = ScheduleDatabase(db_path=db_path, json_dir=tmpdir, solver_tables=False)
+        # 构造时 (导入 app 时) 不创建求解相关的表
+        with store.get_connection() as conn:
+            tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        self.assertEqual(tables, {"schedules"})
+
+        original = app_module.storage
+        app_module.storage = store
+        try:
+            self.assertEqual(app_module.init_solver_storage(), 0)
+            store.save_job("j1", {"num_classes": 1}, job_queue.JOB_RUNNING, time.time())
+            self.assertEqual(app_module.init_solver_storage(), 1)
+            self.assertEqual(store.load_job("j1")["state"], job_queue.JOB_INTERRUPTED)
+        finally:
+            app_module.storage = original
+
+
+if __name__ == '__main__':
+    unittest.main()
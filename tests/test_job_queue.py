@@ -0,0 +1,182 @@
+import unittest
+import sys
+import os
+import json
+import time
+import tempfile
+
+# Ensure we can import modules from the parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import job_queue
+
+
+class TestSolveJobManager(unittest.TestCase):
+    def test_submit_returns_immediately_and_finishes(self):
+        def slow_solve(config, progress):
+            time.sleep(0.2)
+            return {"status": "success", "echo": config["x"]}, 200
+
+        manager = job_queue.SolveJobManager(slow_solve, max_workers=1)
+        start = time.time()
+        job_id = manager.submit({"x": 1})
+        self.assertLess(time.time() - start, 0.1)
+        self.assertIn(manager.status(job_id)["state"], (job_queue.JOB_QUEUED, job_queue.JOB_RUNNING))
+
+        status = manager.wait(job_id, timeout=5)
+        self.assertEqual(status["state"], job_queue.JOB_SUCCESS)
+        self.assertEqual(status["result"]["echo"], 1)
+        manager.shutdown()
+
+    def test_exception_marks_job_error(self):
+        def broken_solve(config, progress):
+            raise RuntimeError("boom")
+
+        manager = job_queue.SolveJobManager(broken_solve, max_workers=1)
+        status = manager.wait(manager.submit({}), timeout=5)
+        self.assertEqual(status["state"], job_queue.JOB_ERROR)
+        self.assertEqual(status["http_status"], 500)
+        manager.shutdown()
+
+    def test_progress_long_poll(self):
+        def solve_with_progress(config, progress):
+            progress({"type": "solution", "solution_index": 1, "snapshot": {"cells": [[1, 0, 0, 0, 0]]}})
+            time.sleep(0.3)
+            progress({"type": "solution", "solution_index": 2})
+            return {"status": "success"}, 200
+
+        manager = job_queue.SolveJobManager(solve_with_progress, max_workers=1)
+        job_id = manager.submit({})
+        first = manager.status(job_id, since=0, wait=5)
+        self.assertEqual(first["progress"]["latest"]["solution_index"], 1)
+        self.assertIn("snapshot", first["progress"])
+
+        since = first["progress"]["seq"]
+        second = manager.status(job_id, since=since, wait=5)
+        self.assertEqual(second["progress"]["latest"]["solution_index"], 2)
+        # 快照没有更新时不重复下发
+        self.assertNotIn("snapshot", second["progress"])
+        manager.shutdown()
+
+    def test_unknown_job(self):
+        manager = job_queue.SolveJobManager(lambda c, progress: ({"status": "success"}, 200))
+        self.assertIsNone(manager.status("missing"))
+        manager.shutdown()
+
+
+class TestInflightSolves(unittest.TestCase):
+    def test_followers_share_leader_result(self):
+        inflight = job_queue.InflightSolves()
+        events = []
+        leader, is_leader = inflight.join("k")
+        follower, follower_is_leader = inflight.join("k", events.append)
+        self.assertTrue(is_leader)
+        self.assertFalse(follower_is_leader)
+        self.assertIs(leader, follower)
+        leader.publish({"type": "solution"})
+        self.assertEqual(inflight.stats()[0]["followers"], 1)
+
+        inflight.finish(leader, {"status": "success"})
+        self.assertEqual(follower.wait(1), {"status": "success"})
+        self.assertEqual(events, [{"type": "solution"}])
+        # 结束后的相同请求重新成为领头者
+        self.assertTrue(inflight.join("k")[1])
+
+
+class CountingSolver:
+    """记录求解次数，并放慢求解使重复请求在求解期间到达"""
+    def __init__(self):
+        import solver_pool
+        self.inline = solver_pool.InlineSolver()
+        self.calls = 0
+
+    def solve(self, config, progress=None, cancel=None):
+        self.calls += 1
+        time.sleep(0.5)
+        return self.inline.solve(config, progress, cancel)
+
+
+class TestAsyncInitEndpoint(unittest.TestCase):
+    def setUp(self):
+        import app as app_module
+        from database import ScheduleDatabase
+        self.app_module = app_module
+        self.original_storage = (app_module.storage, app_module.SOLVE_JOBS.store)
+        tmpdir = tempfile.mkdtemp()
+        app_module.storage = ScheduleDatabase(db_path=os.path.join(tmpdir, "jobs.db"), json_dir=tmpdir)
+        app_module.SOLVE_JOBS.store = app_module.storage
+        self.client = app_module.app.test_client()
+        self.config = {
+            "num_classes": 2,
+            "courses": {
+                "语文": {"count": 2, "type": "main"},
+                "数学": {"count": 2, "type": "main"}
+            },
+            "teacher_names": {"语文": ["张三"], "数学": ["李四"]},
+            "use_legacy_rules": False
+        }
+
+    def tearDown(self):
+        self.app_module.storage, self.app_module.SOLVE_JOBS.store = self.original_storage
+
+    def test_async_init_and_poll(self):
+        payload = dict(self.config, **{"async": True})
+        response = self.client.post('/api/init', data=json.dumps(payload), content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        job_id = json.loads(response.data)["job_id"]
+
+        import app as app_module
+        app_module.SOLVE_JOBS.wait(job_id, timeout=60)
+
+        response = self.client.get(f'/api/jobs/{job_id}')
+        data = json.loads(response.data)
+        self.assertEqual(data["job"]["state"], job_queue.JOB_SUCCESS)
+        self.assertIn(data["job"]["result"]["schedule_id"], app_module.SCHEDULE_SESSIONS)
+
+    def test_duplicate_requests_coalesce(self):
+        original_pool = self.app_module.SOLVER_POOL
+        self.app_module.SOLVER_POOL = CountingSolver()
+        try:
+            payload = dict(self.config, **{"async": True})
+            job_ids = [
+                json.loads(self.client.post('/api/init', data=json.dumps(payload), content_type='application/json').data)["job_id"]
+                for _ in range(2)
+            ]
+            results = [self.app_module.SOLVE_JOBS.wait(job_id, timeout=60)["result"] for job_id in job_ids]
+            self.assertEqual(self.app_module.SOLVER_POOL.calls, 1)
+            self.assertEqual(sorted(r["coalesced"] for r in results), [False, True])
+            self.assertNotEqual(results[0]["schedule_id"], results[1]["schedule_id"])
+            self.assertEqual(results[0]["schedule"], results[1]["schedule"])
+        finally:
+            self.app_module.SOLVER_POOL = original_pool
+
+    def test_different_engines_do_not_coalesce(self):
+        original_pool = self.app_module.SOLVER_POOL
+        self.app_module.SOLVER_POOL = CountingSolver()
+        try:
+            payloads = [dict(self.config, **{"async": True}),
+                        dict(self.config, engine="local_search", max_time_in_seconds=1, **{"async": True})]
+            job_ids = [
+                json.loads(self.client.post('/api/init', data=json.dumps(p), content_type='application/json').data)["job_id"]
+                for p in payloads
+            ]
+            results = [self.app_module.SOLVE_JOBS.wait(job_id, timeout=60)["result"] for job_id in job_ids]
+            self.assertEqual(self.app_module.SOLVER_POOL.calls, 2)
+            self.assertEqual([r["coalesced"] for r in results], [False, False])
+            self.assertEqual(results[1]["solve_info"]["engine"], "local_search")
+        finally:
+            self.app_module.SOLVER_POOL = original_pool
+
+    def test_jobs_persisted_to_injected_store(self):
+        job_id = json.loads(self.client.post('/api/init', data=json.dumps(dict(self.config, **{"async": True})),
+                                             content_type='application/json').data)["job_id"]
+        self.app_module.SOLVE_JOBS.wait(job_id, timeout=60)
+        self.assertEqual(self.app_module.storage.load_job(job_id)["state"], job_queue.JOB_SUCCESS)
+
+    def test_unknown_job_returns_404(self):
+        response = self.client.get('/api/jobs/not-a-job')
+        self.assertEqual(response.status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
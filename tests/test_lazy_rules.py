@@ -0,0 +1,154 @@
+import unittest
+import sys
+import os
+import copy
+
+# Ensure we can import modules from the parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import normal
+from ortools.sat.python import cp_model
+from test_greedy import CONFIG
+
+
+class TestRuleClassification(unittest.TestCase):
+    def test_preset_split(self):
+        eager = {r['name'] for r in normal.SHAOXING_PRESET_RULES if normal.is_eager_rule(r)}
+        lazy = {r['name'] for r in normal.SHAOXING_PRESET_RULES if not normal.is_eager_rule(r)}
+        # 硬禁排/特殊日由定义域缩减处理；软规则与等式类规则几乎总会被违反，一开始就加入
+        self.assertIn('体育不排第一节', eager)
+        self.assertIn('初一体育避开周四', eager)
+        self.assertIn('体育老师连堂奖励', eager)
+        self.assertIn('黄金时间 (主科上午优先)', eager)
+        self.assertIn('语数英上午4下午1', eager)
+        self.assertEqual(lazy, {'老师四五节不连堂', '体育场地容量限制', '老师连堂疲劳限制'})
+
+
+LAZY_CONFIG = dict(CONFIG, rules=CONFIG['rules'] + [
+    {"name": "语文场地", "type": "GLOBAL_CAPACITY", "targets": {"subjects": ["语文"]},
+     "params": {"capacity": 1}, "weight": 100},
+    {"name": "孙七四五节最多1节", "type": "DAILY_LIMIT", "targets": {"names": ["孙七"]},
+     "params": {"slots_per_day": [3, 4], "limit": 1}, "weight": 100}
+])
+
+
+class TestLazyRules(unittest.TestCase):
+    def test_same_optimum_as_full_model(self):
+        full = normal.run_scheduler(dict(LAZY_CONFIG, max_time_in_seconds=20))
+        lazy = normal.run_scheduler(dict(LAZY_CONFIG, lazy_rules=True, max_time_in_seconds=20))
+        self.assertEqual(lazy['status'], 'success')
+        self.assertIsNone(full['lazy_rules'])
+
+        info = lazy['lazy_rules']
+        self.assertEqual(info['eager_rules'], 2)
+        self.assertEqual(info['lazy_rules'], 2)
+        # 老师四五节不连堂已经保证了这条规则，始终不会加入模型
+        self.assertNotIn('孙七四五节最多1节', info['activated'])
+        self.assertEqual(info['rounds'][-1]['added'], [])
+        self.assertEqual(lazy['solve_info']['objective'], full['solve_info']['objective'])
+
+        per_slot = {}
+        for (c, d, p), cell in lazy['schedule'].items():
+            if cell['subject'] == '语文':
+                per_slot[(d, p)] = per_slot.get((d, p), 0) + 1
+        self.assertEqual(max(per_slot.values()), 1)
+
+    def test_violation_count_matches_model(self):
+        result = normal.run_scheduler(dict(CONFIG, max_time_in_seconds=20))
+        solver, schedule = result['solver'], result['vars']
+        prepared = normal.run_scheduler(CONFIG, prepare_only=True)
+        assignments = {}
+        for (c, s), tid in result['class_teacher_map'].items():
+            assignments.setdefault(tid, []).append((c, s))
+        index = normal.RuleIndex(result['teachers_db'], prepared['class_metadata'], assignments, schedule)
+        slots = [(d, p) for d in range(5) for p in range(8)]
+
+        def count(rule):
+            return normal.count_rule_violations(rule, solver.Value, schedule, index, prepared['class_metadata'],
+                                                assignments, slots)
+
+        for rule in CONFIG['rules']:
+            self.assertEqual(count(rule), 0, rule['name'])
+        # 4 个班 24 节语文排在 40 个时段里，场地容量 1 必然被违反
+        self.assertGreater(count(LAZY_CONFIG['rules'][2]), 0)
+        # 所有语文课都在上午: 4 个班各违反一次
+        stricter = dict(CONFIG['rules'][1], params=dict(CONFIG['rules'][1]['params'], count=6))
+        self.assertEqual(count(stricter), 4)
+
+    def test_polish_round_keeps_pending_rules(self):
+        # 第一轮只拿到可行解 (和为 0，未违反懒加载规则)，继续优化的一轮不能越过 "和 <= 5"
+        model = cp_model.CpModel()
+        xs = {i: model.NewBoolVar(f"x{i}") for i in range(10)}
+        model.Maximize(sum(xs.values()))
+        for var in xs.values():
+            model.AddHint(var, 0)
+        rule = {"name": "和不超过5"}
+        solvers = []
+
+        class StopAtFirst(cp_model.CpSolverSolutionCallback):
+            def on_solution_callback(self):
+                self.StopSearch()
+
+        class FirstSolutionSolver(cp_model.CpSolver):
+            # 模拟第一轮因时间片/停滞规则提前结束
+            def Solve(self, model, callback=None):
+                self.parameters.cp_model_presolve = False
+                return super().Solve(model, StopAtFirst())
+
+        def create_solver(time_limit):
+            solver = FirstSolutionSolver() if not solvers else cp_model.CpSolver()
+            solver.parameters.max_time_in_seconds = time_limit
+            solver.parameters.num_search_workers = 1
+            solvers.append(solver)
+            return solver
+
+        def add_rules(rules):
+            model.Add(sum(xs.values()) <= 5)
+
+        def count_violations(rule, value):
+            return max(0, sum(value(v) for v in xs.values()) - 5)
+
+        solver, status, rounds = normal.solve_lazy_rules(model, xs, [rule], add_rules, count_violations,
+                                                         create_solver, 10)
+        self.assertEqual(rounds[0]['status'], 'FEASIBLE')
+        self.assertEqual(rounds[0]['added'], ['和不超过5'])
+        self.assertEqual(status, cp_model.OPTIMAL)
+        self.assertEqual(sum(solver.Value(v) for v in xs.values()), 5)
+
+    def test_next_round_hinted_with_incumbent(self):
+        # 第一轮解 (全为 1) 违反 "和 <= 5"，加入规则后第二轮以该解为提示
+        model = cp_model.CpModel()
+        xs = {i: model.NewBoolVar(f"x{i}") for i in range(10)}
+        model.Maximize(sum(xs.values()))
+        hints = []
+
+        def create_solver(time_limit):
+            hint = model.Proto().solution_hint
+            hints.append(dict(zip(hint.vars, hint.values)))
+            solver = cp_model.CpSolver()
+            solver.parameters.max_time_in_seconds = time_limit
+            solver.parameters.num_search_workers = 1
+            return solver
+
+        solver, status, rounds = normal.solve_lazy_rules(
+            model, xs, [{"name": "和不超过5"}], lambda rules: model.Add(sum(xs.values()) <= 5),
+            lambda rule, value: max(0, sum(value(v) for v in xs.values()) - 5), create_solver, 10)
+        self.assertEqual(len(rounds), 2)
+        self.assertEqual(hints[0], {})
+        self.assertEqual(hints[1], {v.Index(): 1 for v in xs.values()})
+        self.assertEqual(sum(solver.Value(v) for v in xs.values()), 5)
+
+    def test_conflict_diagnosed_on_partial_model(self):
+        # 与 "语文上午4节" 矛盾的上限规则是懒加载的: 加入后的模型无解，诊断仍能定位到两条规则
+        rules = copy.deepcopy(CONFIG['rules'])
+        rules.append({"name": "语文上午最多3节", "type": "ZONE_COUNT", "targets": {"subjects": ["语文"]},
+                      "params": {"slots": [[d, p] for d in range(5) for p in range(4)], "count": 3, "relation": "<="},
+                      "weight": 100})
+        result = normal.run_scheduler(dict(CONFIG, rules=rules, lazy_rules=True, max_time_in_seconds=20))
+        self.assertEqual(result['error_type'], 'infeasible')
+        self.assertIn('语文上午最多3节', ' '.join(result['suggestions']))
+        self.assertIn('语文上午4节', ' '.join(result['suggestions']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+import sys
+import os
+
+# Ensure we can import modules from the parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import normal
+from test_greedy import CONFIG
+
+MORNING = [[d, p] for d in range(5) for p in range(4)]
+AFTERNOON = [[d, p] for d in range(5) for p in range(4, 8)]
+
+
+def chinese_in_morning(result):
+    return sum(1 for (c, d, p), cell in result['schedule'].items() if cell['subject'] == '语文' and p < 4)
+
+
+class TestRulePriority(unittest.TestCase):
+    def test_defaults_and_override(self):
+        fixed = {"type": "FIXED_SLOTS", "weight": 100}
+        self.assertEqual(normal.rule_priority(fixed), normal.LEX_FIXED_SLOTS_PRIORITY)
+        self.assertEqual(normal.rule_priority({"type": "FORBIDDEN_SLOTS", "weight": 15}), normal.LEX_DEFAULT_PRIORITY)
+        self.assertEqual(normal.rule_priority(dict(fixed, priority=5)), 5)
+
+
+class TestLexicographic(unittest.TestCase):
+    def test_fixed_slots_tier_first(self):
+        rules = CONFIG['rules'] + [
+            {"name": "音乐固定周五下午", "type": "FIXED_SLOTS", "targets": {"subjects": ["音乐"]},
+             "params": {"slots": [[4, 5], [4, 6]]}, "weight": 100},
+            {"name": "数学尽量上午", "type": "FORBIDDEN_SLOTS", "targets": {"subjects": ["数学"]},
+             "params": {"slots": AFTERNOON}, "weight": 10}
+        ]
+        config = dict(CONFIG, rules=rules, constraints={}, max_time_in_seconds=20)
+        plain = normal.run_scheduler(config)
+        lex = normal.run_scheduler(dict(config, lexicographic=True))
+        self.assertEqual(lex['status'], 'success')
+        self.assertIsNone(plain['lexicographic'])
+
+        stages = lex['lexicographic']['stages']
+        self.assertEqual([s['priority'] for s in stages], [1, 2])
+        self.assertEqual(stages[0]['final_value'], 0)
+        self.assertEqual(lex['solve_info']['objective'], sum(s['final_value'] for s in stages))
+        self.assertEqual(lex['solve_info']['objective'], plain['solve_info']['objective'])
+
+    def test_priority_beats_weight(self):
+        # 低权重但优先级高的规则先优化: 语文全部排在上午，即使 "上午少排语文" 的权重高得多
+        rules = [CONFIG['rules'][0],
+                 {"name": "语文不排下午", "type": "FORBIDDEN_SLOTS", "targets": {"subjects": ["语文"]},
+                  "params": {"slots": AFTERNOON}, "weight": 1, "priority": 1},
+                 {"name": "语文上午少排", "type": "FORBIDDEN_SLOTS", "targets": {"subjects": ["语文"]},
+                  "params": {"slots": MORNING}, "weight": 50, "priority": 2}]
+        config = dict(CONFIG, rules=rules, constraints={}, max_time_in_seconds=20)
+        self.assertEqual(chinese_in_morning(normal.run_scheduler(config)), 0)
+        lex = normal.run_scheduler(dict(config, lexicographic=True))
+        self.assertEqual(chinese_in_morning(lex), 4 * 6)
+        self.assertEqual(lex['lexicographic']['stages'][0]['final_value'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import unittest
+import sys
+import os
+import json
+import copy
+import threading
+
+# Ensure we can import modules from the parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import normal
+import localsearch
+from test_greedy import CONFIG
+
+
+def preset_config(num_classes):
+    """绍兴一中预设规则；体育场地容量放大，避免大规模时预设本身无解"""
+    rules = copy.deepcopy(normal.SHAOXING_PRESET_RULES)
+    for rule in rules:
+        if rule['type'] == 'GLOBAL_CAPACITY':
+            rule['params']['capacity'] = 30
+    return dict(normal.DEFAULT_CONFIG, num_classes=num_classes, rules=rules)
+
+
+class TestLocalSearchCost(unittest.TestCase):
+    def test_objective_matches_cpsat(self):
+        # CP-SAT 的课表放进局部搜索状态，软罚分应与 CP-SAT 目标值一致
+        config = preset_config(10)
+        result = normal.run_scheduler(dict(config, max_time_in_seconds=20))
+        self.assertEqual(result['status'], 'success')
+
+        prepared = normal.run_scheduler(config, prepare_only=True)
+        prepared = dict(prepared, teachers_db=result['teachers_db'], class_teacher_map=result['class_teacher_map'])
+        forbidden = normal.compute_forbidden_slots(
+            prepared['rules'], prepared['teachers_db'], prepared['class_metadata'], prepared['class_teacher_map'],
+            {}, prepared['days'], prepared['periods']
+        )
+        state = localsearch.LocalSearchState(prepared, forbidden, prepared['rules'])
+        index = {c: i for i, c in enumerate(state.classes)}
+        for (c, d, p), info in result['schedule'].items():
+            state.place(index[c], d * state.periods + p, state.bundle_of[(c, info['subject'])])
+
+        self.assertEqual(state.hard_violations(), 0)
+        self.assertEqual(state.soft_cost(), result['solve_info']['objective'])
+
+    def test_swap_delta_matches_total_cost(self):
+        prepared = normal.run_scheduler(preset_config(6), prepare_only=True)
+        forbidden = normal.compute_forbidden_slots(
+            prepared['rules'], prepared['teachers_db'], prepared['class_metadata'], prepared['class_teacher_map'],
+            {}, prepared['days'], prepared['periods']
+        )
+        state, _, _ = localsearch.build_initial_state(prepared, preset_config(6), forbidden, prepared['rules'], 0)
+        for ci, s1, s2 in [(0, 0, 9), (1, 3, 4), (2, 7, 39), (5, 12, 30)]:
+            before = state.total_cost()
+            delta = state.swap_delta(ci, s1, s2)
+            self.assertEqual(state.total_cost(), before + delta)
+
+
+class TestLocalSearchEngine(unittest.TestCase):
+    def test_engine_selected_per_request(self):
+        result = normal.run_scheduler(dict(CONFIG, engine='local_search', max_time_in_seconds=2))
+        self.assertEqual(result['status'], 'success')
+        info = result['solve_info']
+        self.assertEqual(info['engine'], 'local_search')
+        self.assertEqual(info['hard_violations'], 0)
+        # 贪心初始解已达到软罚分下界: 不再等待停滞阈值，立即结束
+        self.assertEqual(info['solver_status'], 'OPTIMAL')
+        self.assertEqual(info['stop_reason'], 'optimal')
+        self.assertEqual(info['objective'], info['best_bound'])
+        self.assertEqual(result['schedule'][(1, 2, 5)]['subject'], '音乐')
+
+        names = [r['name'] for r in result['rule_report']]
+        self.assertIn('【系统】老师时段冲突', names)
+        self.assertIn('【系统】老师四五节不连堂', names)
+        hard = [r for r in result['rule_report'] if r['is_hard']]
+        self.assertTrue(all(r['violation_count'] == 0 for r in hard), hard)
+
+    def test_hard_violations_reported_as_partial(self):
+        # 场地容量 1 个班，而 4 个班每周都有体育: 局部搜索无法满足，不能报告 success
+        rule = {"name": "体育场地", "type": "GLOBAL_CAPACITY", "targets": {"subjects": ["体育"]},
+                "params": {"capacity": 0}, "weight": 100}
+        config = dict(CONFIG, engine='local_search', max_time_in_seconds=1,
+                      rules=list(CONFIG.get('rules', [])) + [rule])
+        result = normal.run_scheduler(config)
+        self.assertEqual(result['status'], 'partial')
+        self.assertGreater(result['solve_info']['hard_violations'], 0)
+
+    def test_cancel_returns_current_schedule(self):
+        cancel = threading.Event()
+        cancel.set()
+        result = normal.run_scheduler(dict(CONFIG, engine='local_search', max_time_in_seconds=30), cancel=cancel)
+        self.assertEqual(result['status'], 'cancelled')
+        self.assertEqual(result['solve_info']['stop_reason'], 'cancelled')
+        self.assertEqual(len(result['schedule']), 4 * 17)
+
+    def test_invalid_engine_rejected(self):
+        import app as app_module
+        client = app_module.app.test_client()
+        response = client.post('/api/init', data=json.dumps(dict(CONFIG, engine='tabu')),
+                               content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.data)['error_type'], 'invalid_engine')
+
+
+if __name__ == '__main__':
+    unittest.main()
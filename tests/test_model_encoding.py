@@ -0,0 +1,58 @@
+import unittest
+import sys
+import os
+
+# Ensure we can import modules from the parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import normal
+
+
+CONFIG = {
+    "num_classes": 4,
+    "courses": {
+        "语文": {"count": 6, "type": "main"},
+        "数学": {"count": 6, "type": "main"},
+        "音乐": {"count": 2, "type": "minor"}
+    },
+    "teacher_names": {"语文": ["张三", "王五"], "数学": ["李四", "赵六"], "音乐": ["孙七"]},
+    "use_legacy_rules": False
+}
+
+
+class TestCompactEncoding(unittest.TestCase):
+    def test_compact_schedule_is_valid(self):
+        result = normal.run_scheduler(dict(CONFIG, model_encoding='compact'))
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(result['model_stats']['encoding'], 'compact')
+        self.assertEqual(len(result['schedule']), 4 * 14)
+
+        busy = set()
+        for (c, d, p), info in result['schedule'].items():
+            key = (info['teacher_name'], d, p)
+            self.assertNotIn(key, busy)  # 同一老师同一时段只上一节
+            busy.add(key)
+        for name in ("张三", "李四", "孙七"):
+            for d in range(5):
+                # 四五节不连堂
+                self.assertFalse((name, d, 3) in busy and (name, d, 4) in busy)
+
+    def test_stats_reported_for_both_encodings(self):
+        stats = normal.run_scheduler(CONFIG)['model_stats']
+        self.assertEqual(stats['encoding'], 'boolean')
+        self.assertGreater(stats['variables'], 0)
+        self.assertIn('solve_seconds', stats)
+
+    def test_compact_infeasible_still_diagnosed(self):
+        config = dict(CONFIG, model_encoding='compact', rules=[
+            {"name": "音乐禁排", "type": "FORBIDDEN_SLOTS", "targets": {"subjects": ["音乐"]},
+             "params": {"slots": [[d, p] for d in range(5) for p in range(8)]}, "weight": 100}
+        ])
+        result = normal.run_scheduler(config)
+        self.assertEqual(result['status'], 'error')
+        self.assertEqual(result['model_stats']['encoding'], 'compact')
+        self.assertIn('音乐禁排', ' '.join(result['suggestions']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+import sys
+import os
+
+# Ensure we can import modules from the parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import portfolio
+
+
+CONFIG = {
+    "num_classes": 2,
+    "courses": {
+        "语文": {"count": 6, "type": "main"},
+        "数学": {"count": 6, "type": "main"},
+        "音乐": {"count": 2, "type": "minor"}
+    },
+    "teacher_names": {"音乐": ["孙七"]},
+    "use_legacy_rules": False,
+    "max_time_in_seconds": 30
+}
+
+
+class TestBuildMembers(unittest.TestCase):
+    def test_seeds_and_budget(self):
+        members = portfolio.build_members(dict(CONFIG, random_seed=5, portfolio=3), 3, cpu_budget=8)
+        self.assertEqual([m['random_seed'] for m in members], [5, 6, 7])
+        self.assertEqual({m['num_search_workers'] for m in members}, {2})
+        self.assertEqual(members[1]['solver_overrides'], portfolio.PORTFOLIO_VARIANTS[1])
+        self.assertNotIn('portfolio', members[0])
+
+
+class TestSolvePortfolio(unittest.TestCase):
+    def test_returns_best_with_member_stats(self):
+        events = []
+        result = portfolio.solve_portfolio(dict(CONFIG, portfolio=2), progress=events.append)
+        self.assertEqual(result['status'], 'success')
+        report = result['portfolio']
+        self.assertEqual(len(report['members']), 2)
+        winner = report['members'][report['winner']]
+        self.assertEqual(winner['status'], 'success')
+        self.assertEqual(winner['objective'], result['solve_info']['objective'])
+        self.assertEqual(len(result['schedule']), 2 * 14)
+
+
+if __name__ == '__main__':
+    unittest.main()
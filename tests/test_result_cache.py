@@ -0,0 +1,139 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+
+# Ensure we can import modules from the parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import normal
+from database import ScheduleDatabase
+
+
+CONFIG = {
+    "num_classes": 2,
+    "courses": {
+        "语文": {"count": 2, "type": "main"},
+        "数学": {"count": 2, "type": "main"}
+    },
+    "teacher_names": {"语文": ["张三"], "数学": ["李四"]},
+    "use_legacy_rules": False
+}
+
+
+class TestCanonicalHash(unittest.TestCase):
+    def test_equivalent_configs_share_hash(self):
+        variant = {
+            "num_classes": 2,
+            "courses": [
+                {"name": "语文", "count": 2, "type": "main"},
+                {"name": "数学", "count": 2, "type": "main"}
+            ],
+            "teacher_names": {"语文": [" 张三 "], "数学": ["李四"]},
+            "teacher_limits": {},
+            "use_legacy_rules": False,
+            "optimization": {"golden_time": True}  # 不影响求解的字段
+        }
+        self.assertEqual(normal.canonical_config_hash(CONFIG), normal.canonical_config_hash(variant))
+
+    def test_rule_change_changes_hash(self):
+        changed = dict(CONFIG, rules=[{"name": "体育不排第一节", "type": "FORBIDDEN_SLOTS",
+                                       "targets": {"subjects": ["体育"]}, "params": {"slots": [[0, 0]]}, "weight": 100}])
+        self.assertNotEqual(normal.canonical_config_hash(CONFIG), normal.canonical_config_hash(changed))
+
+    def test_engine_changes_hash(self):
+        # 局部搜索的课表不能被 CP-SAT 请求读到
+        self.assertNotEqual(normal.canonical_config_hash(CONFIG),
+                            normal.canonical_config_hash(dict(CONFIG, engine='local_search')))
+        self.assertEqual(normal.canonical_config_hash(CONFIG),
+                         normal.canonical_config_hash(dict(CONFIG, engine='cpsat')))
+
+    def test_lexicographic_changes_hash(self):
+        self.assertNotEqual(normal.canonical_config_hash(CONFIG),
+                            normal.canonical_config_hash(dict(CONFIG, lexicographic=True)))
+        self.assertEqual(normal.canonical_config_hash(CONFIG),
+                         normal.canonical_config_hash(dict(CONFIG, lexicographic=False)))
+
+    def test_solve_strategy_changes_hash(self):
+        base = normal.canonical_config_hash(CONFIG)
+        for key, value in (("portfolio", 2), ("decompose", False), ("model_encoding", "compact"),
+                           ("symmetry_breaking", True), ("lazy_rules", True), ("prune_domains", False),
+                           ("greedy_hints", True), ("hint_cells", [[1, 0, 0, "语文", "张三"]])):
+            self.assertNotEqual(base, normal.canonical_config_hash(dict(CONFIG, **{key: value})), key)
+        # 显式给出默认值与不指定等价
+        self.assertEqual(base, normal.canonical_config_hash(dict(CONFIG, decompose="auto", prune_domains=True,
+                                                                 model_encoding="boolean", portfolio=False)))
+
+    def test_solver_tier_changes_hash(self):
+        self.assertNotEqual(normal.canonical_config_hash(CONFIG),
+                            normal.canonical_config_hash(dict(CONFIG, num_classes=120)))
+
+
+class TestResultCacheStorage(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.db = ScheduleDatabase(db_path=os.path.join(self.tmpdir, "cache.db"), json_dir=self.tmpdir)
+
+    def test_pack_roundtrip_through_sqlite(self):
+        result = normal.to_plain_result(normal.run_scheduler(CONFIG))
+        self.db.put_cached_result("k1", normal.pack_result(result))
+        restored = normal.unpack_result(self.db.get_cached_result("k1"))
+        self.assertEqual(restored["schedule"], result["schedule"])
+        self.assertEqual(restored["class_teacher_map"], result["class_teacher_map"])
+        self.assertEqual(restored["class_names"], result["class_names"])
+
+    def test_bounded_lru_eviction(self):
+        for key in ("a", "b", "c"):
+            self.db.put_cached_result(key, {"key": key}, max_entries=2)
+        self.assertIsNone(self.db.get_cached_result("a"))
+        self.assertEqual(self.db.get_cached_result("b"), {"key": "b"})
+        # b 最近被读取过，再写入 d 时淘汰的是 c
+        self.db.put_cached_result("d", {"key": "d"}, max_entries=2)
+        self.assertIsNone(self.db.get_cached_result("c"))
+        self.assertIsNotNone(self.db.get_cached_result("b"))
+
+
+class TestInitUsesCache(unittest.TestCase):
+    def setUp(self):
+        import app as app_module
+        self.app_module = app_module
+        self.original_storage = app_module.storage
+        self.tmpdir = tempfile.mkdtemp()
+        app_module.storage = ScheduleDatabase(db_path=os.path.join(self.tmpdir, "cache.db"), json_dir=self.tmpdir)
+        self.client = app_module.app.test_client()
+
+    def tearDown(self):
+        self.app_module.storage = self.original_storage
+
+    def test_second_identical_request_hits_cache(self):
+        first = json.loads(self.client.post('/api/init', data=json.dumps(CONFIG), content_type='application/json').data)
+        second = json.loads(self.client.post('/api/init', data=json.dumps(CONFIG), content_type='application/json').data)
+        self.assertEqual(first["status"], "success")
+        self.assertFalse(first["cache_hit"])
+        self.assertTrue(second["cache_hit"])
+        self.assertNotEqual(first["schedule_id"], second["schedule_id"])
+        self.assertEqual(first["schedule"], second["schedule"])
+
+    def test_portfolio_request_does_not_hit_plain_entry(self):
+        plain = json.loads(self.client.post('/api/init', data=json.dumps(CONFIG), content_type='application/json').data)
+        config = dict(CONFIG, portfolio=2)
+        portfolio = json.loads(self.client.post('/api/init', data=json.dumps(config), content_type='application/json').data)
+        self.assertEqual(plain["status"], "success")
+        self.assertFalse(portfolio["cache_hit"])
+        self.assertIsNotNone(portfolio["portfolio"])
+
+    def test_partial_local_search_not_cached(self):
+        # 局部搜索留下硬约束违反时返回 partial，不写入缓存
+        rule = {"name": "语文停课", "type": "GLOBAL_CAPACITY", "targets": {"subjects": ["语文"]},
+                "params": {"capacity": 0}, "weight": 100}
+        config = dict(CONFIG, engine="local_search", max_time_in_seconds=1, rules=[rule])
+        first = json.loads(self.client.post('/api/init', data=json.dumps(config), content_type='application/json').data)
+        second = json.loads(self.client.post('/api/init', data=json.dumps(config), content_type='application/json').data)
+        self.assertEqual(first["status"], "partial")
+        self.assertGreater(first["solve_info"]["hard_violations"], 0)
+        self.assertFalse(second["cache_hit"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+import sys
+import os
+
+# Ensure we can import modules from the parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ortools.sat.python import cp_model
+import normal
+
+
+TEACHERS_DB = [
+    {"id": "t_张三_初一", "name": "张三", "subject": "语文", "tags": ["班主任"]},
+    {"id": "t_李四_初一", "name": "李四", "subject": "数学", "tags": []},
+    {"id": "t_王五_初二", "name": "王五", "subject": "语文", "tags": []},
+    {"id": "t_孙七", "name": "孙七", "subject": "音乐_AUTO_SUB", "tags": ["所有老师"]}
+]
+
+CLASS_METADATA = {
+    1: {"grade": "初一", "requirements": {"语文": {"count": 5}, "数学": {"count": 5}, "音乐_AUTO_SUB": {"count": 1}}},
+    2: {"grade": "初二", "requirements": {"语文": {"count": 5}, "音乐_AUTO_SUB": {"count": 1}}}
+}
+
+ASSIGNMENTS = {
+    "t_张三_初一": [(1, "语文")],
+    "t_李四_初一": [(1, "数学")],
+    "t_王五_初二": [(2, "语文")],
+    "t_孙七": [(1, "音乐_AUTO_SUB"), (2, "音乐_AUTO_SUB")]
+}
+
+
+class TestRuleIndex(unittest.TestCase):
+    def setUp(self):
+        self.model = cp_model.CpModel()
+        self.schedule = {(c, d, p, s): self.model.NewBoolVar(f'{c}_{d}_{p}_{s}')
+                         for c, meta in CLASS_METADATA.items() for s in meta['requirements']
+                         for d in range(5) for p in range(8)}
+        self.index = normal.RuleIndex(TEACHERS_DB, CLASS_METADATA, ASSIGNMENTS, self.schedule)
+
+    def test_filter_by_subject_and_grade(self):
+        result = self.index.filter_targets({"subjects": ["语文"], "grades": ["初二"]})
+        self.assertEqual(result['teacher_ids'], ["t_张三_初一", "t_王五_初二"])
+        self.assertEqual(result['class_subjects'], [(2, "语文")])
+
+    def test_auto_sub_matches_base_subject(self):
+        result = self.index.filter_targets({"subjects": ["音乐"]})
+        self.assertEqual(result['teacher_ids'], ["t_孙七"])
+        self.assertEqual(result['class_subjects'], [(1, "音乐_AUTO_SUB"), (2, "音乐_AUTO_SUB")])
+
+    def test_tag_only_targets_all_class_subjects(self):
+        result = self.index.filter_targets({"tags": ["班主任"], "names": ["李四"]})
+        self.assertEqual(result['teacher_ids'], ["t_张三_初一", "t_李四_初一"])
+        self.assertEqual(result['class_subjects'],
+                         [(1, "语文"), (1, "数学"), (1, "音乐_AUTO_SUB"), (2, "语文"), (2, "音乐_AUTO_SUB")])
+        self.assertEqual(self.index.filter_targets({"names": ["李四"]}), {"teacher_ids": [], "class_subjects": []})
+
+    def test_teacher_ids_follow_teachers_db_order(self):
+        # 约束顺序与逐老师的验算结果依赖此顺序，不能随集合迭代顺序变化
+        result = self.index.filter_targets({"tags": ["所有老师"], "subjects": ["语文"]})
+        self.assertEqual(result['teacher_ids'], ["t_张三_初一", "t_王五_初二", "t_孙七"])
+
+    def test_matches_get_filtered_targets(self):
+        targets = {"subjects": ["数学", "音乐"], "grades": ["初一"]}
+        self.assertEqual(normal.get_filtered_targets(TEACHERS_DB, CLASS_METADATA, targets)['class_subjects'],
+                         self.index.filter_targets(targets)['class_subjects'])
+
+    def test_teacher_slot_vars(self):
+        shared = self.index.teacher_vars("t_孙七", 2, 3)
+        self.assertEqual(len(shared), 2)
+        self.assertIs(shared[0], self.schedule[(1, 2, 3, "音乐_AUTO_SUB")])
+        self.assertEqual(self.index.teacher_vars("t_不存在", 0, 0), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+import sys
+import os
+
+# Ensure we can import modules from the parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ortools.sat.python import cp_model
+import normal
+from test_greedy import CONFIG
+
+MORNING = [[d, p] for d in range(5) for p in range(4)]
+
+SOFT_RULES = [
+    {"name": "语文上午尽量3节", "type": "ZONE_COUNT", "targets": {"subjects": ["语文"]},
+     "params": {"slots": MORNING, "count": 3, "relation": "=="}, "weight": 10},
+    {"name": "数学老师尽量不连堂", "type": "CONSECUTIVE", "targets": {"subjects": ["数学"]},
+     "params": {"max": 1}, "weight": 5},
+    {"name": "体育老师连堂奖励", "type": "CONSECUTIVE", "targets": {"subjects": ["体育"]},
+     "params": {"mode": "avoid", "max": 0}, "weight": -2}
+]
+
+
+class TestPenaltyObjective(unittest.TestCase):
+    def test_coefficients_merged_per_variable(self):
+        model = cp_model.CpModel()
+        x, y = model.NewBoolVar('x'), model.NewBoolVar('y')
+        model.Minimize(normal.penalty_objective([(x, 2), (y, -1), (x, 3), (None, 1), (y, 1), (None, 4)]))
+        objective = model.Proto().objective
+        self.assertEqual(list(objective.vars), [x.Index()])
+        self.assertEqual(list(objective.coeffs), [5])
+        self.assertEqual(objective.offset, 5)
+
+
+class TestSoftEncoding(unittest.TestCase):
+    def test_objective_matches_schedule(self):
+        config = dict(CONFIG, rules=CONFIG['rules'][:1] + SOFT_RULES, max_time_in_seconds=20)
+        result = normal.run_scheduler(config)
+        self.assertEqual(result['status'], 'success')
+
+        teacher_of = result['class_teacher_map']
+        expected = 0
+        for c in range(1, 5):
+            morning = sum(1 for (cc, d, p), cell in result['schedule'].items()
+                          if cc == c and cell['subject'] == '语文' and p < 4)
+            expected += 10 * abs(morning - 3)
+        # 连堂规则同时作用于班级-科目窗口与老师窗口
+        busy = {}
+        for (c, d, p), cell in result['schedule'].items():
+            busy.setdefault((cell['subject'], 'class', c), set()).add((d, p))
+            busy.setdefault((cell['subject'], 'teacher', teacher_of[(c, cell['subject'])]), set()).add((d, p))
+        for (subj, _, _), slots in busy.items():
+            if subj == '数学':
+                expected += 5 * sum(1 for d, p in slots if (d, p + 1) in slots)
+            elif subj == '体育':
+                expected -= 2 * len(slots)
+        self.assertEqual(result['solve_info']['objective'], expected)
+
+    def test_soft_rules_add_no_reified_constraints(self):
+        hard_only = normal.run_scheduler(dict(CONFIG, rules=CONFIG['rules'][:1], max_time_in_seconds=20))
+        with_soft = normal.run_scheduler(dict(CONFIG, rules=CONFIG['rules'][:1] + SOFT_RULES, max_time_in_seconds=20))
+        self.assertEqual(with_soft['model_stats']['reified_constraints'], hard_only['model_stats']['reified_constraints'])
+        self.assertGreater(with_soft['model_stats']['objective_terms'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
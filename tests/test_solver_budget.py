@@ -0,0 +1,71 @@
+import unittest
+import sys
+import os
+
+# Ensure we can import modules from the parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import normal
+
+
+CONFIG = {
+    "num_classes": 2,
+    "courses": {
+        "语文": {"count": 6, "type": "main"},
+        "数学": {"count": 6, "type": "main"}
+    },
+    "use_legacy_rules": False
+}
+
+
+class TestPlanSolverBudget(unittest.TestCase):
+    def plan(self, config, variables, constraints, assumptions, cpus):
+        params = normal.get_solver_params(config)
+        budget = normal.plan_solver_budget(params, {"variables": variables, "constraints": constraints},
+                                           assumptions, cpus=cpus)
+        return params, budget
+
+    def test_time_scales_with_model_size(self):
+        small, _ = self.plan(CONFIG, 1000, 2000, 0, 4)
+        large, _ = self.plan(CONFIG, 15000, 37000, 0, 4)
+        huge, _ = self.plan(CONFIG, 200000, 400000, 0, 4)
+        self.assertLess(small['max_time_in_seconds'], large['max_time_in_seconds'])
+        self.assertEqual(huge['max_time_in_seconds'], normal.BUDGET_MAX_SECONDS)
+        self.assertGreaterEqual(small['max_time_in_seconds'], normal.BUDGET_MIN_SECONDS)
+
+    def test_workers_follow_cores_and_assumptions(self):
+        params, budget = self.plan(CONFIG, 15000, 37000, 0, 4)
+        self.assertEqual(params['num_search_workers'], 4)
+        self.assertEqual(budget['workers_source'], 'cpus')
+        params, _ = self.plan(CONFIG, 1000, 2000, 0, 64)
+        self.assertEqual(params['num_search_workers'], normal.BUDGET_SMALL_MODEL_WORKERS)
+        params, budget = self.plan(CONFIG, 15000, 37000, 12, 32)
+        self.assertEqual(params['num_search_workers'], 1)
+        self.assertEqual(budget['workers_source'], 'assumptions')
+
+    def test_explicit_values_win(self):
+        params, budget = self.plan(dict(CONFIG, max_time_in_seconds=5, num_search_workers=3), 15000, 37000, 0, 8)
+        self.assertEqual((params['max_time_in_seconds'], params['num_search_workers']), (5.0, 3))
+        self.assertEqual((budget['time_source'], budget['workers_source']), ('config', 'config'))
+
+    def test_expected_workers_before_build(self):
+        # 准入控制在建模前按此申请核数: 带 assumptions 的模型只申请 1 核
+        self.assertEqual(normal.expected_search_workers(normal.DEFAULT_CONFIG, 16), 1)
+        unavailable = dict(CONFIG, constraints={"teacher_unavailable": {"张三": [[0, 0]]}})
+        self.assertEqual(normal.expected_search_workers(unavailable, 16), 1)
+        self.assertEqual(normal.expected_search_workers(CONFIG, 16), min(16, normal.BUDGET_MAX_WORKERS))
+        self.assertEqual(normal.expected_search_workers(dict(CONFIG, num_search_workers=3), 16), 3)
+
+    def test_available_cpus(self):
+        self.assertGreaterEqual(normal.available_cpus(), 1)
+
+    def test_budget_reported_in_result(self):
+        result = normal.run_scheduler(CONFIG)
+        self.assertEqual(result['status'], 'success')
+        budget = result['solve_info']['budget']
+        self.assertEqual(budget['variables'], result['model_stats']['variables'])
+        self.assertEqual(budget['time_source'], 'model_size')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+import sys
+import os
+import pickle
+import threading
+import unittest.mock
+
+# Ensure we can import modules from the parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import normal
+import solver_pool
+import substitution
+
+
+CONFIG = {
+    "num_classes": 2,
+    "courses": {
+        "语文": {"count": 2, "type": "main"},
+        "数学": {"count": 2, "type": "main"}
+    },
+    "teacher_names": {"语文": ["张三"], "数学": ["李四"]},
+    "use_legacy_rules": False
+}
+
+
+class TestPlainResult(unittest.TestCase):
+    def test_plain_result_is_picklable_and_rebuilds_system(self):
+        plain = normal.to_plain_result(normal.run_scheduler(CONFIG))
+        self.assertEqual(plain['status'], 'success')
+        self.assertNotIn('solver', plain)
+        self.assertNotIn('vars', plain)
+        pickle.dumps(plain)
+
+        system = substitution.SubstitutionSystem(plain)
+        self.assertEqual(len(system.final_schedule), len(plain['schedule']))
+        self.assertEqual(len(system.final_schedule), 2 * 4)
+
+
+class TestSolveProgress(unittest.TestCase):
+    def test_progress_events_carry_snapshot(self):
+        events = []
+        result = normal.run_scheduler(CONFIG, progress=events.append)
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(events[0]['type'], 'started')
+        solutions = [e for e in events if e['type'] == 'solution']
+        self.assertTrue(solutions)
+        snapshot = solutions[0]['snapshot']
+        self.assertEqual(len(snapshot['cells']), 2 * 4)
+        self.assertEqual(set(snapshot['subjects']), {"语文", "数学"})
+
+
+class TestSolverProcessPool(unittest.TestCase):
+    def test_solve_in_worker_process(self):
+        pool = solver_pool.SolverProcessPool(max_workers=1, max_jobs_per_worker=1)
+        try:
+            first = pool.solve(CONFIG)
+            executor = pool._executor
+            second = pool.solve(CONFIG)
+            self.assertEqual(first['status'], 'success')
+            self.assertEqual(second['status'], 'success')
+            self.assertNotIn('solver', second)
+            # 超过每进程任务上限后进程池被回收重建
+            self.assertIsNot(pool._executor, executor)
+
+            events = []
+            third = pool.solve(CONFIG, progress=events.append)
+            self.assertEqual(third['status'], 'success')
+            self.assertTrue(any(e['type'] == 'solution' for e in events))
+        finally:
+            pool.shutdown(wait=True)
+
+    def test_cancel_timeout_only_stops_own_process(self):
+        pool = solver_pool.SolverProcessPool(max_workers=1, max_jobs_per_worker=10)
+        try:
+            self.assertEqual(pool.solve(CONFIG)['status'], 'success')
+            executor = pool._executor
+            # 模拟求解进程在宽限期内未退出: 只终止该求解的独立进程
+            cancel = threading.Event()
+            cancel.set()
+            with unittest.mock.patch.object(solver_pool, '_wait_cancellable', return_value=False):
+                result = pool.solve(CONFIG, cancel=cancel)
+            self.assertEqual(result['status'], 'cancelled')
+            # 共享进程池不受影响，其他求解照常进行
+            self.assertIs(pool._executor, executor)
+            self.assertEqual(pool.solve(CONFIG)['status'], 'success')
+            # 未取消的可取消求解在独立进程中正常完成
+            self.assertEqual(pool.solve(CONFIG, cancel=threading.Event())['status'], 'success')
+        finally:
+            pool.shutdown(wait=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+import sys
+import os
+
+# Ensure we can import modules from the parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import normal
+
+
+def make_config(n, **extra):
+    config = {
+        "num_classes": n,
+        "courses": {
+            "语文": {"count": 6, "type": "main"},
+            "数学": {"count": 6, "type": "main"},
+            "音乐": {"count": 2, "type": "minor"}
+        },
+        "teacher_names": {
+            "语文": [f"语文{i + 1}" for i in range(n)],
+            "数学": [f"数学{i + 1}" for i in range(n)],
+            "音乐": ["孙七"]
+        },
+        "use_legacy_rules": False
+    }
+    config.update(extra)
+    return config
+
+
+class TestInterchangeableClasses(unittest.TestCase):
+    def groups_for(self, config):
+        prepared = normal.run_scheduler(config, prepare_only=True)
+        return normal.find_interchangeable_classes(
+            prepared['classes'], prepared['class_metadata'], prepared['class_teacher_map'],
+            prepared['teachers_db'], config, prepared['rules']
+        )
+
+    def test_identical_classes_form_one_group(self):
+        self.assertEqual(self.groups_for(make_config(4)), [[1, 2, 3, 4]])
+
+    def test_constrained_teacher_breaks_symmetry(self):
+        config = make_config(4, constraints={"teacher_unavailable": {"语文1": [[0, 0]]}})
+        self.assertEqual(self.groups_for(config), [[2, 3, 4]])
+
+    def test_lexicographic_order_in_solution(self):
+        result = normal.run_scheduler(make_config(4, symmetry_breaking=True))
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(result['symmetry'], {"groups": 1, "classes": 4})
+
+        index = {s: i + 1 for i, s in enumerate(result['vars_list'])}
+        def vector(c):
+            return [index[result['schedule'][(c, d, p)]['subject']] if (c, d, p) in result['schedule'] else 0
+                    for d in range(5) for p in range(8)]
+        for c in range(1, 4):
+            self.assertLessEqual(vector(c), vector(c + 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+
+# Ensure we can import modules from the parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import normal
+from database import ScheduleDatabase
+
+
+CONFIG = {
+    "num_classes": 2,
+    "courses": {
+        "语文": {"count": 2, "type": "main"},
+        "数学": {"count": 2, "type": "main"}
+    },
+    "teacher_names": {"语文": ["张三"], "数学": ["李四"]},
+    "use_legacy_rules": False
+}
+
+
+class TestSolutionHints(unittest.TestCase):
+    def test_hints_from_previous_schedule_are_matched(self):
+        base = normal.run_scheduler(CONFIG)
+        hint_cells = [[c, d, p, info['subject'], info['teacher_name']] for (c, d, p), info in base['schedule'].items()]
+        # 多一个班级: 新班级没有提示，原有班级全部命中
+        result = normal.run_scheduler(dict(CONFIG, num_classes=3, hint_cells=hint_cells))
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(result['warm_start'], {"hint_cells": 8, "matched": 8})
+
+    def test_stale_cells_are_skipped(self):
+        result = normal.run_scheduler(dict(CONFIG, hint_cells=[[1, 0, 0, "物理", "王五"], [9, 0, 0, "语文", ""]]))
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(result['warm_start']['matched'], 0)
+
+
+class TestInitWithBaseSchedule(unittest.TestCase):
+    def setUp(self):
+        import app as app_module
+        self.app_module = app_module
+        self.original_storage = app_module.storage
+        tmpdir = tempfile.mkdtemp()
+        app_module.storage = ScheduleDatabase(db_path=os.path.join(tmpdir, "warm.db"), json_dir=tmpdir)
+        self.client = app_module.app.test_client()
+
+    def tearDown(self):
+        self.app_module.storage = self.original_storage
+
+    def post_init(self, payload):
+        response = self.client.post('/api/init', data=json.dumps(payload), content_type='application/json')
+        return response.status_code, json.loads(response.data)
+
+    def test_live_and_saved_base_schedule(self):
+        _, first = self.post_init(CONFIG)
+        _, warm = self.post_init(dict(CONFIG, base_schedule=first['schedule_id'], use_cache=False))
+        self.assertEqual(warm['status'], 'success')
+        self.assertEqual(warm['warm_start']['matched'], 8)
+
+        self.app_module.storage.save_schedule("基准方案", {"schedule": first['schedule'], "teachers": first['teachers']}, CONFIG)
+        _, from_saved = self.post_init(dict(CONFIG, base_schedule="基准方案", use_cache=False))
+        self.assertEqual(from_saved['warm_start']['matched'], 8)
+
+    def test_unknown_base_schedule(self):
+        status, data = self.post_init(dict(CONFIG, base_schedule="不存在的方案"))
+        self.assertEqual(status, 400)
+        self.assertEqual(data['error_type'], 'base_schedule_not_found')
+
+
+if __name__ == '__main__':
+    unittest.main()